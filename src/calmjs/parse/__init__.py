@@ -3,7 +3,32 @@
 Quick access helper functions
 """
 
-from calmjs.parse.factory import ParserUnparserFactory
+import sys
 
+# the parser/unparser objects that are to be provided by this module,
+# mapped to the arguments for the ParserUnparserFactory.
+_factories = {
+    'es5': ('es5', 'pretty_print', 'minify_print'),
+}
 
-es5 = ParserUnparserFactory('es5', 'pretty_print', 'minify_print')
+
+def __getattr__(name):
+    # only construct the parser/unparser objects on first access, such
+    # that importing any submodule (e.g. vlq or sourcemap) will not also
+    # import every parser and unparser.
+    if name not in _factories:
+        raise AttributeError('module %r has no attribute %r' % (
+            __name__, name))
+    from calmjs.parse.factory import ParserUnparserFactory
+    value = ParserUnparserFactory(*_factories[name])
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_factories))
+
+
+if sys.version_info < (3, 7):  # pragma: no cover
+    # module level __getattr__ is unsupported, construct them upfront.
+    es5 = __getattr__('es5')
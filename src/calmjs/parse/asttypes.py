@@ -27,22 +27,74 @@ from __future__ import unicode_literals
 __author__ = 'Ruslan Spivak <ruslan.spivak@gmail.com>'
 
 from collections import defaultdict
+from operator import attrgetter
 from ply.lex import LexToken
 from calmjs.parse.utils import str
 from calmjs.parse.utils import repr_compat
 
+# the slots of the classes, as resolved by _slot_descriptors.
+_class_slots = {}
+
 # This should be nodetypes; asttypes means type of AST, and defining a
 # type for the entire tree is not the scope of what's being defined here
 
 
+def _slot_descriptors(cls):
+    """
+    Return the names and the descriptors of the slots declared by the
+    class and its bases, or None if there are none.
+    """
+
+    result = _class_slots.get(cls, NotImplemented)
+    if result is NotImplemented:
+        result = _class_slots[cls] = tuple(
+            (name, vars(klass)[name])
+            for klass in reversed(cls.__mro__)
+            for name in vars(klass).get('__slots__', ())
+            if name not in ('__dict__', '__weakref__')
+        ) or None
+    return result
+
+
+def attributes(node):
+    """
+    Return a dict of the attributes that are set on the node, which may
+    be its __dict__ and so must not be modified.  For the nodes of the
+    classes with slots (such as the ones produced by SRFactory with the
+    slots enabled), only the attributes held by the slots are provided.
+    """
+
+    descriptors = _slot_descriptors(type(node))
+    if descriptors is None:
+        return vars(node)
+    result = {}
+    for name, descriptor in descriptors:
+        try:
+            result[name] = descriptor.__get__(node)
+        except AttributeError:
+            pass
+    return result
+
+
 class Node(object):
     lexpos = lineno = colno = None
     sourcepath = None
     comments = None
+    # the names of the attributes specific to the type as assigned by
+    # its constructor, and the ones common to all the types.
+    _fields = ()
+    _attributes = (
+        'lexpos', 'lineno', 'colno', 'sourcepath', 'comments',
+        '_token_map', '_children_list',
+    )
+    # the names of the attributes that hold the child nodes, in order;
+    # a name with a leading '*' is a list of child nodes.  Types that
+    # declare this have their children and __iter__ methods built by
+    # _compile_children, otherwise the generic ones below are used.
+    _children = None
 
     def __init__(self, children=None):
         self._children_list = [] if children is None else children
-        self._token_map = {}
 
     def getpos(self, s, idx):
         token_map = getattr(self, '_token_map', NotImplemented)
@@ -73,17 +125,28 @@ class Node(object):
         source that defined this token, along with other "hidden" tokens
         that should be converted into comment nodes associated with this
         node.
+
+        The positions tracked are limited by the positions attribute of
+        the lexer, if set; 'node' for only the position of this node
+        without the token map, or 'none' for no positions at all.
         """
 
-        self._token_map = defaultdict(list)
+        positions = getattr(p.lexer, 'positions', 'full')
 
         # only do so if the lexer has comments enabled, and that the
         # production at the index actually has a token provided (which
         # presumes that this is the lowest level node being produced).
         if p.lexer.with_comments and isinstance(p.slice[idx], LexToken):
-            self.set_comments(p, idx)
+            self.set_comments(p, idx, positions)
 
+        if positions == 'none':
+            return
         self.lexpos, self.lineno, self.colno = self.findpos(p, idx)
+        if positions != 'full':
+            return
+        # assigned last, such that the instances with and without the
+        # token map may share the keys of their dicts.
+        self._token_map = defaultdict(list)
         for i, token in enumerate(p):
             if not isinstance(token, str):
                 continue
@@ -107,17 +170,26 @@ class Node(object):
         #     # if '# require yacc_tracking' not in _src:
         #     #     import pdb;pdb.set_trace()
 
-    def set_comments(self, p, idx):
+    def set_comments(self, p, idx, positions='full'):
         """
         Set comments associated with the element inside the production
         rule provided referenced by idx to this node.  Only applicable
         if the element is a LexToken and that the hidden_tokens is set.
         """
 
+        self.set_comments_from_token(p.slice[idx], positions)
+
+    def set_comments_from_token(self, lex_token, positions='full'):
+        """
+        Set the comments from the hidden_tokens of the provided LexToken
+        to this node, if any, with their positions tracked at the level
+        as described for setpos.
+        """
+
         comments = []
         # reversing the order to capture the first pos in the
         # laziest way possible.
-        for token in reversed(getattr(p.slice[idx], 'hidden_tokens', [])):
+        for token in reversed(getattr(lex_token, 'hidden_tokens', [])):
             if token.type == 'LINE_COMMENT':
                 comment = LineComment(token.value)
             elif token.type == 'BLOCK_COMMENT':
@@ -127,30 +199,29 @@ class Node(object):
 
             # short-circuit the setpos only
             pos = (token.lexpos, token.lineno, token.colno)
-            comment.lexpos, comment.lineno, comment.colno = pos
-            comment._token_map = {token.value: [pos]}
+            if positions != 'none':
+                comment.lexpos, comment.lineno, comment.colno = pos
+            if positions == 'full':
+                comment._token_map = {token.value: [pos]}
             comments.append(comment)
 
         if comments:
             self.comments = Comments(list(reversed(comments)))
-            (self.comments.lexpos, self.comments.lineno,
-                self.comments.colno) = pos
+            if positions != 'none':
+                (self.comments.lexpos, self.comments.lineno,
+                    self.comments.colno) = pos
 
     def __iter__(self):
         for child in self.children():
             if child is not None:
                 yield child
 
-    # TODO generalize this so subclasses don't need to have their own
-    # implementations.  Example: declare a list of attributes to return
-    # as children.
-
     def children(self):
         return getattr(self, '_children_list', [])
 
 
 class Program(Node):
-    pass
+    _children = ('*_children_list',)
 
 
 class ES5Program(Program):
@@ -158,26 +229,38 @@ class ES5Program(Program):
 
 
 class Block(Node):
-    pass
+    _children = ('*_children_list',)
 
 
 class Boolean(Node):
+    _fields = ('value',)
+    _children = ()
+
     def __init__(self, value):
         self.value = value
 
 
 class Null(Node):
+    _fields = ('value',)
+    _children = ()
+
     def __init__(self, value):
         assert value == 'null'
         self.value = value
 
 
 class Number(Node):
+    _fields = ('value',)
+    _children = ()
+
     def __init__(self, value):
         self.value = value
 
 
 class Identifier(Node):
+    _fields = ('value',)
+    _children = ()
+
     def __init__(self, value):
         self.value = value
 
@@ -192,123 +275,129 @@ class PropIdentifier(Identifier):
 
 
 class String(Node):
+    _fields = ('value',)
+    _children = ()
+
     def __init__(self, value):
         self.value = value
 
 
 class Regex(Node):
+    _fields = ('value',)
+    _children = ()
+
     def __init__(self, value):
         self.value = value
 
 
 class Array(Node):
+    _fields = ('items',)
+    _children = ('*items',)
+
     def __init__(self, items):
         self.items = items
 
-    def children(self):
-        return self.items
-
 
 class List(Node):
+    _fields = ('items',)
+    _children = ('*items',)
+
     # in JavaScript, this is distinctive from Array.
     def __init__(self, items):
         self.items = items
 
-    def children(self):
-        return self.items
-
 
 class Arguments(List):
     pass
 
 
 class Object(Node):
+    _fields = ('properties',)
+    _children = ('*properties',)
+
     def __init__(self, properties=None):
         self.properties = [] if properties is None else properties
 
-    def children(self):
-        return self.properties
-
 
 class NewExpr(Node):
+    _fields = ('identifier', 'args')
+    _children = ('identifier', 'args')
+
     def __init__(self, identifier, args=None):
         self.identifier = identifier
         self.args = args
 
-    def children(self):
-        return [self.identifier, self.args]
-
 
 class FunctionCall(Node):
+    _fields = ('identifier', 'args')
+    _children = ('identifier', 'args')
+
     def __init__(self, identifier, args=None):
         self.identifier = identifier
         self.args = args
 
-    def children(self):
-        return [self.identifier, self.args]
-
 
 class BracketAccessor(Node):
+    _fields = ('node', 'expr')
+    _children = ('node', 'expr')
+
     def __init__(self, node, expr):
         self.node = node
         self.expr = expr
 
-    def children(self):
-        return [self.node, self.expr]
-
 
 class DotAccessor(Node):
+    _fields = ('node', 'identifier')
+    _children = ('node', 'identifier')
+
     def __init__(self, node, identifier):
         self.node = node
         self.identifier = identifier
 
-    def children(self):
-        return [self.node, self.identifier]
-
 
 class Assign(Node):
+    _fields = ('op', 'left', 'right')
+    _children = ('left', 'right')
+
     def __init__(self, op, left, right):
         self.op = op
         self.left = left
         self.right = right
 
-    def children(self):
-        return [self.left, self.right]
-
 
 class GetPropAssign(Node):
+    _fields = ('prop_name', 'elements')
+    _children = ('prop_name', '*elements')
+
     def __init__(self, prop_name, elements):
         """elements - function body"""
         self.prop_name = prop_name
         self.elements = elements or []
 
-    def children(self):
-        return [self.prop_name] + self.elements
-
 
 class SetPropAssign(Node):
+    _fields = ('prop_name', 'parameter', 'elements')
+    _children = ('prop_name', 'parameter', '*elements')
+
     def __init__(self, prop_name, parameter, elements):
         """elements - function body"""
         self.prop_name = prop_name
         self.parameter = parameter
         self.elements = elements or []
 
-    def children(self):
-        return [self.prop_name, self.parameter] + self.elements
-
 
 class VarStatement(Node):
-    pass
+    _children = ('*_children_list',)
 
 
 class VarDecl(Node):
+    _fields = ('identifier', 'initializer')
+    _children = ('identifier', 'initializer')
+
     def __init__(self, identifier, initializer=None):
         self.identifier = identifier
         self.initializer = initializer
 
-    def children(self):
-        return [self.identifier, self.initializer]
-
 
 class VarDeclNoIn(VarDecl):
     """
@@ -317,13 +406,13 @@ class VarDeclNoIn(VarDecl):
 
 
 class UnaryExpr(Node):
+    _fields = ('op', 'value')
+    _children = ('value',)
+
     def __init__(self, op, value, postfix=False):
         self.op = op
         self.value = value
 
-    def children(self):
-        return [self.value]
-
 
 class PostfixExpr(UnaryExpr):
     def __init__(self, op, value):
@@ -332,204 +421,218 @@ class PostfixExpr(UnaryExpr):
 
 
 class BinOp(Node):
+    _fields = ('op', 'left', 'right')
+    _children = ('left', 'right')
+
     def __init__(self, op, left, right):
         self.op = op
         self.left = left
         self.right = right
 
-    def children(self):
-        return [self.left, self.right]
-
 
 class GroupingOp(Node):
+    _fields = ('expr',)
+    _children = ('expr',)
+
     def __init__(self, expr):
         self.expr = expr
 
-    def children(self):
-        return [self.expr]
-
 
 class Conditional(Node):
     """Conditional Operator ( ? : )"""
+    _fields = ('predicate', 'consequent', 'alternative')
+    _children = ('predicate', 'consequent', 'alternative')
+
     def __init__(self, predicate, consequent, alternative):
         self.predicate = predicate
         self.consequent = consequent
         self.alternative = alternative
 
-    def children(self):
-        return [self.predicate, self.consequent, self.alternative]
-
 
 class If(Node):
+    _fields = ('predicate', 'consequent', 'alternative')
+    _children = ('predicate', 'consequent', 'alternative')
+
     def __init__(self, predicate, consequent, alternative=None):
         self.predicate = predicate
         self.consequent = consequent
         self.alternative = alternative
 
-    def children(self):
-        return [self.predicate, self.consequent, self.alternative]
-
 
 class DoWhile(Node):
+    _fields = ('predicate', 'statement')
+    _children = ('predicate', 'statement')
+
     def __init__(self, predicate, statement):
         self.predicate = predicate
         self.statement = statement
 
-    def children(self):
-        return [self.predicate, self.statement]
-
 
 class While(Node):
+    _fields = ('predicate', 'statement')
+    _children = ('predicate', 'statement')
+
     def __init__(self, predicate, statement):
         self.predicate = predicate
         self.statement = statement
 
-    def children(self):
-        return [self.predicate, self.statement]
-
 
 class For(Node):
+    _fields = ('init', 'cond', 'count', 'statement')
+    _children = ('init', 'cond', 'count', 'statement')
+
     def __init__(self, init, cond, count, statement):
         self.init = init
         self.cond = cond
         self.count = count
         self.statement = statement
 
-    def children(self):
-        return [self.init, self.cond, self.count, self.statement]
-
 
 class ForIn(Node):
+    _fields = ('item', 'iterable', 'statement')
+    _children = ('item', 'iterable', 'statement')
+
     def __init__(self, item, iterable, statement):
         self.item = item
         self.iterable = iterable
         self.statement = statement
 
-    def children(self):
-        return [self.item, self.iterable, self.statement]
-
 
 class Continue(Node):
+    _fields = ('identifier',)
+    _children = ('identifier',)
+
     def __init__(self, identifier=None):
         self.identifier = identifier
 
-    def children(self):
-        return [self.identifier]
-
 
 class Break(Node):
+    _fields = ('identifier',)
+    _children = ('identifier',)
+
     def __init__(self, identifier=None):
         self.identifier = identifier
 
-    def children(self):
-        return [self.identifier]
-
 
 class Return(Node):
+    _fields = ('expr',)
+    _children = ('expr',)
+
     def __init__(self, expr=None):
         self.expr = expr
 
-    def children(self):
-        return [self.expr]
-
 
 class With(Node):
+    _fields = ('expr', 'statement')
+    _children = ('expr', 'statement')
+
     def __init__(self, expr, statement):
         self.expr = expr
         self.statement = statement
 
-    def children(self):
-        return [self.expr, self.statement]
-
 
 class Switch(Node):
+    _fields = ('expr', 'case_block')
+    _children = ('expr', 'case_block')
 
     def __init__(self, expr, case_block):
         self.expr = expr
         self.case_block = case_block
 
-    def children(self):
-        return [self.expr, self.case_block]
-
 
 class CaseBlock(Block):
     pass
 
 
 class Case(Node):
+    _fields = ('expr', 'elements')
+    _children = ('expr', '*elements')
+
     def __init__(self, expr, elements):
         self.expr = expr
         self.elements = elements if elements is not None else []
 
-    def children(self):
-        return [self.expr] + self.elements
-
 
 class Default(Node):
+    _fields = ('elements',)
+    _children = ('*elements',)
+
     def __init__(self, elements):
         self.elements = elements if elements is not None else []
 
-    def children(self):
-        return self.elements
-
 
 class Label(Node):
+    _fields = ('identifier', 'statement')
+    _children = ('identifier', 'statement')
+
     def __init__(self, identifier, statement):
         self.identifier = identifier
         self.statement = statement
 
-    def children(self):
-        return [self.identifier, self.statement]
-
 
 class Throw(Node):
+    _fields = ('expr',)
+    _children = ('expr',)
+
     def __init__(self, expr):
         self.expr = expr
 
-    def children(self):
-        return [self.expr]
-
 
 class Try(Node):
+    _fields = ('statements', 'catch', 'fin')
+    _children = ('statements', 'catch', 'fin')
+
     def __init__(self, statements, catch=None, fin=None):
         self.statements = statements
         self.catch = catch
         self.fin = fin
 
-    def children(self):
-        return [self.statements] + [self.catch, self.fin]
-
 
 class Catch(Node):
+    _fields = ('identifier', 'elements')
+    _children = ('identifier', 'elements')
+
     def __init__(self, identifier, elements):
         self.identifier = identifier
         self.elements = elements
 
-    def children(self):
-        return [self.identifier, self.elements]
-
 
 class Finally(Node):
+    _fields = ('elements',)
+    _children = ('elements',)
+
     def __init__(self, elements):
         self.elements = elements
 
-    def children(self):
-        return [self.elements]
-
 
 class Debugger(Node):
+    _fields = ('value',)
+    _children = ()
+
     def __init__(self, value):
         self.value = value
 
 
 class FuncBase(Node):
+    _fields = ('identifier', 'parameters', 'elements')
+    _attributes = Node._attributes + ('_body',)
+    _children = ('identifier', '*parameters', '*elements')
+
     def __init__(self, identifier, parameters, elements):
         self.identifier = identifier
         self.parameters = parameters if parameters is not None else []
         self.elements = elements if elements is not None else []
 
-    def children(self):
-        return [self.identifier] + self.parameters + self.elements
+    def __getattr__(self, attr):
+        # the body of a function skipped by a lazy parse is parsed on
+        # the first access of its elements.
+        body = getattr(self, '_body', None) if attr == 'elements' else None
+        if body is None:
+            raise AttributeError('%r object has no attribute %r' % (
+                type(self).__name__, attr))
+        elements = self.elements = body() or []
+        del self._body
+        return elements
 
 
 class FuncDecl(FuncBase):
@@ -542,33 +645,41 @@ class FuncExpr(FuncBase):
 
 
 class Comma(Node):
+    _fields = ('left', 'right')
+    _children = ('left', 'right')
+
     def __init__(self, left, right):
         self.left = left
         self.right = right
 
-    def children(self):
-        return [self.left, self.right]
-
 
 class EmptyStatement(Node):
+    _fields = ('value',)
+    _children = ()
+
     def __init__(self, value):
         self.value = value
 
 
 class ExprStatement(Node):
+    _fields = ('expr',)
+    _children = ('expr',)
+
     def __init__(self, expr):
         self.expr = expr
 
-    def children(self):
-        return [self.expr]
-
 
 class Elision(Node):
+    _fields = ('value',)
+    _children = ()
+
     def __init__(self, value):
         self.value = value
 
 
 class This(Node):
+    _children = ()
+
     def __init__(self):
         pass
 
@@ -581,6 +692,7 @@ class This(Node):
 
 
 class Comments(Node):
+    _children = ('*_children_list',)
 
     def __str__(self):
         return str('\n').join(str(child) for child in self.children())
@@ -593,6 +705,9 @@ class Comments(Node):
 
 
 class Comment(Node):
+    _fields = ('value',)
+    _children = ()
+
     def __init__(self, value):
         self.value = value
 
@@ -610,3 +725,82 @@ class BlockComment(Comment):
 
 class LineComment(Comment):
     pass
+
+
+def _child_getter(cls, name):
+    # attributes not assigned by the constructor may be absent.
+    if name in cls._fields:
+        return attrgetter(name)
+
+    def getter(node):
+        return getattr(node, name, [])
+    return getter
+
+
+def _compile_children(cls):
+    """
+    Build the children and __iter__ methods for the class from the
+    names declared by its _children, in the declared order, such that
+    no intermediate lists are created for iteration, and that a type
+    with only a single list of children returns that list as is, as
+    per the original hand written implementations.
+    """
+
+    fields = tuple(
+        (name.lstrip('*'), name.startswith('*')) for name in cls._children)
+    layout = tuple(
+        (_child_getter(cls, name), is_list) for name, is_list in fields)
+
+    if len(layout) == 1 and layout[0][1]:
+        getter = layout[0][0]
+
+        def children(self):
+            return getter(self)
+    else:
+        def children(self):
+            result = []
+            for getter, is_list in layout:
+                if is_list:
+                    result.extend(getter(self))
+                else:
+                    result.append(getter(self))
+            return result
+
+    def __iter__(self):
+        # the subclasses that override the children method are iterated
+        # through that instead, as done by the generic __iter__.
+        method = type(self).children
+        if getattr(method, '__func__', method) is not children:
+            for child in Node.__iter__(self):
+                yield child
+            return
+        for getter, is_list in layout:
+            if is_list:
+                for child in getter(self):
+                    if child is not None:
+                        yield child
+            else:
+                child = getter(self)
+                if child is not None:
+                    yield child
+
+    children.fields = fields
+    cls.children = children
+    cls.__iter__ = __iter__
+
+
+def children_fields(node):
+    """
+    Return the (name, is_list) pairs of the attributes that hold the
+    child nodes of the node in order, as declared by the _children of
+    its type, or None if its children are not provided through them.
+    """
+
+    return getattr(type(node).children, 'fields', None)
+
+
+for _cls in list(globals().values()):
+    if isinstance(_cls, type) and '_children' in vars(_cls) and (
+            _cls._children is not None):
+        _compile_children(_cls)
+del _cls
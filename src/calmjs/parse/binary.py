@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+A compact binary serialization format for the trees.
+
+The serialized form consists of a string table (holding every string
+found in the tree, such as the identifiers and literals, along with
+the names of the node types and attributes), a table of shapes (the
+type of the node along with the names of its attributes), and three
+streams of packed integers; one for the structure of the tree, one for
+the positions of the nodes, and one for their token maps.  As the
+latter two streams are kept apart, they may be skipped entirely when
+loading, for when the positions are not needed.
+
+The node types are recorded by their qualified names, such that the
+trees may be loaded without having to specify the types, provided that
+they are importable (e.g. the ones from ``calmjs.parse.asttypes``, or
+the ones produced by a named ``AstTypesFactory`` such as the ones used
+by the es5 parser); otherwise the asttypes to use may be provided.
+"""
+
+from __future__ import absolute_import
+
+import struct
+import sys
+from array import array
+from collections import defaultdict
+from importlib import import_module
+from io import BytesIO
+from itertools import chain
+from itertools import islice
+
+from calmjs.parse.asttypes import Node
+from calmjs.parse.asttypes import attributes
+from calmjs.parse.utils import str
+
+MAGIC = b'CJPT'
+VERSION = 1
+
+# the codes for the values in the structure stream.
+NONE = 0
+NODE = 1
+LIST = 2
+FALSE = 3
+TRUE = 4
+INT = 5
+STRING = 8
+
+# the kinds of token maps for the shapes.
+TOKEN_MAP_NONE = 0
+TOKEN_MAP_DEFAULT = 1
+TOKEN_MAP_DICT = 2
+
+POSITIONS = ('lexpos', 'lineno', 'colno')
+# the attributes that are not part of the structure.
+EXCLUDED = frozenset(POSITIONS + ('_token_map',))
+
+_length = struct.Struct('<I')
+_text_types = (str,) if str is type('') else (str, bytes)
+
+
+def _ints():
+    result = array('i')
+    if result.itemsize != 4:  # pragma: no cover
+        result = array('l')
+    return result
+
+
+def _pack(ints):
+    if sys.byteorder == 'big':  # pragma: no cover
+        ints = array(ints.typecode, ints)
+        ints.byteswap()
+    data = ints.tostring() if str is not type('') else ints.tobytes()
+    return _length.pack(len(ints)) + data
+
+
+def _read(fp, size):
+    data = fp.read(size)
+    if len(data) != size:
+        raise ValueError('unexpected end of data')
+    return data
+
+
+def _unpack(fp, skip=False):
+    count = _length.unpack(_read(fp, _length.size))[0]
+    ints = _ints()
+    data = _read(fp, count * ints.itemsize)
+    if skip:
+        return None
+    if str is not type(''):
+        ints.fromstring(data)
+    else:
+        ints.frombytes(data)
+    if sys.byteorder == 'big':  # pragma: no cover
+        ints.byteswap()
+    return ints
+
+
+def _type_name(cls):
+    return '%s:%s' % (cls.__module__, getattr(
+        cls, '__qualname__', cls.__name__))
+
+
+def _resolve(name, asttypes=None):
+    module_name, qualname = name.split(':')
+    try:
+        if asttypes is not None:
+            return getattr(asttypes, qualname.split('.')[-1])
+        result = import_module(module_name)
+        for attr in qualname.split('.'):
+            result = getattr(result, attr)
+        return result
+    except (ImportError, AttributeError):
+        raise ValueError('cannot resolve node type %r' % name)
+
+
+class _Encoder(object):
+
+    def __init__(self):
+        self.strings = []
+        self.string_ids = {}
+        self.shapes = []
+        self.shape_ids = {}
+        self.structure = _ints()
+        self.positions = _ints()
+        self.token_maps = _ints()
+
+    def string(self, value):
+        idx = self.string_ids.get(value)
+        if idx is None:
+            idx = self.string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        return idx
+
+    def shape(self, node, keys, attrs):
+        token_map = attrs.get('_token_map')
+        key = (type(node), tuple(keys), 'lexpos' in attrs, (
+            TOKEN_MAP_NONE if token_map is None else
+            TOKEN_MAP_DEFAULT if isinstance(token_map, defaultdict) else
+            TOKEN_MAP_DICT
+        ))
+        idx = self.shape_ids.get(key)
+        if idx is None:
+            idx = self.shape_ids[key] = len(self.shapes)
+            self.shapes.append(key)
+        return idx
+
+    def value(self, value):
+        structure = self.structure
+        if value is None:
+            structure.append(NONE)
+        elif isinstance(value, Node):
+            structure.append(NODE)
+            self.node(value)
+        elif isinstance(value, _text_types):
+            structure.append(STRING + self.string(value))
+        elif value is True:
+            structure.append(TRUE)
+        elif value is False:
+            structure.append(FALSE)
+        elif isinstance(value, int):
+            structure.append(INT)
+            structure.append(value)
+        elif isinstance(value, list):
+            structure.append(LIST)
+            structure.append(len(value))
+            for item in value:
+                self.value(item)
+        else:
+            raise ValueError('cannot serialize %r' % (value,))
+
+    def node(self, node):
+        attrs = attributes(node)
+        if '_body' in attrs:
+            # a lazily parsed function body, so parse it.
+            node.elements
+            attrs = attributes(node)
+        keys = [key for key in attrs if key not in EXCLUDED]
+        shape = self.shape(node, keys, attrs)
+        self.structure.append(shape)
+        for key in keys:
+            self.value(attrs[key])
+        if self.shapes[shape][2]:
+            self.positions.extend([attrs[key] for key in POSITIONS])
+        token_map = attrs.get('_token_map')
+        if token_map is not None:
+            token_maps = self.token_maps
+            token_maps.append(len(token_map))
+            for key, positions in token_map.items():
+                token_maps.append(self.string(key))
+                token_maps.append(len(positions))
+                token_maps.extend(chain.from_iterable(positions))
+
+    def dump(self, node, fp):
+        if not isinstance(node, Node):
+            raise TypeError('can only serialize a Node')
+        try:
+            self.value(node)
+        except RuntimeError:
+            # recursion limit reached for deeply nested trees.
+            raise ValueError('tree is too deeply nested to be serialized')
+        except OverflowError:
+            raise ValueError('integer value out of range')
+
+        shapes = _ints()
+        for cls, keys, has_pos, token_map in self.shapes:
+            name = _type_name(cls)
+            # ensure the type may be found when loaded.
+            if _resolve(name) is not cls:
+                raise ValueError('cannot resolve node type %r' % name)
+            shapes.extend([self.string(name), has_pos, token_map])
+            shapes.append(len(keys))
+            shapes.extend([self.string(key) for key in keys])
+
+        lengths = _ints()
+        lengths.extend([len(value) for value in self.strings])
+        text = ''.join(self.strings).encode('utf8', 'surrogatepass')
+        fp.write(MAGIC + struct.pack('<B', VERSION))
+        fp.write(_pack(lengths))
+        fp.write(_length.pack(len(text)) + text)
+        for ints in (shapes, self.structure, self.positions, self.token_maps):
+            fp.write(_pack(ints))
+
+
+class _Decoder(object):
+
+    def __init__(self, fp, positions=True, asttypes=None):
+        if _read(fp, len(MAGIC)) != MAGIC:
+            raise ValueError('not a serialized tree')
+        version = struct.unpack('<B', _read(fp, 1))[0]
+        if version != VERSION:
+            raise ValueError('unsupported version %d' % version)
+
+        lengths = _unpack(fp)
+        size = _length.unpack(_read(fp, _length.size))[0]
+        text = _read(fp, size).decode('utf8', 'surrogatepass')
+        self.strings = strings = []
+        offset = 0
+        for length in lengths:
+            strings.append(text[offset:offset + length])
+            offset += length
+        if offset != len(text):
+            raise ValueError('corrupted string table')
+
+        raw_shapes = iter(_unpack(fp))
+        self.shapes = shapes = []
+        for type_idx in raw_shapes:
+            cls = _resolve(strings[type_idx], asttypes)
+            has_pos = next(raw_shapes)
+            token_map = next(raw_shapes)
+            keys = [strings[next(raw_shapes)] for _ in range(next(
+                raw_shapes))]
+            # the attributes of the slotted nodes cannot be assigned as
+            # their __dict__.
+            shapes.append((
+                cls, keys, has_pos, token_map, hasattr(cls, '__slots__')))
+
+        self.structure = _unpack(fp)
+        self.positions = _unpack(fp, skip=not positions)
+        self.token_maps = _unpack(fp, skip=not positions)
+
+    def load(self):
+        strings = self.strings
+        shapes = self.shapes
+        with_positions = self.positions is not None
+        structure = iter(self.structure)
+        take = getattr(structure, '__next__', None) or structure.next
+        if with_positions:
+            positions = iter(self.positions)
+            token_maps = iter(self.token_maps)
+            take_tm = (
+                getattr(token_maps, '__next__', None) or token_maps.next)
+
+        def value():
+            code = take()
+            if code >= STRING:
+                return strings[code - STRING]
+            elif code == NODE:
+                return node()
+            elif code == NONE:
+                return None
+            elif code == LIST:
+                return [value() for _ in range(take())]
+            elif code == INT:
+                return take()
+            return code == TRUE
+
+        def node():
+            cls, keys, has_pos, token_map_kind, slotted = shapes[take()]
+            result = cls.__new__(cls)
+            attrs = {}
+            for key in keys:
+                attrs[key] = value()
+            if with_positions:
+                if has_pos:
+                    (attrs['lexpos'], attrs['lineno'],
+                        attrs['colno']) = islice(positions, 3)
+                if token_map_kind:
+                    token_map = (
+                        defaultdict(list)
+                        if token_map_kind == TOKEN_MAP_DEFAULT else {})
+                    for _ in range(take_tm()):
+                        key = strings[take_tm()]
+                        # every position is a triple of the values.
+                        flat = islice(token_maps, take_tm() * 3)
+                        token_map[key] = list(zip(flat, flat, flat))
+                    attrs['_token_map'] = token_map
+            elif token_map_kind:
+                attrs['_token_map'] = {}
+            if slotted:
+                for key, item in attrs.items():
+                    setattr(result, key, item)
+            else:
+                result.__dict__ = attrs
+            return result
+
+        if take() != NODE:
+            raise ValueError('corrupted structure')
+        return node()
+
+
+def dump(node, fp):
+    """
+    Write the serialized form of the tree to the binary stream.  A
+    ValueError will be raised if the tree contains values that cannot
+    be serialized, types that cannot be imported by their names, or if
+    it is too deeply nested.
+    """
+
+    _Encoder().dump(node, fp)
+
+
+def load(fp, positions=True, asttypes=None):
+    """
+    Read a tree from its serialized form in the binary stream.
+
+    Arguments
+
+    fp
+        The binary stream to read from.
+    positions
+        If False, the positions (the lexpos, lineno and colno) and the
+        token maps of the nodes will be skipped; defaults to True.
+    asttypes
+        The asttypes to construct the nodes with, by their class names,
+        instead of the types recorded.
+    """
+
+    try:
+        return _Decoder(fp, positions=positions, asttypes=asttypes).load()
+    except (IndexError, StopIteration, struct.error):
+        raise ValueError('corrupted data')
+
+
+def dumps(node):
+    """
+    Return the serialized form of the tree as bytes.
+    """
+
+    fp = BytesIO()
+    dump(node, fp)
+    return fp.getvalue()
+
+
+def loads(data, positions=True, asttypes=None):
+    """
+    Return the tree from its serialized form in bytes.
+    """
+
+    return load(BytesIO(data), positions=positions, asttypes=asttypes)
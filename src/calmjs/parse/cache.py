@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+A persistent cache for the trees produced by the parsers.
+
+The trees are stored in a directory, keyed by the hash of the source
+text along with the version of the grammar and tables used by the
+parser, the sources of the code that constructs the trees, and the
+arguments that affect the resulting tree, such that the
+same directory may be shared by different versions of this package and
+across multiple processes.
+"""
+
+from __future__ import absolute_import
+
+import hashlib
+import os
+import sys
+import zlib
+from importlib import import_module
+from tempfile import mkstemp
+
+from calmjs.parse import binary
+from calmjs.parse.utils import str
+
+# the default maximum size of the cache directory, in bytes.
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+# the modules involved in the construction of the trees, in addition
+# to the parser module itself, where their sources identify the version
+# of the code that produced the trees.
+TREE_MODULES = (
+    'calmjs.parse.asttypes',
+    'calmjs.parse.lexers.es5',
+    'calmjs.parse.parsers.es5_rd',
+)
+
+
+def grammar_version(module):
+    """
+    Return a string that identifies the version of the grammar and
+    tables used by the parser provided by the parser module.
+    """
+
+    # building a parser ensures that the tab modules are available.
+    module.Parser()
+    signatures = []
+    for name in (module.lextab, module.yacctab):
+        try:
+            tabmodule = import_module(name)
+        except ImportError:
+            # the tables could not be written, so no signature.
+            signatures.append(name)
+        else:
+            signatures.append('%s:%s' % (name, getattr(
+                tabmodule, '_lr_signature', getattr(
+                    tabmodule, '_lexstatere', ''))))
+    return '\n'.join(signatures)
+
+
+def source_version(module):
+    """
+    Return a string that identifies the version of the code used by the
+    parser module for constructing the trees, being the hash of the
+    sources of that module along with the TREE_MODULES.
+    """
+
+    digest = hashlib.sha256()
+    for name in (module.__name__,) + TREE_MODULES:
+        path = import_module(name).__file__
+        if path.endswith(('.pyc', '.pyo')) and os.path.exists(path[:-1]):
+            path = path[:-1]
+        with open(path, 'rb') as fd:
+            digest.update(fd.read())
+    return digest.hexdigest()
+
+
+class Cache(object):
+    """
+    A content addressed store of bytes in a directory, with the least
+    recently used entries evicted once the total size of the entries
+    exceed the maximum size.
+
+    The entries are written to temporary files that are then renamed
+    to their final names, such that the entries are never seen partially
+    written by other processes sharing the directory; likewise, entries
+    that disappear while being read (e.g. due to eviction by another
+    process) are simply treated as missing.
+    """
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        # the estimated total size of the entries; only calculated
+        # when the first entry is written.
+        self.size = None
+
+    def __getstate__(self):
+        # the estimated size is not shared.
+        return {'path': self.path, 'max_size': self.max_size, 'size': None}
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key[:2], key[2:])
+
+    def _entries(self):
+        """
+        Return a list of (mtime, size, path) of all the entries.
+        """
+
+        results = []
+        for root, dirs, files in os.walk(self.path):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                results.append((stat.st_mtime, stat.st_size, path))
+        return results
+
+    def get(self, key):
+        """
+        Return the bytes stored for the key, or None if not found.
+        """
+
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as fd:
+                data = fd.read()
+        except (IOError, OSError):
+            return None
+        try:
+            # mark this entry as recently used.
+            os.utime(path, None)
+        except OSError:
+            pass
+        return data
+
+    def set(self, key, data):
+        """
+        Store the bytes for the key, and evict the least recently used
+        entries if the cache exceeds its maximum size.
+        """
+
+        path = self._entry_path(key)
+        dirname = os.path.dirname(path)
+        try:
+            os.makedirs(dirname)
+        except OSError:
+            if not os.path.isdir(dirname):
+                raise
+        fd, tmp_path = mkstemp(suffix='.tmp', dir=dirname)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(data)
+            os.rename(tmp_path, path)
+        except OSError:
+            # the entry may be present already (on platforms where the
+            # rename cannot replace an existing file).
+            os.unlink(tmp_path)
+            return
+
+        if self.size is None:
+            self.size = sum(size for mtime, size, p in self._entries())
+        else:
+            self.size += len(data)
+        if self.size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the total size of
+        the entries is within the maximum size.
+        """
+
+        entries = sorted(self._entries())
+        self.size = sum(size for mtime, size, path in entries)
+        for mtime, size, path in entries:
+            if self.size <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            self.size -= size
+
+
+class CachedParser(object):
+    """
+    A parse function backed by a Cache, for the provided parser module
+    (defaults to the es5 parser module).  Instances may be used anywhere
+    the parse function of the module may be used, including as the
+    parser for ``calmjs.parse.io.read``.
+    """
+
+    def __init__(self, cache, module=None):
+        if module is None:
+            from calmjs.parse.parsers import es5 as module
+        self.cache = cache
+        self.module = module
+        self._digest = None
+
+    def __getstate__(self):
+        return {'cache': self.cache, 'module': self.module.__name__}
+
+    def __setstate__(self, state):
+        self.__init__(state['cache'], import_module(state['module']))
+
+    def key(self, source, **kwargs):
+        """
+        Return the key for the source parsed with the keyword arguments.
+        """
+
+        if self._digest is None:
+            self._digest = hashlib.sha256(('%s\n%s\n%s\n%d\n%d' % (
+                self.module.__name__, grammar_version(self.module),
+                source_version(self.module), binary.VERSION,
+                sys.version_info[0],
+            )).encode('utf8'))
+        digest = self._digest.copy()
+        for item in sorted(kwargs.items()):
+            digest.update(('\n%s=%r' % item).encode('utf8'))
+        digest.update(b'\n')
+        # lone surrogates may be found in the sources.
+        digest.update(source.encode('utf8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def __call__(self, source, with_comments=False):
+        if not isinstance(source, str):
+            # let the parser raise the appropriate error.
+            return self.module.parse(source, with_comments=with_comments)
+        key = self.key(source, with_comments=bool(with_comments))
+        data = self.cache.get(key)
+        if data is not None:
+            try:
+                return binary.loads(
+                    zlib.decompress(data), asttypes=self.module.asttypes)
+            except (ValueError, zlib.error):
+                # a corrupted entry; parse and replace it.
+                pass
+        result = self.module.parse(source, with_comments=with_comments)
+        try:
+            # a fast compression level, as the serialized tree is
+            # typically a number of times the size of the source.
+            data = zlib.compress(binary.dumps(result), 1)
+        except ValueError:
+            return result
+        self.cache.set(key, data)
+        return result
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Extraction of the important comments (e.g. the license banners) from
+the tokens of the ES5 lexer, and the interleaving of them back into the
+output of an unparser, such that they may be preserved without having
+the comments tracked across the entire tree.
+"""
+
+from __future__ import unicode_literals
+
+import re
+
+from calmjs.parse.ruletypes import StreamFragment
+
+# the conventional markers of the comments that are to be preserved,
+# such as /*! ... */ or the ones with @license or @preserve.
+PATT_IMPORTANT_COMMENT = re.compile(
+    r'^(?:/\*|//)!|@preserve|@license|@cc_on', flags=re.I)
+
+
+def is_important(value):
+    """
+    Return True if the value of the comment token has the conventional
+    markers of a comment that is to be preserved.
+    """
+
+    return PATT_IMPORTANT_COMMENT.search(value) is not None
+
+
+def extract(text, predicate=is_important, lexer=None):
+    """
+    Return the list of the comment tokens (with the type being either
+    LINE_COMMENT or BLOCK_COMMENT) in the text for which the predicate
+    returns True for the value, in the order they appear.
+
+    The lexer, if provided, must be an ES5 Lexer constructed with
+    yield_comments enabled; defaults to a new one.
+    """
+
+    if lexer is None:
+        from calmjs.parse.lexers.es5 import Lexer
+        lexer = Lexer(yield_comments=True)
+
+    results = []
+    lexer.input(text)
+    next_token = lexer._token
+    token = next_token()
+    while token is not None:
+        if token.type in ('LINE_COMMENT', 'BLOCK_COMMENT') and predicate(
+                token.value):
+            results.append(token)
+        token = next_token()
+    return results
+
+
+def interleave(chunks, comments):
+    """
+    Produce the chunks (StreamFragments) from an unparser, with every
+    comment token from comments produced before the first chunk that
+    originated from a position at or after the position of the comment,
+    or at the end for the remaining ones.  A newline is produced after
+    every line comment, and after the block comments that precede all
+    the other chunks (i.e. the banners).
+
+    For this to be effective, the tree must be produced by a parser
+    that tracks the positions; for the trees without the token maps
+    (i.e. with positions='node'), the chunks should be produced through
+    a token handler wrapped by node_positions.
+    """
+
+    comments = sorted(comments, key=lambda token: token.lexpos)
+    index = 0
+    leading = True
+
+    def fragments(token, leading):
+        yield StreamFragment(
+            token.value, token.lineno, token.colno, None, None)
+        if leading or token.type == 'LINE_COMMENT':
+            yield StreamFragment('\n', None, None, None, None)
+
+    for chunk in chunks:
+        if index < len(comments) and chunk.lineno is not None:
+            position = (chunk.lineno, chunk.colno or 0)
+            while index < len(comments) and (
+                    comments[index].lineno, comments[index].colno) <= (
+                    position):
+                for fragment in fragments(comments[index], leading):
+                    yield fragment
+                index += 1
+        leading = False
+        yield chunk
+
+    for token in comments[index:]:
+        for fragment in fragments(token, leading):
+            yield fragment
+
+
+def node_positions(token_handler):
+    """
+    Return a token handler that wraps the provided one, such that the
+    chunks produced without a position (as the node has no token map)
+    are produced at the position of the node instead.
+
+    As a node starts no later than any of its tokens, the position will
+    be exact for the first token of the node, and for the other tokens,
+    will be no later than the chunks already produced for the node, such
+    that interleave will produce the comments before the first chunk of
+    the node they precede, or otherwise before the next chunk from a
+    node that starts after them.
+    """
+
+    def handler(token, dispatcher, node, subnode, sourcepath_stack=(None,)):
+        for chunk in token_handler(
+                token, dispatcher, node, subnode, sourcepath_stack):
+            if chunk.lineno is None and node.lineno is not None:
+                chunk = chunk._replace(lineno=node.lineno, colno=node.colno)
+            yield chunk
+
+    return handler
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Extraction of the module dependencies declared through the calls such
+as require and define, directly from the tokens of the ES5 lexer.
+
+As no tree is constructed, this may be used for building the graph of
+the modules at the speed of the lexer; the handling of the regular
+expressions and the divisions is done by the lexer as usual.
+"""
+
+from __future__ import unicode_literals
+
+import re
+from collections import namedtuple
+
+from calmjs.parse.utils import unichr
+
+Dependency = namedtuple('Dependency', [
+    'callee', 'specifier', 'lineno', 'colno'])
+
+# the names of the functions that are called with the specifiers of the
+# modules as their arguments.
+DEFAULT_CALLEES = ('require', 'define')
+
+PATT_STRING_ESCAPE = re.compile(
+    r'\\(?:x([0-9a-fA-F]{2})|u([0-9a-fA-F]{4})|([0-7]{1,3})|'
+    r'(\r\n|[\n\r\u2028\u2029])|(.))'
+)
+SINGLE_ESCAPES = {
+    'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v',
+}
+
+
+def _unescape(match):
+    hex_, unicode_, octal, continuation, char = match.groups()
+    if continuation:
+        return ''
+    if char:
+        return SINGLE_ESCAPES.get(char, char)
+    return unichr(int(hex_ or unicode_, 16) if octal is None else int(
+        octal, 8))
+
+
+def string_value(value):
+    """
+    Return the value of the string literal from the value of a STRING
+    token, with the quotes removed and the escape sequences resolved.
+    """
+
+    value = value[1:-1]
+    if '\\' not in value:
+        return value
+    return PATT_STRING_ESCAPE.sub(_unescape, value)
+
+
+def extract(text, callees=DEFAULT_CALLEES, lexer=None):
+    """
+    Return the list of the dependencies declared by the calls in the
+    text to the functions named by callees, as Dependency instances of
+    the name of the callee, the specifier of the module along with the
+    lineno and colno of the string literal of the specifier.
+
+    The calls recognized are the ones with the specifier as the only
+    argument, e.g. ``require('a')``, or with a list of specifiers as
+    the first argument, which may follow the name of the module being
+    defined, e.g. ``define('name', ['a', 'b'], factory)``.  Only the
+    specifiers written as string literals are returned (for the list,
+    up to the first element that is not), and the calls through a
+    property of another object are ignored.
+
+    The lexer (defaults to a new ES5 Lexer) will be used for producing
+    the tokens.
+    """
+
+    if lexer is None:
+        from calmjs.parse.lexers.es5 import Lexer
+        lexer = Lexer()
+
+    results = []
+    lexer.input(text)
+    next_token = lexer._token
+    hidden_tokens = lexer.hidden_tokens
+    prev_type = None
+    token = next_token()
+    while token is not None:
+        if hidden_tokens:
+            del hidden_tokens[:]
+        type_ = token.type
+        if type_ != 'ID' or token.value not in callees or (
+                prev_type == 'PERIOD'):
+            prev_type = type_
+            token = next_token()
+            continue
+
+        callee = token.value
+        prev_type = type_
+        token = next_token()
+        if token is None or token.type != 'LPAREN':
+            continue
+        prev_type = token.type
+        token = next_token()
+        if token is not None and token.type == 'STRING':
+            specifier = token
+            prev_type = token.type
+            token = next_token()
+            if token is None:
+                continue
+            if token.type == 'RPAREN':
+                results.append(Dependency(
+                    callee, string_value(specifier.value), specifier.lineno,
+                    specifier.colno,
+                ))
+                prev_type = token.type
+                token = next_token()
+                continue
+            if token.type != 'COMMA':
+                continue
+            # the name of the module being defined, which may be
+            # followed by the list of the specifiers.
+            prev_type = token.type
+            token = next_token()
+        if token is None or token.type != 'LBRACKET':
+            continue
+
+        # the list of the specifiers, where the elements are taken up
+        # to the first one that is not exactly a string literal.
+        prev_type = token.type
+        token = next_token()
+        while token is not None and token.type == 'STRING':
+            specifier = token
+            prev_type = token.type
+            token = next_token()
+            if token is None or token.type not in ('COMMA', 'RBRACKET'):
+                break
+            results.append(Dependency(
+                callee, string_value(specifier.value), specifier.lineno,
+                specifier.colno,
+            ))
+            if token.type == 'RBRACKET':
+                break
+            prev_type = token.type
+            token = next_token()
+
+    del hidden_tokens[:]
+    return results
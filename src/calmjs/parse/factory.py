@@ -7,10 +7,29 @@ from importlib import import_module
 from functools import partial
 from functools import wraps
 from calmjs.parse import asttypes
+from calmjs.parse.asttypes import attributes
 
 PKGNAME = 'calmjs.parse'  # should derive this.
 
 
+# the classes resolved by _new_instance.
+_instance_classes = {}
+
+
+def _new_instance(name, attr):
+    """
+    Return a new instance of the class for attr from the factory that
+    may be imported from the fully qualified name, for unpickling.
+    """
+
+    cls = _instance_classes.get((name, attr))
+    if cls is None:
+        module_name, factory_name = name.rsplit('.', 1)
+        cls = _instance_classes.setdefault((name, attr), getattr(getattr(
+            import_module(module_name), factory_name), attr))
+    return cls.__new__(cls)
+
+
 class SRFactory(object):
     """
     A factory that will generate a new subclass that has the specified
@@ -18,9 +37,20 @@ class SRFactory(object):
     nodes that a given AST might have, tagging the custom str/repr
     on the class definition itself will only happen once, saving the
     cost of having to allocate all those references per object.
+
+    If the fully qualified name of where the factory instance may be
+    imported from is provided, the generated subclasses will be named
+    under it, and their instances may be pickled.
+
+    If slots is True, the generated subclasses will declare the names
+    listed by the _attributes and _fields of the classes (see Node in
+    asttypes) as __slots__, such that the nodes will hold them without
+    the __dict__ being created, which greatly reduces the memory used
+    by every node.  Any other attributes may still be set on the nodes,
+    however they will not be kept by pickling or any serialization.
     """
 
-    def __init__(self, module, str_, repr_):
+    def __init__(self, module, str_, repr_, name=None, slots=False):
         # recreate the class definitions
         def __str__(self):
             return str_(self)
@@ -29,24 +59,75 @@ class SRFactory(object):
             return repr_(self)
 
         self.module = module
-        self.classes = {c.__name__: c for c in (
-            type(cls.__name__, (cls,), {
-                '__repr__': __repr__,
-                '__str__': __str__,
-            }) for cls in (
-                v for v in vars(module).values() if isinstance(v, type)
-            )
-        )}
+        self.name = name
+        self.methods = {
+            '__repr__': __repr__,
+            '__str__': __str__,
+        }
+        self.slots = slots
+        # the subclasses are only created as they are first accessed,
+        # such that the cost is not paid upfront for every type.
+        self.classes = {}
 
     def __getattr__(self, attr):
-        if attr not in self.classes:
+        cls = vars(self.module).get(attr)
+        if not isinstance(cls, type):
             raise AttributeError('%s "%s" has no attribute %r' % (
                 type(self.module).__name__,
                 self.module.__class__.__name__,
                 attr,
             ))
 
-        return self.classes[attr]
+        methods = dict(self.methods)
+        slots = self.slots
+        if slots:
+            names = methods['__slots__'] = tuple(
+                getattr(cls, '_attributes', ())) + tuple(
+                getattr(cls, '_fields', ()))
+            # the slots shadow the default values of the class.
+            defaults = {
+                name: getattr(cls, name) for name in names
+                if hasattr(cls, name)
+            }
+            base_getattr = getattr(cls, '__getattr__', None)
+
+            def __getattr__(self, attr):
+                if attr in defaults:
+                    return defaults[attr]
+                if base_getattr is None:
+                    raise AttributeError('%r object has no attribute %r' % (
+                        type(self).__name__, attr))
+                return base_getattr(self, attr)
+
+            methods['__getattr__'] = __getattr__
+
+        if self.name is not None:
+            # the same tuple for every instance, so that it will only be
+            # pickled once for every tree.
+            args = (self.name, attr)
+
+            def __reduce__(self):
+                state = attributes(self)
+                if '_body' in state:
+                    # a lazily parsed function body, so parse it.
+                    self.elements
+                    state = attributes(self)
+                # the state of the slots are provided separately.
+                return (_new_instance, args, (None, state) if slots else state)
+
+            module_name, factory_name = self.name.rsplit('.', 1)
+            methods['__reduce__'] = __reduce__
+            methods['__module__'] = module_name
+            methods['__qualname__'] = factory_name + '.' + cls.__name__
+
+        # the first subclass stored wins, such that the threads racing
+        # through here will all return the same class.
+        subclass = self.classes.setdefault(
+            attr, type(cls.__name__, (cls,), methods))
+        # cache on the instance so that further lookups will not need
+        # to go through this method.
+        setattr(self, attr, subclass)
+        return subclass
 
 
 AstTypesFactory = partial(SRFactory, asttypes)
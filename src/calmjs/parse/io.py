@@ -3,13 +3,20 @@
 Generic io functions for use with parsers.
 """
 
+from __future__ import absolute_import
+
+import io
+from functools import partial
 from itertools import chain
 from collections import Iterable
+from calmjs.parse import binary
 from calmjs.parse.asttypes import Node
-from calmjs.parse import sourcemap
 from calmjs.parse.exceptions import ECMASyntaxError
 from calmjs.parse.utils import repr_compat
 
+# the parser for the worker processes started by parse_many.
+_worker_parser = None
+
 
 def read(parser, stream):
     """
@@ -44,6 +51,175 @@ def read(parser, stream):
     return result
 
 
+def iter_read(parser, stream):
+    """
+    Yield the nodes from the input ES5 stream as produced by the parser,
+    such as the top level statements as produced by an iter_parse
+    function, with the sourcepath of each set to the name of the stream.
+
+    Arguments
+
+    parser
+        A function that yields nodes from the text.
+    stream
+        Either a stream object or a callable that produces one, as with
+        read.
+    """
+
+    source = stream() if callable(stream) else stream
+    try:
+        text = source.read()
+        stream_name = getattr(source, 'name', None)
+    finally:
+        if callable(stream):
+            source.close()
+
+    try:
+        for node in parser(text):
+            node.sourcepath = stream_name
+            yield node
+    except ECMASyntaxError as e:
+        error_name = repr_compat(stream_name or source)
+        raise type(e)('%s in %s' % (str(e), error_name))
+
+
+def _open_source(source):
+    """
+    Turn a source for parse_many into what read accepts, where a path
+    is opened as an utf-8 encoded file, and a (text, name) tuple as
+    produced by _read_source is turned back into a named stream.
+    """
+
+    if isinstance(source, tuple):
+        text, name = source
+        stream = io.StringIO(text)
+        if name is not None:
+            stream.name = name
+        return stream
+    elif _is_path(source):
+        return partial(io.open, source, encoding='utf-8')
+    return source
+
+
+def _is_path(source):
+    return not (callable(source) or hasattr(source, 'read'))
+
+
+def _read_source(source):
+    """
+    Turn a source for parse_many into something that may be sent to a
+    worker process; streams (and callables that produce them) cannot be,
+    so they are read into a (text, name) tuple.  The exception raised
+    from the reading (e.g. the stream could not be opened or decoded)
+    is returned instead, to be produced as the result.
+    """
+
+    if _is_path(source):
+        return source
+    try:
+        stream = source() if callable(source) else source
+        try:
+            return stream.read(), getattr(stream, 'name', None)
+        finally:
+            if callable(source):
+                stream.close()
+    except Exception as e:
+        return e
+
+
+def _read_or_error(parser, source):
+    # any exception from the source (e.g. the syntax errors, or the
+    # bytes that cannot be decoded) is the result for that source.
+    try:
+        return read(parser, _open_source(source))
+    except Exception as e:
+        return e
+
+
+def _init_worker(parser):
+    global _worker_parser
+    _worker_parser = parser
+    # build the parser (e.g. its tables) before any actual work.
+    try:
+        parser(u'')
+    except Exception:
+        pass
+
+
+def _worker_read(source):
+    if isinstance(source, Exception):
+        # the error from reading the source in the parent process.
+        return False, source
+    result = _read_or_error(_worker_parser, source)
+    if isinstance(result, Node):
+        # the compact serialized form is much faster to load than the
+        # pickled form; fall back to pickle if that is not possible.
+        try:
+            return True, binary.dumps(result)
+        except ValueError:
+            pass
+    return False, result
+
+
+def _worker_result(result):
+    serialized, value = result
+    return binary.loads(value) if serialized else value
+
+
+def parse_many(parser, sources, jobs=None):
+    """
+    Parse the provided sources using a pool of worker processes, and
+    produce a (source, result) tuple for each source in the order they
+    were provided, where the result is the AST, or the exception if one
+    was raised for the source.
+
+    Arguments
+
+    parser
+        A parser callable; must be picklable if jobs is not 1, as it
+        will be sent to the worker processes.  The AST that it produces
+        is sent back using ``calmjs.parse.binary`` where possible, and
+        pickled otherwise.
+    sources
+        An iterable of the sources, which may be the path to a file
+        (which is read as utf-8), a stream object, or a callable that
+        produces one, as accepted by read.  Streams are read in this
+        process as they are sent to the worker processes.
+    jobs
+        The number of worker processes to use; defaults to the number
+        of CPUs available.  If 1, the sources will be parsed in this
+        process instead.
+
+    Like read, the syntax errors will have the name of the stream or
+    path appended to their message; these errors, along with any other
+    exception raised for a source (such as the errors from reading or
+    decoding it), are produced as the results rather than raised, such
+    that a single bad source does not abort the remaining sources.
+    """
+
+    sources = list(sources)
+    if jobs == 1 or len(sources) < 2:
+        for source in sources:
+            yield source, _read_or_error(parser, source)
+        return
+
+    # deferred, as processes are only needed here.
+    import multiprocessing
+    jobs = jobs or multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(jobs, _init_worker, (parser,))
+    try:
+        # the streams are only read as the pool takes on the sources.
+        results = pool.imap(
+            _worker_read, (_read_source(source) for source in sources),
+            max(1, len(sources) // (jobs * 4)))
+        for idx, result in enumerate(results):
+            yield sources[idx], _worker_result(result)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
 def write(
         unparser, nodes, output_stream, sourcemap_stream=None,
         sourcemap_normalize_mappings=True,
@@ -105,6 +281,9 @@ def write(
         None to disable this.
     """
 
+    # deferred, as the sourcemap module is only needed for writing.
+    from calmjs.parse import sourcemap
+
     closer = []
 
     def get_stream(stream):
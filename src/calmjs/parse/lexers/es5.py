@@ -27,9 +27,15 @@ from __future__ import unicode_literals
 __author__ = 'Ruslan Spivak <ruslan.spivak@gmail.com>'
 
 import re
+import sys
 import ply.lex
+from array import array
+from bisect import bisect_right
+from copy import copy
+from os.path import dirname
 
 from calmjs.parse.lexers.tokens import AutoLexToken
+from calmjs.parse.lexers.tokens import CompactTokens
 from calmjs.parse.utils import repr_compat
 from calmjs.parse.exceptions import (
     ECMASyntaxError,
@@ -42,6 +48,8 @@ from calmjs.parse.unicode_chars import (
     CONNECTOR_PUNCTUATION,
 )
 from calmjs.parse.utils import format_lex_token
+from calmjs.parse.utils import lexer_tables
+from calmjs.parse.utils import read_lextab
 
 # See "Regular Expression Literals" at
 # http://www.mozilla.org/js/language/js20-2002-04/rationale/syntax.html
@@ -67,6 +75,30 @@ IMPLIED_BLOCK_IDENTIFIER = frozenset([
     'IF',
 ])
 
+# the keywords that are followed by a block statement, and the ones
+# that are followed by a parenthesized clause and then a statement; a
+# slash after the closing brace of such a block must begin a regex.
+BLOCK_KEYWORDS = frozenset([
+    'ELSE', 'DO', 'TRY', 'FINALLY',
+])
+BLOCK_CLAUSE_KEYWORDS = frozenset([
+    'IF', 'FOR', 'WHILE', 'WITH', 'SWITCH', 'CATCH',
+])
+
+# the punctuators after which an operand must follow, such that an
+# increment or decrement operator following them must be a prefix, and
+# so a slash after that must begin a regex.  The left brace and period
+# are excluded as an operator following them is an error whenever it
+# is not a prefix.
+OPERAND_PUNCTUATORS = frozenset([
+    'COMMA', 'SEMI', 'COLON', 'PLUS', 'MINUS', 'MULT', 'DIV', 'MOD',
+    'BAND', 'BOR', 'BXOR', 'BNOT', 'CONDOP', 'NOT', 'LPAREN',
+    'LBRACKET', 'EQ', 'EQEQ', 'NE', 'STREQ', 'STRNEQ', 'LT', 'GT', 'LE',
+    'GE', 'OR', 'AND', 'LSHIFT', 'RSHIFT', 'URSHIFT', 'PLUSEQUAL',
+    'MINUSEQUAL', 'MULTEQUAL', 'DIVEQUAL', 'LSHIFTEQUAL', 'RSHIFTEQUAL',
+    'URSHIFTEQUAL', 'ANDEQUAL', 'MODEQUAL', 'XOREQUAL', 'OREQUAL',
+])
+
 
 # think of a better name for this, but this is mostly to address section
 # 7 of the spec.
@@ -78,10 +110,34 @@ COMMENTS = frozenset([
     'LINE_COMMENT', 'BLOCK_COMMENT'
 ])
 
+BRACKET_TOKENS = frozenset([
+    'LPAREN', 'RPAREN', 'LBRACE', 'RBRACE', 'LBRACKET', 'RBRACKET',
+])
+
+# the tokens with values that are generally unique to their occurrence
+# in the source, so they are not interned through the symbol table.
+UNINTERNED_TOKENS = frozenset([
+    'LINE_TERMINATOR', 'LINE_COMMENT', 'BLOCK_COMMENT', 'REGEX',
+])
+
 PATT_LINE_TERMINATOR_SEQUENCE = re.compile(
     r'(\n|\r(?!\n)|\u2028|\u2029|\r\n)', flags=re.S)
 PATT_LINE_CONTINUATION = re.compile(
     r'\\(\n|\r(?!\n)|\u2028|\u2029|\r\n)', flags=re.S)
+# the start of the named group of a rule in a master regular expression
+# as joined by ply.
+PATT_MASTER_GROUP = re.compile(r'(?:^|(?<=\|))\(\?P<(\w+)>')
+
+
+def line_index(text):
+    """
+    Return the index of the starts of the lines in the text, as an
+    array of the offsets in the order of the lines, which is the form
+    of the newline_idx of the Lexer.
+    """
+
+    return array(str('l'), [0] + [
+        m.end() for m in PATT_LINE_TERMINATOR_SEQUENCE.finditer(text)])
 
 
 PATT_BROKEN_STRING = re.compile(r"""
@@ -121,11 +177,6 @@ def broken_string_token_handler(lexer, token):
     # update the error token value to only include what was matched here
     # as this will be the actual token that "failed"
     token.value = match.group()
-    # calculate colno for current token colno before...
-    colno = lexer._get_colno(token)
-    # updating the newline indexes for the error reporting for raw
-    # lexpos
-    lexer._update_newline_idx(token)
     # probe for the next values (which no valid rules will match)
     position = lexer.lexer.lexpos + len(token.value)
     failure = lexer.lexer.lexdata[position:position + 2]
@@ -134,21 +185,252 @@ def broken_string_token_handler(lexer, token):
         seq = re.match(
             r'\\[xu][0-9-a-f-A-F]*', lexer.lexer.lexdata[position:]
         ).group()
+        lineno, colno = lexer.lookup_position(position)
         raise ECMASyntaxError(
             "Invalid %s escape sequence '%s' at %s:%s" % (
-                type_, seq, lexer.lineno,
-                lexer._get_colno_lexpos(position)
-            )
+                type_, seq, lineno, colno)
         )
     tl = 16  # truncate length
     raise ECMASyntaxError(
         'Unterminated string literal %s at %s:%s' % (
             repr_compat(
                 token.value[:tl].strip() + (token.value[tl:] and '...')),
-            token.lineno, colno)
+            token.lineno, token.colno)
     )
 
 
+def split_master_pattern(pattern):
+    """
+    Return the list of the names of the rules with their patterns, in
+    the order as they were joined into the master regular expression by
+    ply, where each of them is a named group.
+    """
+
+    groups = list(PATT_MASTER_GROUP.finditer(pattern))
+    # each group is followed by the '|' that joins them, except for the
+    # final one.
+    ends = [m.start() - 2 for m in groups[1:]] + [len(pattern) - 1]
+    return [(m.group(1), pattern[m.end():end]) for m, end in zip(groups, ends)]
+
+
+class Scanner(object):
+    """
+    The scanner that produces the raw tokens for the Lexer, in place of
+    the ply lexer that would be built from the rules of the Lexer.
+
+    The rules for every state are matched through a single compiled
+    alternation of the patterns as taken from the tables of the ply
+    lexer, with each followed by an empty named group for marking the
+    rule, such that the regular expression engine may skip over the
+    alternatives that cannot match from their first character alone
+    (which it will not do for ones that start with a group).  The name
+    of the group that matched maps directly to the type of the token,
+    such that the rule functions that only return the token are never
+    called, and the keywords are resolved through a lookup of the
+    keywords_dict of the lexer.  The runs of ignored characters are
+    skipped in place, and the tokens produced are identical to the ones
+    that the ply lexer would have produced.
+
+    The rules with the enormous classes of the unicode characters for
+    the identifiers are matched through their ASCII only forms instead,
+    which will not match where a non-ASCII character is involved, with
+    the alternation of the full forms only compiled and used at the
+    positions where no rule matched.
+
+    This implements the subset of the ply lexer interface used by the
+    Lexer and the rule functions, and like that this is constructed
+    once from the tables as a template to be cloned and bound to the
+    instance of the Lexer to be used.  Unlike the ply lexer, the lines
+    are not tracked, as the Lexer will look up the lineno of the tokens
+    from the index of the starts of the lines in the input.
+    """
+
+    def __init__(self, tables, inline_rules=None, ascii_rules=None):
+        """
+        The tables are the tables of the ply lexer, in the form as
+        written to the lextab module (see calmjs.parse.utils).
+
+        The inline_rules is a mapping of the names of the rule functions
+        that may be skipped as they only return the token, to whether
+        the type of the token is to be resolved from the keywords_dict.
+
+        The ascii_rules is a mapping of the names of the rules to their
+        full patterns and the ASCII only forms of those; the latter are
+        only used for the rules that have the same full patterns.
+        """
+
+        inline_rules = inline_rules or {}
+        ascii_rules = ascii_rules or {}
+        lexstatere, lexstateignore, lexstateerrorf, reflags = tables
+        self.reflags = reflags
+        self.states = {}
+        self.full_patterns = {}
+        # the alternations of the full patterns, compiled on demand and
+        # shared with the clones.
+        self.full_matches = {}
+        for state, lexre in lexstatere.items():
+            full = []
+            fast = []
+            rules = {}
+            for text, names in lexre:
+                for (name, rule), (func_name, type_) in zip(
+                        split_master_pattern(text),
+                        [entry for entry in names if entry is not None]):
+                    full.append('(?:%s)(?P<%s>)' % (rule, name))
+                    full_rule, ascii_rule = ascii_rules.get(name, (None, None))
+                    fast.append('(?:%s)(?P<%s>)' % (
+                        ascii_rule if rule == full_rule else rule, name))
+                    rules[name] = (
+                        None if func_name in inline_rules else func_name,
+                        type_, inline_rules.get(func_name, False),
+                    )
+            if full != fast:
+                self.full_patterns[state] = '|'.join(full)
+            errorf = lexstateerrorf.get(state)
+            ignore = lexstateignore.get(state, '')
+            self.states[state] = (
+                re.compile('|'.join(fast), reflags).match, rules, ignore,
+                ignore and re.compile('[%s]+' % re.escape(ignore)).match,
+                errorf,
+            )
+        self.statespecs = None
+        self.lexstate = None
+        self.lexspec = None
+        self.lexdata = None
+        self.lexlen = 0
+        self.lexpos = 0
+        self.lexmatch = None
+
+    def clone(self, obj):
+        """
+        Return a copy of this scanner with the rule functions bound to
+        the provided object.
+        """
+
+        scanner = copy(self)
+        keywords = obj.keywords_dict
+        scanner.statespecs = dict(
+            (state, (match, dict(
+                (name, (
+                    func_name and getattr(obj, func_name), type_,
+                    keywords if resolve else None,
+                )) for name, (func_name, type_, resolve) in rules.items()
+            ), ignore, skip, errorf and getattr(obj, errorf)))
+            for state, (match, rules, ignore, skip, errorf) in (
+                self.states.items())
+        )
+        scanner.begin('INITIAL')
+        return scanner
+
+    def full_match(self, state):
+        """
+        Return the match function for the alternation of the full
+        patterns of the rules for the state.
+        """
+
+        match = self.full_matches.get(state)
+        if match is None:
+            match = self.full_matches[state] = re.compile(
+                self.full_patterns[state], self.reflags).match
+        return match
+
+    def begin(self, state):
+        if state not in self.statespecs:
+            raise ValueError('Undefined state')
+        self.lexstate = state
+        self.lexspec = self.statespecs[state]
+
+    def input(self, s):
+        self.lexdata = s
+        self.lexpos = 0
+        self.lexlen = len(s)
+
+    def skip(self, n):
+        self.lexpos += n
+
+    def token(self):
+        lexdata = self.lexdata
+        lexpos = self.lexpos
+        lexlen = self.lexlen
+        match, rules, lexignore, skip, errorf = self.lexspec
+
+        while lexpos < lexlen:
+            if lexdata[lexpos] in lexignore:
+                lexpos = skip(lexdata, lexpos).end()
+                continue
+
+            m = match(lexdata, lexpos)
+            if m is None and self.lexstate in self.full_patterns:
+                m = self.full_match(self.lexstate)(lexdata, lexpos)
+
+            if m is None:
+                tok = ply.lex.LexToken()
+                tok.value = lexdata[lexpos:]
+                tok.type = 'error'
+                tok.lexer = self
+                tok.lexpos = lexpos
+                self.lexpos = lexpos
+                if errorf is None:
+                    raise ply.lex.LexError(
+                        "Illegal character '%s' at index %d" % (
+                            lexdata[lexpos], lexpos), lexdata[lexpos:])
+                newtok = errorf(tok)
+                if lexpos == self.lexpos:
+                    raise ply.lex.LexError(
+                        "Scanning error. Illegal character '%s'" % (
+                            lexdata[lexpos]), lexdata[lexpos:])
+                lexpos = self.lexpos
+                if not newtok:
+                    match, rules, lexignore, skip, errorf = self.lexspec
+                    continue
+                return newtok
+
+            func, type_, keywords = rules[m.lastgroup]
+            tok = ply.lex.LexToken()
+            tok.value = value = m.group()
+            tok.lexpos = lexpos
+            tok.type = type_ if keywords is None else keywords.get(
+                value, type_)
+            lexpos = m.end()
+
+            if func is None:
+                if type_ is None:
+                    # an ignored token.
+                    continue
+                self.lexpos = lexpos
+                return tok
+
+            tok.lexer = self
+            self.lexmatch = m
+            self.lexpos = lexpos
+            newtok = func(tok)
+            if not newtok:
+                lexpos = self.lexpos
+                match, rules, lexignore, skip, errorf = self.lexspec
+                continue
+            return newtok
+
+        self.lexpos = lexpos + 1
+        if self.lexdata is None:
+            raise RuntimeError('No input string given with input()')
+        return None
+
+
+# the rule functions defined by the Lexer that only return the token,
+# mapped to whether the type is to be resolved from the keywords_dict;
+# the Scanner will inline the ones not overridden by the subclasses.
+INLINE_RULES = {
+    't_STRING': False,
+    't_GETPROP': False,
+    't_SETPROP': False,
+    't_ID': True,
+}
+
+# Scanners built for the Lexer classes, keyed by the class and the
+# arguments used for building.
+_lexer_templates = {}
+
+
 class Lexer(object):
     """A JavaScript lexer.
 
@@ -188,24 +470,25 @@ class Lexer(object):
     For more information see:
     http://www.ecma-international.org/publications/files/ECMA-ST/ECMA-262.pdf
     """
-    def __init__(self, with_comments=False, yield_comments=False):
+    def __init__(self, with_comments=False, yield_comments=False,
+                 positions='full', symbols=None, **kwargs):
         self.lexer = None
-        self.prev_token = None
-        # valid_prev_token is for syntax error hint, and also for
-        # tracking real tokens
-        self.valid_prev_token = None
-        self.cur_token = None
-        self.cur_token_real = None
-        self.next_tokens = []
-        self.token_stack = [[None, []]]
-        self.newline_idx = [0]
+        # the symbol table for interning the values of the tokens, such
+        # that every occurrence of the same identifier, keyword, string
+        # or punctuator will share the same value; a new one is created
+        # for every input unless one is provided to be shared.
+        self.shared_symbols = symbols
+        self.reset()
         self.error_token_handlers = [
             broken_string_token_handler,
         ]
         self.with_comments = with_comments
         self.yield_comments = yield_comments
-        self.hidden_tokens = []
-        self.build()
+        # the level of the positions to be tracked by the nodes produced
+        # by the parsers from the tokens; see Node.setpos.
+        self.positions = positions
+        # remaining keyword arguments are for building.
+        self.build(**kwargs)
 
         if not with_comments:
             # just reassign the method.
@@ -213,7 +496,7 @@ class Lexer(object):
 
     @property
     def lineno(self):
-        return self.lexer.lineno if self.lexer else 0
+        return self.lookup_position(self.lexer.lexpos)[0] if self.lexer else 0
 
     @property
     def lexpos(self):
@@ -221,28 +504,171 @@ class Lexer(object):
 
     @property
     def last_newline_lexpos(self):
-        return self.newline_idx[-1]
+        return self.newline_idx[self.lineno - 1]
 
     def build(self, **kwargs):
-        """Build the lexer."""
-        self.lexer = ply.lex.lex(object=self, **kwargs)
+        """
+        Build the lexer.
+
+        The rules are built into a ply lexer, from which the tables for
+        constructing the Scanner that tokenizes the input are taken.
+        That is only done once for a given Lexer class and set of
+        keyword arguments, as that involves the reflection of all the
+        rules and the compilation of the master regular expressions;
+        all subsequent builds will be done through cloning that Scanner
+        and binding the clone to this instance.
+
+        If optimize is enabled with a lextab specified, the tables will
+        be read directly from the lextab module if available, skipping
+        the validation of the rules and the compilation of the regular
+        expressions done by ply.  Should the lextab be out of date with
+        the rules, the lexer is built by ply from the rules instead, and
+        the lextab is written again from that.
+        """
+
+        key = (type(self), tuple(sorted(kwargs.items())))
+        template = _lexer_templates.get(key)
+        if template is None:
+            tables = None
+            stale = None
+            if kwargs.get('optimize') and kwargs.get('lextab'):
+                try:
+                    tables = read_lextab(kwargs['lextab'], self)
+                except ImportError:
+                    # fall through to have ply generate it; the lextab
+                    # that got imported is out of date.
+                    stale = sys.modules.pop(kwargs['lextab'], None)
+            if tables is None and stale is not None:
+                # as that would be read as is by an optimized ply lexer,
+                # it is built without and the lextab written from that.
+                lexer = ply.lex.lex(object=self, **dict(
+                    kwargs, optimize=False))
+                try:
+                    lexer.writetab(kwargs['lextab'], dirname(stale.__file__))
+                except IOError:
+                    pass
+                tables = lexer_tables(lexer)
+            elif tables is None:
+                tables = lexer_tables(ply.lex.lex(object=self, **kwargs))
+            # the Scanner only retains the names of the rule functions,
+            # so it will not retain a reference to this instance.
+            template = Scanner(tables, dict(
+                (name, resolve) for name, resolve in INLINE_RULES.items()
+                if getattr(getattr(type(self), name), '__func__', getattr(
+                    type(self), name)) is vars(Lexer)[name]
+            ), self.ascii_rules)
+            _lexer_templates[key] = template
+        self.lexer = template.clone(self)
+
+    def clone(self):
+        """
+        Return a new lexer with the same configuration as this one that
+        shares the same built rules, but without any of the states.
+        """
+
+        lexer = copy(self)
+        lexer.reset()
+        lexer.error_token_handlers = list(self.error_token_handlers)
+        lexer.lexer = self.lexer.clone(lexer)
+        if not self.with_comments:
+            lexer.token = lexer._token
+        return lexer
+
+    def reset(self):
+        """
+        Reset all the tracked states associated with the input, such
+        that this lexer may be reused for another input.
+        """
 
-    def input(self, text):
+        self.prev_token = None
+        # valid_prev_token is for syntax error hint, and also for
+        # tracking real tokens
+        self.valid_prev_token = None
+        self.cur_token = None
+        self.cur_token_real = None
+        self.next_tokens = []
+        self.token_stack = [[None, []]]
+        self.newline_idx = line_index('')
+        # the lineno, start and end of the line of the last token, as
+        # the lookup is skipped for the following tokens on that line.
+        self.line = (0, 0, 0)
+        self.hidden_tokens = []
+        # for every open bracket, whether it opens a block statement (or
+        # the clause of one, for parentheses).
+        self.brackets = []
+        self.clause_end_token = None
+        # the token after which a slash must begin a regex, even though
+        # the type of the token typically implies a division.
+        self.regex_prefix_token = None
+        self.symbols = (
+            {} if self.shared_symbols is None else self.shared_symbols)
+
+    def input(self, text, newline_idx=None):
+        """
+        Provide the text to be tokenized.  The index of the starts of
+        its lines (the newline_idx) is built, unless it is provided.
+        """
+
+        self.reset()
+        self.newline_idx = (
+            line_index(text) if newline_idx is None else newline_idx)
+        self.lexer.begin('INITIAL')
         self.lexer.input(text)
 
-    def _update_newline_idx(self, token):
-        lexpos = token.lexpos
-        fragments = PATT_LINE_TERMINATOR_SEQUENCE.split(token.value)
-        for fragment, newline in zip(*[iter(fragments)] * 2):
-            lexpos += len(fragment + newline)
-            self.lexer.lineno += 1
-            self.newline_idx.append(lexpos)
+    def tokenize_compact(self, text):
+        """
+        Return the tokens of the text as CompactTokens, for the uses
+        that only need the tokens, as no token will be retained.  Note
+        that this is not faster than producing the list of the tokens,
+        as every token is still produced by this lexer (the arrays add
+        a slight cost); only the memory held by the result is reduced.
+
+        These are the tokens produced by this lexer, except for the
+        automatic semicolons as they are not found in the text; the
+        comments are only included if they are yielded.
+        """
+
+        self.input(text)
+        result = CompactTokens(text, self.tokens)
+        codes = dict((name, code) for code, name in enumerate(result.names))
+        types = result.types.append
+        starts = result.starts.append
+        ends = result.ends.append
+        linenos = result.linenos.append
+        next_token = self._token
+        hidden_tokens = self.hidden_tokens
+        while True:
+            token = next_token()
+            if token is None:
+                return result
+            if hidden_tokens:
+                del hidden_tokens[:]
+            type_ = token.type
+            if type_ == 'AUTOSEMI':
+                continue
+            lexpos = token.lexpos
+            types(codes[type_])
+            starts(lexpos)
+            ends(lexpos + len(token.value))
+            linenos(token.lineno)
 
     def get_lexer_token(self):
         token = self.lexer.token()
         if token:
-            token.colno = self._get_colno(token)
-            self._update_newline_idx(token)
+            lexpos = token.lexpos
+            lineno, start, end = self.line
+            if not start <= lexpos < end:
+                newline_idx = self.newline_idx
+                lineno = bisect_right(newline_idx, lexpos)
+                start = newline_idx[lineno - 1]
+                end = (
+                    newline_idx[lineno] if lineno < len(newline_idx) else
+                    len(self.lexer.lexdata) + 1)
+                self.line = (lineno, start, end)
+            token.lineno = lineno
+            token.colno = lexpos - start + 1
+            if token.type not in UNINTERNED_TOKENS:
+                token.value = self.symbols.setdefault(token.value, token.value)
         return token
 
     def backtracked_token(self, pos=1):
@@ -319,7 +745,8 @@ class Lexer(object):
                     self.token_stack[-1][0].type in TOKENS_THAT_IMPLY_DIVISON
                 )
             )
-            if is_division_allowed:
+            if is_division_allowed and (
+                    check_token is not self.regex_prefix_token):
                 return self._get_update_token()
             else:
                 self._set_tokens(self._read_regex())
@@ -373,6 +800,13 @@ class Lexer(object):
                 else:
                     self.token_stack.pop()
 
+            if self.cur_token.type in BRACKET_TOKENS:
+                self._update_brackets(self.cur_token)
+            elif self.cur_token.type in ('PLUSPLUS', 'MINUSMINUS') and (
+                    self.valid_prev_token is not None and
+                    self.valid_prev_token.type in OPERAND_PUNCTUATORS):
+                self.regex_prefix_token = self.cur_token
+
             if not self.token_stack:
                 # TODO actually give up earlier than this with the first
                 # mismatch.
@@ -395,13 +829,39 @@ class Lexer(object):
 
         return self.cur_token
 
+    def _update_brackets(self, token):
+        """
+        Track the brackets for the closing braces of the block
+        statements, such that a slash that follows one of those will be
+        read as a regex right away, rather than as a division that the
+        parsers would have to backtrack from.
+        """
+
+        prev_token = self.valid_prev_token
+        if token.type == 'LBRACE':
+            self.brackets.append(prev_token is not None and (
+                prev_token.type in BLOCK_KEYWORDS or
+                prev_token is self.clause_end_token
+            ))
+        elif token.type == 'LPAREN':
+            self.brackets.append(
+                prev_token is not None and
+                prev_token.type in BLOCK_CLAUSE_KEYWORDS
+            )
+        elif token.type == 'LBRACKET':
+            self.brackets.append(False)
+        # the closing brackets; if unbalanced, leave it to the parsers.
+        elif self.brackets and self.brackets.pop():
+            if token.type == 'RBRACE':
+                self.regex_prefix_token = token
+            elif token.type == 'RPAREN':
+                self.clause_end_token = token
+
     def _get_colno(self, token):
-        # have a 1 offset to map nicer to commonly used/configured
-        # text editors.
         return self._get_colno_lexpos(token.lexpos)
 
     def _get_colno_lexpos(self, lexpos):
-        return lexpos - self.last_newline_lexpos + 1
+        return self.lookup_position(lexpos)[1]
 
     def lookup_colno(self, lineno, lexpos):
         """
@@ -412,6 +872,15 @@ class Lexer(object):
         # text editors.
         return lexpos - self.newline_idx[lineno - 1] + 1
 
+    def lookup_position(self, lexpos):
+        """
+        Look up the lineno and colno of any lexpos in the input.
+        """
+
+        newline_idx = self.newline_idx
+        lineno = bisect_right(newline_idx, lexpos)
+        return lineno, lexpos - newline_idx[lineno - 1] + 1
+
     def _create_semi_token(self, orig_token):
         token = AutoLexToken()
         token.type = 'AUTOSEMI'
@@ -527,9 +996,10 @@ class Lexer(object):
     t_regex_ignore = ' \t'
 
     def t_regex_error(self, token):
+        token.lineno, token.colno = self.lookup_position(token.lexpos)
         raise ECMARegexSyntaxError(
             "Error parsing regular expression '%s' at %s:%s" % (
-                token.value, token.lineno, self._get_colno(token))
+                token.value, token.lineno, token.colno)
         )
 
     # Punctuators
@@ -678,7 +1148,22 @@ class Lexer(object):
         token.type = self.keywords_dict.get(token.value, 'ID')
         return token
 
+    # the ASCII only forms of the patterns of the rules above, for the
+    # Scanner to match with before falling back to the full patterns;
+    # the identifier must not be followed by a non-ASCII character, nor
+    # by one after a whitespace for the property rules, and that the
+    # identifier characters are also excluded so that it will not match
+    # any shorter by backtracking.
+    ascii_identifier = r'[a-zA-Z_$][0-9a-zA-Z_$]*'
+    ascii_rules = {
+        't_GETPROP': (getprop, r'get(?=\s' + ascii_identifier + r')'),
+        't_SETPROP': (setprop, r'set(?=\s' + ascii_identifier + r')'),
+        't_ID': (identifier, ascii_identifier + (
+            r'(?![0-9a-zA-Z_$]|[^\x00-\x7f]|\s[^\x00-\x7f])')),
+    }
+
     def t_error(self, token):
+        token.lineno, token.colno = self.lookup_position(token.lexpos)
         for handler in self.error_token_handlers:
             handler(self, token)
 
@@ -687,13 +1172,13 @@ class Lexer(object):
             raise ECMASyntaxError(
                 'Illegal character %s at %s:%s after %s' % (
                     repr_compat(token.value[0]), token.lineno,
-                    self._get_colno(token), format_lex_token(self.cur_token),
+                    token.colno, format_lex_token(self.cur_token),
                 )
             )
         else:
             raise ECMASyntaxError(
                 'Illegal character %s at %s:%s' % (
                     repr_compat(token.value[0]), token.lineno,
-                    self._get_colno(token),
+                    token.colno,
                 )
             )
@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 """
-Specialized lexer token subclasses.
+Specialized lexer token subclasses, and the compact form of the tokens.
 """
 
+from array import array
+
 from ply.lex import LexToken
 
 
@@ -10,3 +12,43 @@ class AutoLexToken(LexToken):
     """
     Special type for automatically generated tokens.
     """
+
+
+class CompactTokens(object):
+    """
+    The tokens lexed from a text, held as the parallel arrays of the
+    codes of their types, their start and end offsets, and their line
+    numbers, such that no token object will be retained.  The codes are
+    the indexes of the names of the types in names, and the values are
+    sliced from the text on demand.
+    """
+
+    __slots__ = ('text', 'names', 'types', 'starts', 'ends', 'linenos')
+
+    def __init__(self, text, names):
+        self.text = text
+        self.names = tuple(names)
+        self.types = array('B' if len(self.names) <= 256 else 'H')
+        self.starts = array('l')
+        self.ends = array('l')
+        self.linenos = array('l')
+
+    def __len__(self):
+        return len(self.types)
+
+    def __iter__(self):
+        """
+        Produce the type, value, lineno and lexpos of every token.
+        """
+
+        names = self.names
+        text = self.text
+        for code, start, end, lineno in zip(
+                self.types, self.starts, self.ends, self.linenos):
+            yield names[code], text[start:end], lineno, start
+
+    def get_type(self, index):
+        return self.names[self.types[index]]
+
+    def get_value(self, index):
+        return self.text[self.starts[index]:self.ends[index]]
@@ -24,23 +24,59 @@
 
 __author__ = 'Ruslan Spivak <ruslan.spivak@gmail.com>'
 
+from copy import copy
 from functools import partial
 
 import ply.yacc
 
+from calmjs.parse.asttypes import attributes
 from calmjs.parse.exceptions import ECMASyntaxError
 from calmjs.parse.exceptions import ProductionError
 from calmjs.parse.lexers.tokens import AutoLexToken
 from calmjs.parse.lexers.es5 import Lexer
+from calmjs.parse.parsers.es5_rd import RDParser
+from calmjs.parse.parsers.es5_rd import reparse as rd_reparse
 from calmjs.parse.factory import AstTypesFactory
-from calmjs.parse.unparsers.es5 import pretty_print
 from calmjs.parse.walkers import ReprWalker
+from calmjs.parse.utils import bind_productions
 from calmjs.parse.utils import generate_tab_names
-from calmjs.parse.utils import format_lex_token
+from calmjs.parse.utils import read_yacctab
+from calmjs.parse.utils import format_syntax_error
 from calmjs.parse.utils import str
 from calmjs.parse.io import read as io_read
+from calmjs.parse.io import iter_read as io_iter_read
+from calmjs.parse.io import parse_many as io_parse_many
 
-asttypes = AstTypesFactory(pretty_print, ReprWalker())
+
+def pretty_print(node):
+    # the unparser is only imported when a node is first turned into a
+    # string, so that it is not a cost incurred by just parsing.
+    from calmjs.parse.unparsers.es5 import pretty_print
+    return pretty_print(node)
+
+
+asttypes = AstTypesFactory(
+    pretty_print, ReprWalker(), name=__name__ + '.asttypes')
+
+# the variant with slotted classes, for the nodes without a __dict__, to
+# be passed as the asttypes argument to the Parser.
+slotted_asttypes = AstTypesFactory(
+    pretty_print, ReprWalker(), name=__name__ + '.slotted_asttypes',
+    slots=True)
+
+# ply LR parsers built for the Parser classes, keyed by the class and the
+# arguments used for building.
+_lrparser_templates = {}
+
+# the shared Parser instances used by the parse function, keyed by the
+# arguments used for their construction.
+_parsers = {}
+
+# the available parsing engines.
+ENGINES = ('lalr', 'rd')
+
+# the levels of the positions that may be tracked for the nodes.
+POSITIONS = ('none', 'node', 'full')
 
 # The default values for the `Parser` constructor, passed on to ply; they must
 # be strings
@@ -55,13 +91,57 @@ class Parser(object):
 
     '*nobf' stands for 'no brace or function'
 
-    This is a stateful, low level parser.  Please use the parse function
-    instead for general, higher level usage.
+    The engine may be either 'lalr' (the default), which parses using
+    the LALR parser generated by ply from the production rules defined
+    here, or 'rd', which parses using the hand written recursive descent
+    parser that produces the identical trees at a fraction of the cost.
+    Should the 'rd' engine fail to parse the input, the input will be
+    reparsed using the LALR parser such that the errors reported will
+    be identical between the two.  Note that positions are always
+    tracked by the 'rd' engine, regardless of ``yacc_tracking``.
+
+    If lazy_functions is enabled (only available for the 'rd' engine),
+    the bodies of the functions are only checked for balanced brackets
+    and skipped, such that the elements of the FuncDecl and FuncExpr
+    nodes will only be parsed when they are first accessed.  This is
+    useful when only the top level structure is needed, as the cost of
+    building the bodies is not paid.  Should the input fail to parse,
+    the LALR parser will produce the complete tree, or the error.  As
+    only the brackets of the bodies are checked, the syntax errors
+    within them are only raised when the elements are first accessed,
+    and are reported by the 'rd' engine directly (formatted in the same
+    way as the LALR parser) rather than through a reparse.
+
+    The positions argument sets the level of the positions tracked for
+    the nodes; 'full' (the default) for the position of every node
+    along with the token map of the positions of the tokens that
+    produced it (required for the generation of source maps), 'node'
+    for only the lexpos, lineno and colno of every node, or 'none' for
+    none of these, for when they are not needed (e.g. for minifying
+    without source maps) such that their cost is not paid.
+
+    The values of the identifiers, strings and other tokens are interned
+    through a symbol table for each parse, such that all occurrences of
+    the same value in the tree will be the same object.  A dict may be
+    provided as symbols to be used as the table for all the parses done
+    through this instance instead, such that the values are shared by
+    all the trees produced.
+
+    This is a low level parser.  Please use the parse function instead
+    for general, higher level usage.
+
+    An instance holds the compiled lexer and parsing tables along with
+    the configuration, none of which are modified during parsing; each
+    call to the parse method will create a lightweight context that
+    tracks all the states for that particular call, such that a single
+    instance may be used by multiple threads concurrently.
     """
 
     def __init__(self, lex_optimize=True, lextab=lextab,
                  yacc_optimize=True, yacctab=yacctab, yacc_debug=False,
-                 yacc_tracking=True, with_comments=False, asttypes=asttypes):
+                 yacc_tracking=True, with_comments=False, asttypes=asttypes,
+                 engine='lalr', lazy_functions=False, positions='full',
+                 symbols=None):
         # A warning: in order for line numbers and column numbers be
         # tracked correctly, ``yacc_tracking`` MUST be turned ON.  As
         # this parser was initially implemented with a number of manual
@@ -80,42 +160,218 @@ class Parser(object):
         self.yacc_debug = yacc_debug
         self.yacc_tracking = yacc_tracking
 
-        self.lexer = Lexer(with_comments=with_comments)
-        self.lexer.build(optimize=lex_optimize, lextab=lextab)
+        if engine not in ENGINES:
+            raise ValueError('engine must be one of %r; got %r' % (
+                ENGINES, engine))
+        self.engine = engine
+        if lazy_functions and engine != 'rd':
+            raise ValueError("lazy_functions requires the 'rd' engine")
+        self.lazy_functions = lazy_functions
+        if positions not in POSITIONS:
+            raise ValueError('positions must be one of %r; got %r' % (
+                POSITIONS, positions))
+        self.positions = positions
+
+        self.lexer = Lexer(
+            with_comments=with_comments, positions=positions,
+            symbols=symbols, optimize=lex_optimize, lextab=lextab)
         self.tokens = self.lexer.tokens
 
-        self.parser = ply.yacc.yacc(
-            module=self, optimize=yacc_optimize,
-            debug=yacc_debug, tabmodule=yacctab, start='program')
+        self.parser = self.build(
+            optimize=yacc_optimize, debug=yacc_debug, tabmodule=yacctab,
+            start='program')
 
         self.asttypes = asttypes
 
+    def build(self, **kwargs):
+        """
+        Build the LR parser for this instance.
+
+        As the construction of the LR parser through ply involves the
+        reflection of all the production rules and the loading of the
+        parsing tables, that will only be done once for a given Parser
+        class and set of keyword arguments.  Subsequent builds will
+        reuse the resulting tables, with only the production rules
+        rebound to this instance.
+
+        If optimize is enabled, the tables will be read directly from
+        the tabmodule if available, skipping the parsing of the grammar
+        from the production rules done by ply; the rules are only
+        reflected on for checking the signature of the tabmodule.
+        Should that be out of date, the tables will be generated by ply
+        and the tabmodule written again.
+        """
+
+        key = (type(self), tuple(sorted(kwargs.items())))
+        template = _lrparser_templates.get(key)
+        if template is None:
+            if kwargs.get('optimize') and not kwargs.get('picklefile'):
+                try:
+                    template = read_yacctab(kwargs.get(
+                        'tabmodule', ply.yacc.tab_module), self,
+                        kwargs.get('start'))
+                except (ImportError, AttributeError, ply.yacc.VersionError):
+                    # fall through to have ply generate it, without the
+                    # optimize flag as that has ply read a tabmodule
+                    # without checking its signature.
+                    template = ply.yacc.yacc(module=self, **dict(
+                        kwargs, optimize=False))
+            if template is None:
+                template = ply.yacc.yacc(module=self, **kwargs)
+            _lrparser_templates[key] = template
+            # only retain the names of the rules for the template so it
+            # will not retain a reference to this instance.
+            template.productions = bind_productions(
+                template.productions, None)
+            template.errorfunc = None
+
+        parser = copy(template)
+        parser.productions = bind_productions(template.productions, self)
+        parser.errorfunc = self.p_error
+        return parser
+
     def _raise_syntax_error(self, token):
-        tokens = [format_lex_token(t) for t in [
+        raise ECMASyntaxError(format_syntax_error(
             self.lexer.valid_prev_token,
             None if isinstance(token, AutoLexToken) else token,
-            self.lexer.token()
-        ] if t is not None]
-        msg = (
-            'Unexpected end of input',
-            'Unexpected end of input after {0}',
-            'Unexpected {1} after {0}',
-            'Unexpected {1} between {0} and {2}',
-        )
-        raise ECMASyntaxError(msg[len(tokens)].format(*tokens))
+            self.lexer.token(),
+        ))
+
+    def context(self):
+        """
+        Return a parsing context for a single parse.
+
+        This is a shallow copy of this instance, with its own lexer and
+        LR parser that share the rules and tables with this instance,
+        but will have their own states.  The production rules remain
+        bound to this instance, as they only construct the nodes.
+        """
+
+        context = copy(self)
+        context.lexer = self.lexer.clone()
+        context.parser = copy(self.parser)
+        context.parser.errorfunc = context.p_error
+        return context
 
     def parse(self, text, debug=False):
         if not isinstance(text, str):
             raise TypeError("'%s' argument expected, got '%s'" % (
                 str.__name__, type(text).__name__))
 
+        if self.engine == 'rd' and not debug:
+            try:
+                return RDParser(
+                    self.asttypes, self.lexer.clone(),
+                    lazy=self.lazy_functions,
+                ).parse(text)
+            except (ECMASyntaxError, RuntimeError):
+                # a RuntimeError may be raised due to the recursion limit
+                # being reached; in either case, let the LALR parser deal
+                # with the input.
+                pass
+
+        return self._parse_lalr(text, debug=debug)
+
+    def _parse_lalr(self, text, debug=False):
+        context = self.context()
         try:
-            return self.parser.parse(
-                text, lexer=self.lexer, debug=debug,
-                tracking=self.yacc_tracking)
+            return context.parser.parse(
+                text, lexer=context.lexer, debug=debug,
+                tracking=self.yacc_tracking, tokenfunc=context.token)
         except ProductionError as e:
             raise e.args[0]
 
+    def iter_parse(self, text):
+        """
+        Yield the top level statements (the children of the program
+        node that would be returned by parse) from the text, as each of
+        them are parsed.
+
+        This is done using the 'rd' engine regardless of the engine of
+        this parser, such that only the tree of the statement being
+        parsed is held by the parser at any time, which allows texts
+        much larger than what their complete trees would permit to be
+        processed statement by statement.
+
+        Should that fail (i.e. a syntax error, or a statement nested too
+        deeply), the entire text is parsed again by the LALR parser, for
+        the error or the rest of the statements.  Note that this builds
+        the complete tree for the text, of which only the statements
+        after the ones already yielded are produced, such that for such
+        an input the memory required is no less than that of parse.
+        """
+
+        if not isinstance(text, str):
+            raise TypeError("'%s' argument expected, got '%s'" % (
+                str.__name__, type(text).__name__))
+
+        nodes = RDParser(
+            self.asttypes, self.lexer.clone(), lazy=self.lazy_functions,
+        ).iter_parse(text)
+        count = 0
+        while True:
+            try:
+                node = next(nodes)
+            except StopIteration:
+                return
+            except (ECMASyntaxError, RuntimeError):
+                break
+            count += 1
+            yield node
+
+        for node in self._parse_lalr(text).children()[count:]:
+            yield node
+
+    def reparse(self, tree, old_text, new_text):
+        """
+        Return the tree for new_text, given the tree produced by this
+        parser from old_text.
+
+        Rather than parsing new_text in full, the statements around the
+        edited range of the text within the innermost function or block
+        that contains the edit are parsed again using the recursive
+        descent parser and spliced into the tree, with the positions of
+        all the following nodes shifted.  The tree is modified in place
+        and returned, unless a full parse was required.
+        """
+
+        if not isinstance(new_text, str):
+            raise TypeError("'%s' argument expected, got '%s'" % (
+                str.__name__, type(new_text).__name__))
+
+        result = rd_reparse(
+            self.asttypes, self.lexer, tree, old_text, new_text,
+            lazy=self.lazy_functions)
+        if result is None:
+            result = self.parse(new_text)
+            if tree.sourcepath is not None:
+                result.sourcepath = tree.sourcepath
+        return result
+
+    def token(self):
+        """
+        Produce the next token for the LR parser of a parsing context.
+
+        Where the token cannot be accepted by the current state of the
+        LR parser while an AUTOSEMI can, and that an automatic semicolon
+        may be inserted before the token, the AUTOSEMI is produced here
+        in place of going through the error handling of the LR parser
+        and p_error.  As the LR parser may only find the token to be an
+        error after some reductions, p_error remains for those cases.
+        """
+
+        lexer = self.lexer
+        token = lexer.token()
+        if token is not None and (token.type in ('SEMI', 'AUTOSEMI') or not (
+                token.type == 'RBRACE' or lexer._is_prev_token_lt())):
+            return token
+
+        actions = self.parser.action[self.parser.statestack[-1]]
+        if ('$end' if token is None else token.type) not in actions and (
+                'AUTOSEMI' in actions):
+            return lexer.auto_semi(token)
+        return token
+
     def p_empty(self, p):
         """empty :"""
 
@@ -377,8 +633,9 @@ class Parser(object):
             p[0] = p[1]
         # TODO there should be a cleaner API for the lexer and their
         # token types for ensuring that the mappings are available.
-        p[0][0]._token_map = {(',' * p[0][0].value): [
-            p[0][0].findpos(p, 0)]}
+        if self.positions == 'full':
+            p[0][0]._token_map = {(',' * p[0][0].value): [
+                p[0][0].findpos(p, 0)]}
         return
 
     def p_object_literal(self, p):
@@ -429,10 +686,12 @@ class Parser(object):
     def p_identifier_name_string(self, p):
         """identifier_name_string : identifier_name
         """
-        p[0] = asttypes.PropIdentifier(p[1].value)
-        # manually clone the position attributes.
-        for k in ('_token_map', 'lexpos', 'lineno', 'colno'):
-            setattr(p[0], k, getattr(p[1], k))
+        p[0] = self.asttypes.PropIdentifier(p[1].value)
+        # manually clone the position attributes, where tracked.
+        attrs = attributes(p[1])
+        for k in ('lexpos', 'lineno', 'colno', '_token_map'):
+            if k in attrs:
+                setattr(p[0], k, attrs[k])
 
     # identifier_name_string ~= identifier_name
     def p_property_name(self, p):
@@ -1155,7 +1414,9 @@ class Parser(object):
         # which would result in an infinite loop in this case.
 
         if isinstance(p[1], self.asttypes.FuncExpr):
-            _, line, col = p[1].getpos('(', 0)
+            _, line, col = (
+                p[1].getpos('(', 0) if self.positions == 'full' else
+                p[1].findpos(p, 1))
             raise ProductionError(ECMASyntaxError(
                 'Function statement requires a name at %s:%s' % (line, col)))
 
@@ -1208,8 +1469,9 @@ class Parser(object):
                 # positions
                 node = self.asttypes.EmptyStatement(';')
                 node.setpos(p, key - 1)
-                node.lexpos += 1
-                node.colno += 1
+                if self.positions != 'none':
+                    node.lexpos += 1
+                    node.colno += 1
             else:
                 node = self.asttypes.ExprStatement(expr=node)
                 node.setpos(p, key)
@@ -1479,13 +1741,57 @@ class Parser(object):
         p[0] = p[1]
 
 
-def parse(source, with_comments=False):
+def _get_parser(with_comments, engine, lazy_functions, positions):
+    key = (with_comments, engine, lazy_functions, positions)
+    parser = _parsers.get(key)
+    if parser is None:
+        parser = _parsers[key] = Parser(
+            with_comments=with_comments, engine=engine,
+            lazy_functions=lazy_functions, positions=positions)
+    return parser
+
+
+def parse(source, with_comments=False, engine='lalr', lazy_functions=False,
+          positions='full'):
     """
     Return an AST from the input ES5 source.
+
+    The engine, lazy_functions and positions arguments select the
+    parsing engine, whether the function bodies are parsed lazily, and
+    the level of the positions tracked; see the Parser class for
+    details.
+    """
+
+    return _get_parser(
+        with_comments, engine, lazy_functions, positions).parse(source)
+
+
+def reparse(tree, old_text, new_text, with_comments=False, engine='lalr',
+            lazy_functions=False, positions='full'):
+    """
+    Return the AST for the new_text, given the tree parsed from old_text
+    with the same arguments, through updating the tree with only the
+    edited statements parsed again where possible; see the reparse
+    method of the Parser class for details.
+    """
+
+    return _get_parser(
+        with_comments, engine, lazy_functions, positions,
+    ).reparse(tree, old_text, new_text)
+
+
+def iter_parse(source, with_comments=False, lazy_functions=False,
+               positions='full'):
+    """
+    Yield the top level statements from the input ES5 source as each of
+    them are parsed; see the iter_parse method of the Parser class for
+    details, including the fallback that builds the complete tree.
     """
 
-    parser = Parser(with_comments=with_comments)
-    return parser.parse(source)
+    return _get_parser(
+        with_comments, 'rd', lazy_functions, positions).iter_parse(source)
 
 
 read = partial(io_read, parse)
+iter_read = partial(io_iter_read, iter_parse)
+parse_many = partial(io_parse_many, parse)
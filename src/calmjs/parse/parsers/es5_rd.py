@@ -0,0 +1,1334 @@
+# -*- coding: utf-8 -*-
+"""
+A hand written recursive descent parser for ES5.
+
+This produces the exact same trees (including all the positions and the
+comments) as the LALR parser provided by ``calmjs.parse.parsers.es5``,
+as it faithfully follows its grammar (quirks included), but without the
+overhead of the ply production objects and the reductions through the
+many intermediate rules, so it is considerably faster.  Rather than
+providing its own set of error messages, any syntax error encountered
+here is meant to be handled by having the LALR parser reparse the input,
+such that the reported errors will always be identical; please use the
+``Parser`` class from that module with ``engine='rd'`` instead of this
+parser directly.
+
+The binary expressions are parsed through precedence climbing, while
+the '*noin' and '*nobf' variants of the rules are tracked by a mode that
+is passed down.  The positions of the nodes are set up in the same way
+as ``Node.setpos`` would, given the tokens that would have been in the
+production.
+
+If lazy, the bodies of the functions are only lexed and checked for
+balanced brackets, with the function nodes given a ``FunctionBody``
+that parses the body from its opening brace when the elements of the
+node are first accessed.
+
+The ``reparse`` function provides the incremental reparsing of an
+edited source, where only the statements around the edit within the
+innermost function or block containing it are parsed again.
+"""
+
+from __future__ import unicode_literals
+
+from bisect import bisect_right
+from collections import defaultdict
+
+from calmjs.parse.asttypes import Block
+from calmjs.parse.asttypes import FuncBase
+from calmjs.parse.exceptions import ECMASyntaxError
+from calmjs.parse.lexers.es5 import line_index
+from calmjs.parse.lexers.tokens import AutoLexToken
+from calmjs.parse.utils import format_syntax_error
+
+# the modes for the expressions, for the '*noin' and '*nobf' variants.
+NORMAL = 0
+NOIN = 1
+NOBF = 2
+
+ASSIGNMENT_OPERATORS = frozenset([
+    'EQ', 'MULTEQUAL', 'DIVEQUAL', 'MODEQUAL', 'PLUSEQUAL', 'MINUSEQUAL',
+    'LSHIFTEQUAL', 'RSHIFTEQUAL', 'URSHIFTEQUAL', 'ANDEQUAL', 'XOREQUAL',
+    'OREQUAL',
+])
+
+# the binding levels of the binary operators, from the tightest.
+BINARY_OPERATORS = {
+    'MULT': 1, 'DIV': 1, 'MOD': 1,
+    'PLUS': 2, 'MINUS': 2,
+    'LSHIFT': 3, 'RSHIFT': 3, 'URSHIFT': 3,
+    'LT': 4, 'GT': 4, 'LE': 4, 'GE': 4, 'INSTANCEOF': 4, 'IN': 4,
+    'EQEQ': 5, 'NE': 5, 'STREQ': 5, 'STRNEQ': 5,
+    'BAND': 6,
+    'BXOR': 7,
+    'BOR': 8,
+    'AND': 9,
+    'OR': 10,
+}
+
+# for the binary operators at this level and above, the right hand side
+# of the rules retain the '*noin' and '*nobf' variants.
+BINARY_MODAL_LEVEL = 6
+
+UNARY_OPERATORS = frozenset([
+    'DELETE', 'VOID', 'TYPEOF', 'PLUSPLUS', 'MINUSMINUS', 'PLUS', 'MINUS',
+    'BNOT', 'NOT',
+])
+
+LITERALS = {
+    'NULL': 'Null',
+    'TRUE': 'Boolean',
+    'FALSE': 'Boolean',
+    'NUMBER': 'Number',
+    'STRING': 'String',
+    'REGEX': 'Regex',
+}
+
+RESERVED_WORDS = frozenset([
+    'BREAK', 'CASE', 'CATCH', 'CONTINUE', 'DEBUGGER', 'DEFAULT', 'DELETE',
+    'DO', 'ELSE', 'FINALLY', 'FOR', 'FUNCTION', 'IF', 'IN', 'INSTANCEOF',
+    'NEW', 'RETURN', 'SWITCH', 'THIS', 'THROW', 'TRY', 'TYPEOF', 'VAR',
+    'VOID', 'WHILE', 'WITH', 'NULL', 'TRUE', 'FALSE', 'CLASS', 'CONST',
+    'ENUM', 'EXPORT', 'EXTENDS', 'IMPORT', 'SUPER',
+])
+
+IDENTIFIER_NAMES = RESERVED_WORDS | frozenset(['ID'])
+
+# the tokens that may start an expression.
+EXPRESSION_START = UNARY_OPERATORS | frozenset(LITERALS) | frozenset([
+    'ID', 'THIS', 'LPAREN', 'LBRACKET', 'LBRACE', 'FUNCTION', 'NEW',
+])
+
+# the tokens following a named function at the start of a statement
+# that will have the LALR parser resolve it as a function expression,
+# rather than a function declaration.
+FUNCTION_EXPR_FOLLOW = ASSIGNMENT_OPERATORS | frozenset(
+    k for k, v in BINARY_OPERATORS.items()) | frozenset([
+        'PERIOD', 'CONDOP', 'COMMA', 'AUTOSEMI',
+    ])
+
+# the terminators of source elements.
+SOURCE_ELEMENTS_END = frozenset(['RBRACE', 'CASE', 'DEFAULT'])
+
+# the closing tokens for the opening tokens, for skipping the bodies.
+BRACKETS = {
+    'LBRACE': 'RBRACE',
+    'LPAREN': 'RPAREN',
+    'LBRACKET': 'RBRACKET',
+}
+
+CLOSING_BRACKETS = frozenset(BRACKETS.values())
+
+# the tokens after which a DIV token may be relexed as a REGEX token, as
+# done by the error handling of the LALR parser.
+REGEX_BACKTRACK = frozenset(['RBRACE', 'PLUSPLUS', 'MINUSMINUS'])
+
+
+class FunctionBody(object):
+    """
+    The body of a function skipped by a lazy parse, which returns the
+    elements of the body when called.
+    """
+
+    __slots__ = ('parser', 'lexpos')
+
+    def __init__(self, parser, lbrace):
+        self.parser = parser
+        self.lexpos = lbrace.lexpos
+
+    def __call__(self):
+        parser = self.parser
+        return RDParser(
+            parser.asttypes, parser.lexer.clone(), lazy=True,
+        ).function_body(parser.text, self.lexpos, parser.newline_idx)
+
+
+class RDParser(object):
+    """
+    The recursive descent parser.  An instance is only good for parsing
+    a single input, as it holds all the states.
+    """
+
+    def __init__(self, asttypes, lexer, lazy=False):
+        self.asttypes = asttypes
+        self.lexer = lexer
+        self.lazy = lazy
+        self.with_comments = lexer.with_comments
+        self.positions = getattr(lexer, 'positions', 'full')
+        self.tok = None
+        # the node produced ahead of the expression parsing, which is to
+        # be consumed as the leftmost primary expression, along with the
+        # token that started it.
+        self.pending = None
+        self.pending_start = None
+        # the last node that was produced as a left hand side expression
+        # without any operators applied, for determining whether the
+        # expression produced may be assigned to.
+        self.lhs = None
+        self.statements = {
+            'LBRACE': self.block,
+            'VAR': self.variable_statement,
+            'SEMI': self.empty_statement,
+            'IF': self.if_statement,
+            'DO': self.do_while_statement,
+            'WHILE': self.while_statement,
+            'FOR': self.for_statement,
+            'CONTINUE': self.continue_statement,
+            'BREAK': self.break_statement,
+            'RETURN': self.return_statement,
+            'WITH': self.with_statement,
+            'SWITCH': self.switch_statement,
+            'THROW': self.throw_statement,
+            'TRY': self.try_statement,
+            'DEBUGGER': self.debugger_statement,
+            'FUNCTION': self.function_statement,
+            'ID': self.labelled_statement,
+        }
+
+    def parse(self, text):
+        lexer = self.lexer
+        lexer.input(text)
+        self.text = text
+        self.newline_idx = lexer.newline_idx
+        self.next_token = lexer.token
+        tok = self.tok = self.next_token()
+        if tok is None:
+            # the position of an empty production, as tracked by ply.
+            elements = None
+            lexpos, lineno = lexer.lexpos, lexer.lineno
+        else:
+            elements = self.source_elements()
+            if self.tok is not None:
+                self.error()
+            lexpos, lineno = tok.lexpos, tok.lineno
+        program = self.asttypes.ES5Program(elements)
+        if self.positions == 'none':
+            return program
+        program.lexpos = lexpos
+        program.lineno = lineno
+        program.colno = self.colno(lineno, lexpos)
+        if self.positions == 'full':
+            program._token_map = defaultdict(list)
+        return program
+
+    def iter_parse(self, text):
+        """
+        Yield the top level statements of the text as each of them are
+        parsed, such that the tree for the whole text is never built.
+        """
+
+        lexer = self.lexer
+        lexer.input(text)
+        self.text = text
+        self.newline_idx = lexer.newline_idx
+        self.next_token = lexer.token
+        tok = self.tok = self.next_token()
+        statement = self.statement
+        while tok is not None and tok.type not in SOURCE_ELEMENTS_END:
+            yield statement()
+            tok = self.tok
+        if tok is not None:
+            self.error()
+
+    def resume(self, text, lexpos, newline_idx):
+        """
+        Set up the parsing of the text from the lexpos, with newline_idx
+        being the line index of the text.
+        """
+
+        lexer = self.lexer
+        lexer.input(text, newline_idx)
+        lexer.lexer.lexpos = lexpos
+        self.text = text
+        self.newline_idx = newline_idx
+        self.next_token = lexer.token
+        self.tok = self.next_token()
+
+    def function_body(self, text, lexpos, newline_idx):
+        """
+        Return the elements of the body of a function in the text, from
+        its opening brace at the lexpos.
+        """
+
+        self.resume(text, lexpos, newline_idx)
+        self.expect('LBRACE')
+        elements = self.source_elements()
+        if self.tok is None or self.tok.type != 'RBRACE':
+            self.error()
+        # nothing beyond the closing brace is lexed, as the lexer lacks
+        # the states from the tokens before the body.
+        return elements
+
+    def source_elements_until(
+            self, text, lexpos, newline_idx, stop, closing=False):
+        """
+        Return the source elements in the text from the lexpos, up to
+        the stop, which must be where the token following the elements
+        start (along with its comments), or the position of the closing
+        brace if closing.  The end of the text may be the stop if not
+        closing.
+        """
+
+        self.resume(text, lexpos, newline_idx)
+        elements = []
+        while True:
+            tok = self.tok
+            if tok is None:
+                if closing or stop != len(text):
+                    self.error()
+                return elements
+            hidden = None if closing else getattr(tok, 'hidden_tokens', None)
+            start = hidden[0].lexpos if hidden else tok.lexpos
+            if start >= stop:
+                if start != stop or (closing and tok.type != 'RBRACE'):
+                    self.error()
+                return elements
+            elements.append(self.statement())
+
+    # helpers
+
+    def error(self):
+        # formatted in the same way as the LALR parser, as the errors
+        # from the bodies of the functions parsed lazily are reported
+        # as is.
+        tok = self.tok
+        prev_tok = self.lexer.valid_prev_token
+        try:
+            next_tok = self.next_token() if tok is not None else None
+        except ECMASyntaxError:
+            next_tok = None
+        raise ECMASyntaxError(format_syntax_error(
+            prev_tok, None if isinstance(tok, AutoLexToken) else tok,
+            next_tok,
+        ))
+
+    def advance(self):
+        tok = self.tok
+        self.tok = self.next_token()
+        return tok
+
+    def expect(self, type_):
+        tok = self.tok
+        if tok is None or tok.type != type_:
+            self.error()
+        self.tok = self.next_token()
+        return tok
+
+    def colno(self, lineno, lexpos):
+        return lexpos - self.newline_idx[lineno - 1] + 1 if lineno > 0 else 0
+
+    def pos(self, token):
+        lineno = token.lineno
+        lexpos = token.lexpos
+        return (
+            lexpos, lineno,
+            lexpos - self.newline_idx[lineno - 1] + 1 if lineno > 0 else 0,
+        )
+
+    def setpos(self, node, token, tokens=(), terminal=True):
+        """
+        Set the positions of the node to the token, along with the
+        token map for the tokens, which are the terminals (and the str
+        values) in the production, like what Node.setpos does.  The
+        token is assumed to be the first token of a nonterminal if the
+        terminal flag is False, such that no comments will be set.
+        """
+
+        # the attributes are assigned in the same order as done by
+        # Node.setpos, such that the instances of the same type share
+        # the keys of their dicts regardless of the parser used.
+        positions = self.positions
+        if terminal and self.with_comments:
+            node.set_comments_from_token(token, positions)
+        if positions == 'none':
+            return node
+        # the position calculation is inlined as this is the hot path.
+        newline_idx = self.newline_idx
+        node.lexpos = lexpos = token.lexpos
+        node.lineno = lineno = token.lineno
+        node.colno = lexpos - newline_idx[lineno - 1] + 1 if lineno > 0 else 0
+        if positions != 'full':
+            return node
+        token_map = node._token_map = defaultdict(list)
+        for t in tokens:
+            lineno = t.lineno
+            lexpos = t.lexpos
+            token_map[t.value].append((
+                lexpos, lineno,
+                lexpos - newline_idx[lineno - 1] + 1 if lineno > 0 else 0,
+            ))
+        return node
+
+    def semicolon(self):
+        tok = self.tok
+        if tok is not None and (tok.type == 'SEMI' or tok.type == 'AUTOSEMI'):
+            self.tok = self.next_token()
+            return tok
+        if tok is None or tok.type == 'RBRACE' or (
+                self.lexer._is_prev_token_lt()):
+            # automatic semicolon insertion, done in the same manner as
+            # the LALR parser's error handling.
+            return self.lexer._create_semi_token(tok)
+        self.error()
+
+    # source elements and statements
+
+    def source_elements(self):
+        elements = []
+        statement = self.statement
+        tok = self.tok
+        while tok is not None and tok.type not in SOURCE_ELEMENTS_END:
+            elements.append(statement())
+            tok = self.tok
+        return elements or None
+
+    def statement(self):
+        tok = self.tok
+        if tok is None:
+            self.error()
+        f = self.statements.get(tok.type)
+        if f is None:
+            return self.expr_statement(tok)
+        return f()
+
+    def block(self):
+        lbrace = self.expect('LBRACE')
+        elements = self.source_elements()
+        rbrace = self.expect('RBRACE')
+        return self.setpos(
+            self.asttypes.Block(elements), lbrace, (lbrace, rbrace))
+
+    def variable_statement(self):
+        var = self.advance()
+        declarations = self.variable_declaration_list(NORMAL)
+        semi = self.semicolon()
+        return self.setpos(
+            self.asttypes.VarStatement(declarations), var, (var, semi))
+
+    def variable_declaration_list(self, mode):
+        declarations = [self.variable_declaration(mode)]
+        while self.tok is not None and self.tok.type == 'COMMA':
+            self.tok = self.next_token()
+            declarations.append(self.variable_declaration(mode))
+        return declarations
+
+    def variable_declaration(self, mode):
+        start = self.tok
+        identifier = self.identifier()
+        return self.variable_declaration_initializer(start, identifier, mode)
+
+    def variable_declaration_initializer(self, start, identifier, mode):
+        tok = self.tok
+        if tok is not None and tok.type == 'EQ':
+            self.tok = self.next_token()
+            initializer = self.assignment_expr(mode)
+            return self.setpos(self.asttypes.VarDecl(
+                identifier, initializer), start, (tok,), False)
+        return self.setpos(self.asttypes.VarDecl(identifier), start, (), False)
+
+    def empty_statement(self):
+        semi = self.advance()
+        return self.setpos(
+            self.asttypes.EmptyStatement(semi.value), semi, (semi,))
+
+    def expr_statement(self, start):
+        expr = self.expr(NOBF)
+        if isinstance(expr, self.asttypes.FuncExpr):
+            # the LALR parser will report the appropriate error.
+            self.error()
+        semi = self.semicolon()
+        return self.setpos(
+            self.asttypes.ExprStatement(expr), start, (semi,), False)
+
+    def if_statement(self):
+        if_ = self.advance()
+        lparen = self.expect('LPAREN')
+        predicate = self.expr(NORMAL)
+        rparen = self.expect('RPAREN')
+        consequent = self.statement()
+        tok = self.tok
+        if tok is not None and tok.type == 'ELSE':
+            self.tok = self.next_token()
+            alternative = self.statement()
+            return self.setpos(self.asttypes.If(
+                predicate=predicate, consequent=consequent,
+                alternative=alternative,
+            ), if_, (if_, lparen, rparen, tok))
+        return self.setpos(self.asttypes.If(
+            predicate=predicate, consequent=consequent,
+        ), if_, (if_, lparen, rparen))
+
+    def do_while_statement(self):
+        do = self.advance()
+        statement = self.statement()
+        while_ = self.expect('WHILE')
+        lparen = self.expect('LPAREN')
+        predicate = self.expr(NORMAL)
+        rparen = self.expect('RPAREN')
+        semi = self.semicolon()
+        return self.setpos(self.asttypes.DoWhile(
+            predicate=predicate, statement=statement,
+        ), do, (do, while_, lparen, rparen, semi))
+
+    def while_statement(self):
+        while_ = self.advance()
+        lparen = self.expect('LPAREN')
+        predicate = self.expr(NORMAL)
+        rparen = self.expect('RPAREN')
+        statement = self.statement()
+        return self.setpos(self.asttypes.While(
+            predicate=predicate, statement=statement,
+        ), while_, (while_, lparen, rparen))
+
+    def for_statement(self):
+        asttypes = self.asttypes
+        for_ = self.advance()
+        lparen = self.expect('LPAREN')
+        tok = self.tok
+        if tok is not None and tok.type == 'VAR':
+            return self.for_var_statement(for_, lparen)
+
+        init = init_start = None
+        if tok is None or tok.type != 'SEMI':
+            init_start = tok
+            init = self.expr(NOIN)
+            tok = self.tok
+            if tok is not None and tok.type == 'IN' and init is self.lhs:
+                self.tok = self.next_token()
+                iterable = self.expr(NORMAL)
+                rparen = self.expect('RPAREN')
+                statement = self.statement()
+                return self.setpos(asttypes.ForIn(
+                    item=init, iterable=iterable, statement=statement,
+                ), for_, (for_, lparen, tok, rparen))
+
+        semi1 = self.expect('SEMI')
+        cond_start, cond, semi2, count, rparen, statement = self.for_rest()
+        tokens = (for_, lparen, semi1, semi2, rparen)
+        return self.setpos(asttypes.For(
+            init=self.for_wrap(init, lparen, init_start, tokens),
+            cond=self.for_wrap(cond, semi1, cond_start, tokens),
+            count=count, statement=statement,
+        ), for_, tokens)
+
+    def for_var_statement(self, for_, lparen):
+        asttypes = self.asttypes
+        var = self.advance()
+        start = self.tok
+        identifier = self.identifier()
+        eq = tok = self.tok
+        if tok is not None and tok.type == 'EQ':
+            self.tok = self.next_token()
+            initializer = self.assignment_expr(NOIN)
+            tok = self.tok
+        else:
+            initializer = None
+
+        if tok is not None and tok.type == 'IN':
+            self.tok = self.next_token()
+            iterable = self.expr(NORMAL)
+            rparen = self.expect('RPAREN')
+            statement = self.statement()
+            tokens = (for_, lparen, var, tok, rparen)
+            if initializer is None:
+                item = asttypes.VarDeclNoIn(identifier=identifier)
+            else:
+                item = asttypes.VarDeclNoIn(
+                    identifier=identifier, initializer=initializer)
+            return self.setpos(asttypes.ForIn(
+                item=self.setpos(item, var, tokens),
+                iterable=iterable, statement=statement,
+            ), for_, tokens)
+
+        if initializer is None:
+            declaration = self.setpos(
+                asttypes.VarDecl(identifier), start, (), False)
+        else:
+            declaration = self.setpos(asttypes.VarDecl(
+                identifier, initializer), start, (eq,), False)
+        declarations = [declaration]
+        while self.tok is not None and self.tok.type == 'COMMA':
+            self.tok = self.next_token()
+            declarations.append(self.variable_declaration(NOIN))
+
+        semi1 = self.expect('SEMI')
+        cond_start, cond, semi2, count, rparen, statement = self.for_rest()
+        tokens = (for_, lparen, var, semi1, semi2, rparen)
+        return self.setpos(asttypes.For(
+            init=self.setpos(asttypes.VarStatement(declarations), var, tokens),
+            cond=self.for_wrap(cond, semi1, cond_start, tokens),
+            count=count, statement=statement,
+        ), for_, tokens)
+
+    def for_rest(self):
+        tok = self.tok
+        cond = None
+        if tok is None or tok.type != 'SEMI':
+            cond = self.expr(NORMAL)
+        semi2 = self.expect('SEMI')
+        count = None
+        if self.tok is None or self.tok.type != 'RPAREN':
+            count = self.expr(NORMAL)
+        rparen = self.expect('RPAREN')
+        statement = self.statement()
+        return tok, cond, semi2, count, rparen, statement
+
+    def for_wrap(self, node, prev, start, tokens):
+        if node is None:
+            # mirror the workaround done by the LALR parser, which uses
+            # the position of the previous token, incremented.
+            node = self.setpos(self.asttypes.EmptyStatement(';'), prev, tokens)
+            if node.lexpos is not None:
+                node.lexpos += 1
+                node.colno += 1
+            return node
+        return self.setpos(
+            self.asttypes.ExprStatement(expr=node), start, tokens, False)
+
+    def continue_statement(self):
+        return self.jump_statement(self.asttypes.Continue)
+
+    def break_statement(self):
+        return self.jump_statement(self.asttypes.Break)
+
+    def jump_statement(self, cls):
+        keyword = self.advance()
+        tok = self.tok
+        if tok is not None and tok.type == 'ID':
+            node = cls(self.identifier())
+        else:
+            node = cls()
+        semi = self.semicolon()
+        return self.setpos(node, keyword, (keyword, semi))
+
+    def return_statement(self):
+        return_ = self.advance()
+        tok = self.tok
+        if tok is not None and tok.type in EXPRESSION_START:
+            node = self.asttypes.Return(expr=self.expr(NORMAL))
+        else:
+            node = self.asttypes.Return()
+        semi = self.semicolon()
+        return self.setpos(node, return_, (return_, semi))
+
+    def with_statement(self):
+        with_ = self.advance()
+        lparen = self.expect('LPAREN')
+        expr = self.expr(NORMAL)
+        rparen = self.expect('RPAREN')
+        statement = self.statement()
+        return self.setpos(self.asttypes.With(
+            expr=expr, statement=statement), with_, (with_, lparen, rparen))
+
+    def switch_statement(self):
+        asttypes = self.asttypes
+        switch = self.advance()
+        lparen = self.expect('LPAREN')
+        expr = self.expr(NORMAL)
+        rparen = self.expect('RPAREN')
+        lbrace = self.expect('LBRACE')
+        statements = []
+        has_default = False
+        tok = self.tok
+        while tok is not None and tok.type in ('CASE', 'DEFAULT'):
+            self.tok = self.next_token()
+            if tok.type == 'CASE':
+                case_expr = self.expr(NORMAL)
+                colon = self.expect('COLON')
+                statements.append(self.setpos(asttypes.Case(
+                    expr=case_expr, elements=self.source_elements(),
+                ), tok, (tok, colon)))
+            else:
+                if has_default:
+                    self.error()
+                has_default = True
+                colon = self.expect('COLON')
+                statements.append(self.setpos(asttypes.Default(
+                    elements=self.source_elements(),
+                ), tok, (tok, colon)))
+            tok = self.tok
+        rbrace = self.expect('RBRACE')
+        case_block = self.setpos(
+            asttypes.CaseBlock(statements), lbrace, (lbrace, rbrace))
+        return self.setpos(asttypes.Switch(
+            expr=expr, case_block=case_block), switch, (
+                switch, lparen, rparen))
+
+    def labelled_statement(self):
+        tok = self.advance()
+        identifier = self.setpos(self.asttypes.Identifier(tok.value), tok, (
+            tok,))
+        colon = self.tok
+        if colon is not None and colon.type == 'COLON':
+            self.tok = self.next_token()
+            return self.setpos(self.asttypes.Label(
+                identifier=identifier, statement=self.statement(),
+            ), colon, (colon,))
+        self.pending, self.pending_start = identifier, tok
+        return self.expr_statement(tok)
+
+    def throw_statement(self):
+        throw = self.advance()
+        expr = self.expr(NORMAL)
+        semi = self.semicolon()
+        return self.setpos(
+            self.asttypes.Throw(expr=expr), throw, (throw, semi))
+
+    def try_statement(self):
+        asttypes = self.asttypes
+        try_ = self.advance()
+        statements = self.block()
+        catch = fin = None
+        tok = self.tok
+        if tok is not None and tok.type == 'CATCH':
+            self.tok = self.next_token()
+            lparen = self.expect('LPAREN')
+            identifier = self.identifier()
+            rparen = self.expect('RPAREN')
+            catch = self.setpos(asttypes.Catch(
+                identifier=identifier, elements=self.block(),
+            ), tok, (tok, lparen, rparen))
+            tok = self.tok
+        if tok is not None and tok.type == 'FINALLY':
+            self.tok = self.next_token()
+            fin = self.setpos(
+                asttypes.Finally(elements=self.block()), tok, (tok,))
+        if catch is None and fin is None:
+            self.error()
+        return self.setpos(asttypes.Try(
+            statements=statements, catch=catch, fin=fin), try_, (try_,))
+
+    def debugger_statement(self):
+        debugger = self.advance()
+        semi = self.semicolon()
+        return self.setpos(
+            self.asttypes.Debugger(debugger.value), debugger, (debugger, semi))
+
+    def function_statement(self):
+        start = self.tok
+        identifier, parameters, elements, tokens = self.function()
+        if identifier is None or (
+                self.tok is not None and
+                self.tok.type in FUNCTION_EXPR_FOLLOW):
+            # this will be resolved as a function expression by the
+            # LALR parser.
+            self.pending = self.function_node(
+                self.asttypes.FuncExpr, start, identifier, parameters,
+                elements, tokens)
+            self.pending_start = start
+            return self.expr_statement(start)
+        return self.function_node(
+            self.asttypes.FuncDecl, start, identifier, parameters, elements,
+            tokens)
+
+    def function_node(
+            self, cls, start, identifier, parameters, elements, tokens):
+        if isinstance(elements, FunctionBody):
+            node = cls(identifier=identifier, parameters=parameters,
+                       elements=None)
+            # FuncBase will parse the body on first access.
+            del node.elements
+            node._body = elements
+        else:
+            node = cls(identifier=identifier, parameters=parameters,
+                       elements=elements)
+        return self.setpos(node, start, tokens)
+
+    def function(self):
+        function = self.advance()
+        tok = self.tok
+        identifier = None
+        if tok is not None and tok.type == 'ID':
+            identifier = self.identifier()
+        lparen = self.expect('LPAREN')
+        parameters = None
+        if self.tok is None or self.tok.type != 'RPAREN':
+            parameters = [self.identifier()]
+            while self.tok is not None and self.tok.type == 'COMMA':
+                self.tok = self.next_token()
+                parameters.append(self.identifier())
+        rparen = self.expect('RPAREN')
+        lbrace = self.expect('LBRACE')
+        if self.lazy:
+            elements = FunctionBody(self, lbrace)
+            rbrace = self.skip_body()
+        else:
+            elements = self.source_elements()
+            rbrace = self.expect('RBRACE')
+        return identifier, parameters, elements, (
+            function, lparen, rparen, lbrace, rbrace)
+
+    def skip_body(self):
+        """
+        Skip over the tokens of a function body, checking that all the
+        brackets are balanced, returning the closing brace of the body.
+        """
+
+        closing = []
+        next_token = self.next_token
+        tok = self.tok
+        while tok is not None:
+            type_ = tok.type
+            if type_ in BRACKETS:
+                closing.append(BRACKETS[type_])
+            elif type_ in CLOSING_BRACKETS:
+                if not closing and type_ == 'RBRACE':
+                    self.tok = next_token()
+                    return tok
+                if not closing or closing.pop() != type_:
+                    self.error()
+            tok = self.tok = next_token()
+        self.error()
+
+    # expressions
+
+    def expr(self, mode):
+        left = self.assignment_expr(mode)
+        tok = self.tok
+        if tok is None or tok.type != 'COMMA':
+            return left
+        mode = NOIN if mode == NOIN else NORMAL
+        while tok is not None and tok.type == 'COMMA':
+            self.tok = self.next_token()
+            left = self.setpos(self.asttypes.Comma(
+                left=left, right=self.assignment_expr(mode)), tok, (tok,))
+            tok = self.tok
+        return left
+
+    def assignment_expr(self, mode):
+        left = self.conditional_expr(mode)
+        tok = self.tok
+        if (tok is not None and tok.type in ASSIGNMENT_OPERATORS and
+                left is self.lhs):
+            self.tok = self.next_token()
+            right = self.assignment_expr(NOIN if mode == NOIN else NORMAL)
+            # the operator is provided by a nonterminal.
+            return self.setpos(self.asttypes.Assign(
+                left=left, op=tok.value, right=right), tok, (tok,), False)
+        return left
+
+    def conditional_expr(self, mode):
+        predicate = self.binary_expr(mode, 10)
+        tok = self.tok
+        if tok is not None and tok.type == 'CONDOP':
+            self.tok = self.next_token()
+            mode = NOIN if mode == NOIN else NORMAL
+            consequent = self.assignment_expr(mode)
+            colon = self.expect('COLON')
+            alternative = self.assignment_expr(mode)
+            return self.setpos(self.asttypes.Conditional(
+                predicate=predicate, consequent=consequent,
+                alternative=alternative,
+            ), tok, (tok, colon))
+        return predicate
+
+    def binary_expr(self, mode, max_level):
+        left = self.unary_expr(mode)
+        tok = self.tok
+        while tok is not None:
+            level = BINARY_OPERATORS.get(tok.type)
+            if level is None or level > max_level or (
+                    mode == NOIN and tok.type == 'IN'):
+                break
+            self.tok = self.next_token()
+            right = self.binary_expr(
+                mode if level >= BINARY_MODAL_LEVEL else NORMAL, level - 1)
+            left = self.setpos(self.asttypes.BinOp(
+                op=tok.value, left=left, right=right), tok, (tok,))
+            tok = self.tok
+        return left
+
+    def unary_expr(self, mode):
+        tok = self.tok
+        if (self.pending is None and tok is not None and
+                tok.type in UNARY_OPERATORS):
+            self.tok = self.next_token()
+            value = self.unary_expr(NORMAL)
+            self.lhs = None
+            return self.setpos(
+                self.asttypes.UnaryExpr(tok.value, value), tok, (tok,))
+
+        node = self.left_hand_side_expr(mode)
+        tok = self.tok
+        if tok is not None and (
+                tok.type == 'PLUSPLUS' or tok.type == 'MINUSMINUS'):
+            self.tok = self.next_token()
+            self.lhs = None
+            return self.setpos(
+                self.asttypes.PostfixExpr(op=tok.value, value=node),
+                tok, (tok,))
+        self.lhs = node
+        return node
+
+    def left_hand_side_expr(self, mode):
+        start = self.tok if self.pending is None else self.pending_start
+        node = self.member_expr(mode)
+        tok = self.tok
+        while tok is not None:
+            type_ = tok.type
+            if type_ == 'LPAREN':
+                # the position is provided by the nonterminal.
+                node = self.setpos(self.asttypes.FunctionCall(
+                    node, self.arguments()), start, (), False)
+            elif type_ == 'LBRACKET':
+                node = self.bracket_accessor(node)
+            elif type_ == 'PERIOD':
+                node = self.dot_accessor(node)
+            else:
+                break
+            tok = self.tok
+        return node
+
+    def member_expr(self, mode):
+        if self.pending is not None:
+            node = self.pending
+            self.pending = None
+        elif self.tok is not None and self.tok.type == 'NEW':
+            new = self.advance()
+            identifier = self.member_expr(NORMAL)
+            if self.tok is not None and self.tok.type == 'LPAREN':
+                node = self.setpos(self.asttypes.NewExpr(
+                    identifier, self.arguments()), new, (new,))
+            else:
+                # no arguments, so this is a new_expr which cannot be
+                # followed by further accessors or arguments; those
+                # would have been consumed by the inner member_expr.
+                return self.setpos(
+                    self.asttypes.NewExpr(identifier), new, (new,))
+        else:
+            node = self.primary_expr(mode)
+
+        tok = self.tok
+        while tok is not None:
+            type_ = tok.type
+            if type_ == 'LBRACKET':
+                node = self.bracket_accessor(node)
+            elif type_ == 'PERIOD':
+                node = self.dot_accessor(node)
+            else:
+                break
+            tok = self.tok
+        return node
+
+    def bracket_accessor(self, node):
+        lbracket = self.advance()
+        expr = self.expr(NORMAL)
+        rbracket = self.expect('RBRACKET')
+        return self.setpos(self.asttypes.BracketAccessor(
+            node, expr), lbracket, (lbracket, rbracket))
+
+    def dot_accessor(self, node):
+        period = self.advance()
+        return self.setpos(self.asttypes.DotAccessor(
+            node, self.identifier_name_string()), period, (period,))
+
+    def arguments(self):
+        lparen = self.advance()
+        tok = self.tok
+        if tok is not None and tok.type == 'RPAREN':
+            self.tok = self.next_token()
+            return self.setpos(
+                self.asttypes.Arguments([]), lparen, (lparen, tok))
+        items = [self.assignment_expr(NORMAL)]
+        while self.tok is not None and self.tok.type == 'COMMA':
+            self.tok = self.next_token()
+            items.append(self.assignment_expr(NORMAL))
+        rparen = self.expect('RPAREN')
+        return self.setpos(
+            self.asttypes.Arguments(items), lparen, (lparen, rparen))
+
+    def primary_expr(self, mode):
+        tok = self.tok
+        if tok is None:
+            self.error()
+        type_ = tok.type
+        if type_ == 'ID':
+            self.tok = self.next_token()
+            return self.setpos(
+                self.asttypes.Identifier(tok.value), tok, (tok,))
+        elif type_ in LITERALS:
+            self.tok = self.next_token()
+            return self.setpos(getattr(self.asttypes, LITERALS[type_])(
+                tok.value), tok, (tok,))
+        elif type_ == 'THIS':
+            self.tok = self.next_token()
+            return self.setpos(self.asttypes.This(), tok, (tok,))
+        elif type_ == 'LPAREN':
+            self.tok = self.next_token()
+            expr = self.expr(NORMAL)
+            rparen = self.expect('RPAREN')
+            if isinstance(expr, self.asttypes.GroupingOp):
+                # this reduces the grouping operator to one.
+                return expr
+            return self.setpos(
+                self.asttypes.GroupingOp(expr=expr), tok, (tok, rparen))
+        elif type_ == 'LBRACKET':
+            return self.array_literal()
+        elif type_ == 'LBRACE' and mode != NOBF:
+            return self.object_literal()
+        elif type_ == 'FUNCTION':
+            start = tok
+            identifier, parameters, elements, tokens = self.function()
+            return self.function_node(
+                self.asttypes.FuncExpr, start, identifier, parameters,
+                elements, tokens)
+        elif type_ == 'DIV' and self.lexer.valid_prev_token is not None and (
+                self.lexer.valid_prev_token.type in REGEX_BACKTRACK):
+            # same backtracking as done by the LALR parser.
+            tok = self.lexer.backtracked_token(pos=1)
+            if tok.type == 'REGEX':
+                self.tok = self.next_token()
+                return self.setpos(self.asttypes.Regex(tok.value), tok, (tok,))
+        self.error()
+
+    def array_literal(self):
+        lbracket = self.advance()
+        items = []
+        trailing = None
+        tok = self.tok
+        if tok is not None and tok.type == 'COMMA':
+            items.append(self.elision())
+            tok = self.tok
+        if tok is None or tok.type != 'RBRACKET':
+            items.append(self.assignment_expr(NORMAL))
+            tok = self.tok
+            while tok is not None and tok.type == 'COMMA':
+                comma = tok
+                tok = self.tok = self.next_token()
+                elision = None
+                if tok is not None and tok.type == 'COMMA':
+                    elision = self.elision()
+                    tok = self.tok
+                if elision is not None:
+                    items.append(elision)
+                if tok is not None and tok.type == 'RBRACKET':
+                    trailing = comma
+                    break
+                items.append(self.assignment_expr(NORMAL))
+                tok = self.tok
+        rbracket = self.expect('RBRACKET')
+        return self.setpos(self.asttypes.Array(items=items), lbracket, (
+            (lbracket, trailing, rbracket) if trailing else
+            (lbracket, rbracket)
+        ))
+
+    def elision(self):
+        first = self.tok
+        value = 0
+        while self.tok is not None and self.tok.type == 'COMMA':
+            value += 1
+            self.tok = self.next_token()
+        node = self.setpos(self.asttypes.Elision(value), first)
+        if self.positions == 'full':
+            node._token_map = {(',' * value): [self.pos(first)]}
+        return node
+
+    def object_literal(self):
+        lbrace = self.advance()
+        tok = self.tok
+        if tok is not None and tok.type == 'RBRACE':
+            self.tok = self.next_token()
+            return self.setpos(self.asttypes.Object(), lbrace, (lbrace, tok))
+        properties = [self.property_assignment()]
+        trailing = None
+        tok = self.tok
+        while tok is not None and tok.type == 'COMMA':
+            comma = tok
+            tok = self.tok = self.next_token()
+            if tok is not None and tok.type == 'RBRACE':
+                trailing = comma
+                break
+            properties.append(self.property_assignment())
+            tok = self.tok
+        rbrace = self.expect('RBRACE')
+        return self.setpos(
+            self.asttypes.Object(properties=properties), lbrace, (
+                (lbrace, trailing, rbrace) if trailing else (lbrace, rbrace)))
+
+    def property_assignment(self):
+        asttypes = self.asttypes
+        tok = self.tok
+        if tok is not None and tok.type in ('GETPROP', 'SETPROP'):
+            self.tok = self.next_token()
+            prop_name = self.property_name()
+            lparen = self.expect('LPAREN')
+            if tok.type == 'SETPROP':
+                parameter = self.identifier()
+            rparen = self.expect('RPAREN')
+            lbrace = self.expect('LBRACE')
+            elements = self.source_elements()
+            rbrace = self.expect('RBRACE')
+            if tok.type == 'SETPROP':
+                node = asttypes.SetPropAssign(
+                    prop_name=prop_name, parameter=parameter,
+                    elements=elements)
+            else:
+                node = asttypes.GetPropAssign(
+                    prop_name=prop_name, elements=elements)
+            return self.setpos(
+                node, tok, (tok, lparen, rparen, lbrace, rbrace))
+
+        prop_name = self.property_name()
+        colon = self.expect('COLON')
+        return self.setpos(asttypes.Assign(
+            left=prop_name, op=colon.value, right=self.assignment_expr(NORMAL),
+        ), colon, (colon,))
+
+    def property_name(self):
+        tok = self.tok
+        if tok is not None:
+            if tok.type in IDENTIFIER_NAMES:
+                return self.identifier_name_string()
+            elif tok.type == 'STRING':
+                self.tok = self.next_token()
+                return self.setpos(
+                    self.asttypes.String(tok.value), tok, (tok,))
+            elif tok.type == 'NUMBER':
+                self.tok = self.next_token()
+                return self.setpos(
+                    self.asttypes.Number(tok.value), tok, (tok,))
+        self.error()
+
+    def identifier(self):
+        tok = self.tok
+        if tok is None or tok.type != 'ID':
+            self.error()
+        self.tok = self.next_token()
+        return self.setpos(self.asttypes.Identifier(tok.value), tok, (tok,))
+
+    def identifier_name_string(self):
+        tok = self.tok
+        if tok is None or tok.type not in IDENTIFIER_NAMES:
+            self.error()
+        self.tok = self.next_token()
+        # like the LALR parser, only the positions are retained from
+        # the intermediate Identifier, but not its comments.
+        return self.setpos(
+            self.asttypes.PropIdentifier(tok.value), tok, (tok,), False)
+
+
+# incremental reparsing
+
+def _common_length(a, b, reverse=False):
+    # the length of the common prefix (or suffix) of the two strings,
+    # found through the comparison of the slices.
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if (a[len(a) - mid:] == b[len(b) - mid:] if reverse else
+                a[:mid] == b[:mid]):
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _body_span(node):
+    # the span of the inside of the braces of a function or a block.
+    if not isinstance(node, (FuncBase, Block)):
+        return None
+    token_map = getattr(node, '_token_map', None) or {}
+    lbraces = token_map.get('{')
+    rbraces = token_map.get('}')
+    if not lbraces or not rbraces:
+        return None
+    return lbraces[0][0] + 1, rbraces[-1][0]
+
+
+def _leading_start(node):
+    # the start of a statement, including the comments that precede it,
+    # which are attached to the node produced by its first token.
+    start = node.lexpos
+    while node is not None:
+        if node.comments is not None:
+            return node.comments.lexpos
+        if isinstance(node, FuncBase):
+            break
+        node = next((
+            child for child in node if child.lexpos == start
+        ), None)
+    return start
+
+
+def _follows_comment(text, pos):
+    # whether there may be a comment immediately before the position.
+    idx = pos
+    while idx > 0 and text[idx - 1] in ' \t\n\r\x0b\x0c\xa0':
+        idx -= 1
+    line_start = max(text.rfind('\n', 0, idx), text.rfind('\r', 0, idx))
+    return text.endswith('*/', 0, idx) or text.find(
+        '//', line_start + 1, idx) >= 0
+
+
+def _containers(tree, start, end):
+    """
+    Return the nodes with the source elements that contain the span,
+    from the outermost (the tree itself) to the innermost, as a list
+    of (elements, body start, body end, closing, index) tuples, where
+    the index is that of the element that may contain the next one.
+    """
+
+    results = []
+    elements, body_start, body_end = tree.children(), 0, None
+    closing = False
+    while True:
+        idx = bisect_right([node.lexpos for node in elements], start) - 1
+        results.append((elements, body_start, body_end, closing, idx))
+        if idx < 0:
+            break
+        nodes = [elements[idx]]
+        found = None
+        while nodes and found is None:
+            node = nodes.pop()
+            span = _body_span(node)
+            if span is None:
+                nodes.extend(node)
+            elif span[0] <= start and end <= span[1]:
+                found = node
+        if found is None:
+            break
+        elements = (
+            found.elements if isinstance(found, FuncBase) else
+            found._children_list)
+        (body_start, body_end), closing = _body_span(found), True
+    return results
+
+
+def _region(elements, body_start, body_end, start, end, text, comments):
+    """
+    Return the range of the elements that cover the edit between start
+    and end, along with their span in the text.
+    """
+
+    idx = bisect_right([node.lexpos for node in elements], start) - 1
+    # also include the preceding element, such that the first token of
+    # the region will never be affected by the edit, as that may decide
+    # where the preceding element ends.
+    lo = max(idx - 1, 0)
+    region_start = body_start if lo == 0 else _leading_start(elements[lo])
+    while comments and lo > 0 and _follows_comment(text, region_start):
+        lo -= 1
+        region_start = (
+            body_start if lo == 0 else _leading_start(elements[lo]))
+    hi = max(idx + 1, 1)
+    while hi < len(elements):
+        region_end = _leading_start(elements[hi])
+        if region_end > end:
+            return lo, hi, region_start, region_end
+        hi += 1
+    return lo, len(elements), region_start, body_end
+
+
+def _shift(tree, end, delta, line_delta, newline_idx, source, skipped):
+    """
+    Shift the positions of all the nodes in the tree at or after end,
+    and have the bodies of the lazily parsed functions be parsed from
+    the source parser, except for the nodes with their ids in skipped,
+    which are known to be entirely before end.
+    """
+
+    def shift(lexpos, lineno, colno):
+        if lexpos < end or not lineno:
+            return lexpos, lineno, colno
+        lexpos += delta
+        lineno += line_delta
+        return lexpos, lineno, colno and (
+            lexpos - newline_idx[lineno - 1] + 1)
+
+    nodes = [tree]
+    while nodes:
+        node = nodes.pop()
+        if node.lexpos is not None:
+            node.lexpos, node.lineno, node.colno = shift(
+                node.lexpos, node.lineno, node.colno)
+        token_map = getattr(node, '_token_map', None)
+        if token_map:
+            for key, positions in token_map.items():
+                token_map[key] = [shift(*pos) for pos in positions]
+        if node.comments is not None:
+            nodes.append(node.comments)
+        body = (
+            getattr(node, '_body', None) if isinstance(node, FuncBase) else
+            None)
+        if body is not None:
+            body.parser = source
+            if body.lexpos >= end:
+                body.lexpos += delta
+            nodes.extend(
+                child for child in [node.identifier] + node.parameters
+                if child is not None)
+        else:
+            nodes.extend(
+                child for child in node if id(child) not in skipped)
+
+
+def reparse(asttypes, lexer, tree, old_text, new_text, lazy=False):
+    """
+    Update the tree, which was produced from old_text with the lexer
+    and the asttypes, in place for new_text, by parsing only the source
+    elements that contain the edit within the innermost function or
+    block that contains the edit, and shifting the positions of all the
+    nodes that follow.  The tree is returned, or None if the tree could
+    not be updated, such that it must be parsed again in full.
+    """
+
+    if tree.lexpos is None or getattr(lexer, 'positions', 'full') != 'full':
+        # the positions of the nodes and their tokens are required.
+        return None
+    prefix = _common_length(old_text, new_text)
+    if prefix == len(old_text) == len(new_text):
+        return tree
+    suffix = min(
+        _common_length(old_text, new_text, reverse=True),
+        len(old_text) - prefix, len(new_text) - prefix,
+    )
+    old_end = len(old_text) - suffix
+    new_end = len(new_text) - suffix
+    delta = new_end - old_end
+    if (
+            # the separators that are not tracked consistently as line
+            # terminators by the lexer.
+            '\u2028' in new_text or '\u2029' in new_text or
+            '\u2028' in old_text or '\u2029' in old_text or
+            # the carriage return joined to a line feed.
+            '\r' in (
+                old_text[prefix - 1:prefix] + old_text[old_end - 1:old_end] +
+                new_text[new_end - 1:new_end])):
+        return None
+
+    old_idx = line_index(old_text)
+    new_idx = line_index(new_text)
+    line_delta = (
+        bisect_right(new_idx, new_end) - bisect_right(old_idx, old_end))
+
+    containers = _containers(tree, prefix, old_end)
+    while containers:
+        elements, body_start, body_end, closing, idx = containers.pop()
+        lo, hi, region_start, region_end = _region(
+            elements, body_start, len(old_text) if body_end is None else
+            body_end, prefix, old_end, old_text, lexer.with_comments)
+        if not closing and lo == 0 and hi == len(elements):
+            # the entire program.
+            return None
+        parser = RDParser(asttypes, lexer.clone(), lazy=lazy)
+        try:
+            replacement = parser.source_elements_until(
+                new_text, region_start, new_idx, region_end + delta, closing)
+        except (ECMASyntaxError, RuntimeError):
+            continue
+        if not closing and lo == 0 and not replacement:
+            return None
+        # the elements before the edit need not be visited, nor the
+        # ones being replaced, which are only replaced after the shift
+        # such that the replacement is never shifted.
+        skipped = set(id(node) for node in elements[:hi])
+        for outer, _, _, _, idx in containers:
+            skipped.update(id(node) for node in outer[:idx])
+        _shift(tree, old_end, delta, line_delta, new_idx, parser, skipped)
+        elements[lo:hi] = replacement
+        if not closing and lo == 0:
+            first = elements[0]
+            tree.lexpos, tree.lineno, tree.colno = (
+                first.lexpos, first.lineno, first.colno)
+        return tree
+    return None
@@ -13,8 +13,14 @@ from functools import partial
 from os import unlink
 from os.path import exists
 from ply import lex
+from ply import yacc
 from importlib import import_module
 
+from calmjs.parse.lexers.es5 import _lexer_templates
+from calmjs.parse.utils import read_lextab
+from calmjs.parse.utils import read_yacctab
+from calmjs.parse.parsers.es5 import _lrparser_templates
+
 # have to do this for every parser modules
 from calmjs.parse.parsers import es5
 
@@ -58,8 +64,43 @@ def unlink_modules(paths):
         unlink(path)
 
 
+def check_tabs(module):
+    """
+    Check that the tab modules for the provided parser module match the
+    rules defined by its lexer and the production rules defined by its
+    parser, in the same manner as done when the optimized lexers and
+    parsers are built, which will build them again from the rules for
+    the tab modules that are out of date.
+
+    Returns a list of names of the tab modules that are either missing
+    or out of date.
+    """
+
+    results = []
+    parser = module.Parser()
+
+    try:
+        read_lextab(import_module(module.lextab), parser.lexer)
+    except ImportError:
+        results.append(module.lextab)
+
+    try:
+        yacctab = import_module(module.yacctab)
+        # the start symbol is the target of the augmented production.
+        read_yacctab(yacctab, parser, yacctab._lr_productions[0][0].split(
+        )[-1])
+    except (ImportError, yacc.VersionError):
+        results.append(module.yacctab)
+
+    return results
+
+
 def reoptimize(module):
     purge_tabs(module)
+    # drop the previously built lexers and parsers, as they would have
+    # been reused instead of being rebuilt from the purged tabs.
+    _lexer_templates.clear()
+    _lrparser_templates.clear()
     # create a new parser should rengenerate the module
     module.Parser()
 
@@ -0,0 +1,541 @@
+# -*- coding: utf-8 -*-
+"""
+Simple benchmarks for tracking the performance of various features.
+
+These are not run as part of the test suite as the results are highly
+dependent on the environment; invoke this module directly to run them,
+optionally with the names of the specific benchmarks to run:
+
+    python -m calmjs.parse.testing.benchmark [name ...]
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import subprocess
+import sys
+from functools import partial
+from timeit import default_timer
+
+# the statements to be timed in a fresh interpreter for the import
+# benchmark.
+IMPORT_STATEMENTS = (
+    'import calmjs.parse',
+    'from calmjs.parse import vlq',
+    'from calmjs.parse import asttypes',
+    'from calmjs.parse import es5',
+)
+
+# a fragment of source code that covers the common constructs, which
+# gets repeated to form the input for the parsing benchmarks.
+PARSE_SOURCE = '''
+var Widget = (function(global) {
+  /* the widget */
+  function Widget(name, options) {
+    this.name = name;
+    this.options = options || {};
+    this.items = [1, 2.5, 'three', null, true, /re+/g];
+  }
+
+  Widget.prototype.render = function(target) {
+    var i, result = [];
+    for (i = 0; i < this.items.length; i++) {
+      if (typeof this.items[i] === 'string' && !target[i]) {
+        result.push(this.items[i] + ':' + (i * 2 >> 1));
+      } else {
+        result[i % 2 ? 'push' : 'unshift'](new Date(i).getTime());
+      }
+    }
+    switch (target.mode) {
+      case 'a':
+        return result.join(',');
+      default:
+        try {
+          return global.JSON.stringify({items: result, name: this.name});
+        } catch (e) {
+          throw new Error('failed: ' + e.message);
+        }
+    }
+  };
+
+  return Widget;
+}(this));
+'''
+
+
+def time_fresh(statement, setup='pass', repeat=5):
+    """
+    Return the best time taken to execute the statement, in seconds, in
+    a fresh Python interpreter after the setup was executed, such that
+    the cold start costs (e.g. importing) will be measured.
+    """
+
+    code = '\n'.join((
+        setup,
+        'from timeit import default_timer',
+        'start = default_timer()',
+        statement,
+        'print(default_timer() - start)',
+    ))
+    return min(float(subprocess.check_output(
+        [sys.executable, '-c', code]).decode('ascii'))
+        for _ in range(repeat))
+
+
+def time_call(f, repeat=5, number=1):
+    """
+    Return the best time taken to call f number times, in seconds.
+    """
+
+    results = []
+    for _ in range(repeat):
+        start = default_timer()
+        for _ in range(number):
+            f()
+        results.append(default_timer() - start)
+    return min(results)
+
+
+def report(name, seconds, note=''):
+    print('%-48s %10.3fms%s' % (name, seconds * 1000, note and ' ' + note))
+
+
+def bench_import():
+    """
+    The cold start cost of importing the package and the parser.
+    """
+
+    for statement in IMPORT_STATEMENTS:
+        report(statement, time_fresh(statement))
+    report('es5 (first parse)', time_fresh(
+        'es5(u"var a = 1;")', setup='from calmjs.parse import es5'))
+
+
+def bench_parse(repeat=50):
+    """
+    The throughput of the es5 parser, for each of the engines, and with
+    the lazy parsing of the function bodies.
+    """
+
+    from calmjs.parse.parsers.es5 import ENGINES
+    from calmjs.parse.parsers.es5 import Parser
+    source = PARSE_SOURCE * repeat
+    for engine in ENGINES:
+        parser = Parser(engine=engine)
+        report('parse %d lines (engine=%r)' % (
+            source.count('\n'), engine), time_call(
+                partial(parser.parse, source), repeat=3))
+    parser = Parser(engine='rd', lazy_functions=True)
+    report('parse %d lines (lazy_functions=True)' % (
+        source.count('\n')), time_call(
+            partial(parser.parse, source), repeat=3))
+
+
+def bench_asi(repeat=50):
+    """
+    The throughput of the es5 parser for each of the engines, with the
+    statements terminated by semicolons against relying on automatic
+    semicolon insertion.
+    """
+
+    import re
+    from calmjs.parse.parsers.es5 import ENGINES
+    from calmjs.parse.parsers.es5 import Parser
+    source = PARSE_SOURCE * repeat
+    for name, text in (
+            ('semicolons', source),
+            ('no semicolons', re.sub(';$', '', source, flags=re.M))):
+        for engine in ENGINES:
+            parser = Parser(engine=engine)
+            report('parse %d lines (%s, engine=%r)' % (
+                text.count('\n'), name, engine), time_call(
+                    partial(parser.parse, text), repeat=3))
+
+
+def bench_lexer(repeat=50):
+    """
+    The throughput in tokens per second of the scanner used by the es5
+    lexer, against the ply lexer built from the same rules, for the raw
+    tokens and the tokens produced through the lexer.
+    """
+
+    import ply.lex
+    from calmjs.parse.lexers.es5 import Lexer
+    source = PARSE_SOURCE * repeat
+
+    def scan(lexer):
+        lexer.input(source)
+        token = lexer.lexer.token
+        while token():
+            pass
+
+    def lex(lexer):
+        lexer.input(source)
+        for token in lexer:
+            pass
+
+    lexers = []
+    for name in ('ply', 'scanner'):
+        lexer = Lexer()
+        if name == 'ply':
+            lexer.lexer = ply.lex.lex(object=lexer)
+        lexer.input(source)
+        count = len(list(lexer))
+        lexer.input(source)
+        raw_count = len(list(iter(lexer.lexer.token, None)))
+        lexers.append((name, lexer, raw_count, count))
+
+    for label, f in (('scan', scan), ('lex', lex)):
+        # the runs are interleaved such that the noise of the system
+        # affects both of the lexers alike.
+        results = {}
+        for _ in range(10):
+            for name, lexer, _, _ in lexers:
+                seconds = time_call(partial(f, lexer), repeat=1)
+                results[name] = min(results.get(name, seconds), seconds)
+        for name, lexer, raw_count, count in lexers:
+            total = raw_count if label == 'scan' else count
+            report('%s %d tokens (%s)' % (label, total, name), results[name],
+                   '(%d tokens/s)' % (total / results[name]))
+
+
+def bench_comments(repeat=50):
+    """
+    The cost of the comments for preserving the license banners, as
+    tracked by the tree through the parser with the comments enabled,
+    against the extraction of only the important ones from the tokens.
+    """
+
+    from calmjs.parse.comments import extract
+    from calmjs.parse.parsers.es5 import Parser
+    source = "/*! banner @license MIT */\n" + PARSE_SOURCE.replace(
+        ';\n', '; // note\n') * repeat
+    parser = Parser()
+    comments_parser = Parser(with_comments=True)
+
+    for name, f in (
+            ('parse (with_comments=True)', partial(
+                comments_parser.parse, source)),
+            ('parse', partial(parser.parse, source)),
+            ('extract', partial(extract, source))):
+        seconds = time_call(f, repeat=3)
+        size = traced_call(f)
+        report('%s %d lines' % (name, source.count('\n')), seconds,
+               '(%d KiB)' % (size // 1024))
+
+
+def bench_dependencies(repeat=50):
+    """
+    The cost of extracting the dependencies from the tokens, against
+    the parsing of the tree and the walking through it for the calls.
+    """
+
+    from calmjs.parse.asttypes import FunctionCall
+    from calmjs.parse.asttypes import String
+    from calmjs.parse.dependencies import extract
+    from calmjs.parse.parsers.es5 import Parser
+    from calmjs.parse.walkers import walk
+    source = (
+        "define(['a', 'b'], function(require) {\n"
+        "  var c = require('c');\n" + PARSE_SOURCE + "});\n"
+    ) * repeat
+    parser = Parser(engine='rd')
+
+    def parse_walk():
+        return [
+            node.args.items[0].value for node in walk(parser.parse(source))
+            if isinstance(node, FunctionCall) and node.args.items and
+            isinstance(node.args.items[0], String)
+        ]
+
+    for name, f in (
+            ('parse and walk', parse_walk), ('extract', partial(
+                extract, source))):
+        report('%s %d lines' % (name, source.count('\n')), time_call(
+            f, repeat=3))
+
+
+def bench_identifiers(repeat=50):
+    """
+    The cost of building the scanner and of the scanning of the source
+    with only the ASCII identifiers and with the identifiers in other
+    scripts, matched through the full patterns for the identifiers with
+    the unicode classes against the ASCII only patterns before those.
+    """
+
+    import re
+    import ply.lex
+    from calmjs.parse.lexers.es5 import INLINE_RULES
+    from calmjs.parse.lexers.es5 import Lexer
+    from calmjs.parse.lexers.es5 import Scanner
+    from calmjs.parse.utils import lexer_tables
+    sources = (
+        ('ascii', PARSE_SOURCE * repeat),
+        ('mixed', PARSE_SOURCE.replace('result', '\u03b1\u03c0\u03bf').replace(
+            'target', '\u0446\u0435\u043b\u044c') * repeat),
+    )
+    lexer = Lexer()
+    tables = lexer_tables(ply.lex.lex(object=lexer))
+
+    def build(ascii_rules):
+        re.purge()
+        return Scanner(tables, INLINE_RULES, ascii_rules).clone(lexer)
+
+    def scan(scanner, source):
+        scanner.input(source)
+        while scanner.token():
+            pass
+
+    for name, ascii_rules in (('full', None), ('ascii', Lexer.ascii_rules)):
+        seconds = time_call(partial(build, ascii_rules), repeat=10)
+        report('build (%s)' % name, seconds)
+        for label, source in sources:
+            scanner = build(ascii_rules)
+            # the scanning is timed without the compilation of the full
+            # patterns that may be required.
+            scan(scanner, source)
+            seconds = time_call(partial(scan, scanner, source), repeat=10)
+            report('scan %s %d lines (%s)' % (
+                label, source.count('\n'), name), seconds)
+
+
+def bench_tokenize(repeat=50):
+    """
+    The cost of the tokens of the source and the memory held by them,
+    as the compact form against the list of the tokens of the lexer.
+    """
+
+    from calmjs.parse.lexers.es5 import Lexer
+    source = PARSE_SOURCE * repeat
+    lexer = Lexer()
+
+    def tokens():
+        lexer.input(source)
+        return list(lexer)
+
+    for name, f in (
+            ('tokens', tokens),
+            ('tokenize_compact', partial(lexer.tokenize_compact, source))):
+        seconds = time_call(f, repeat=10)
+        size = traced_call(f)
+        report('%s %d lines' % (name, source.count('\n')), seconds,
+               '(%d KiB)' % (size // 1024))
+
+
+def bench_reparse(repeat=50):
+    """
+    The cost of reparsing the source after a small edit, against a
+    full parse.
+    """
+
+    from calmjs.parse.parsers.es5 import Parser
+    source = PARSE_SOURCE * repeat
+    parser = Parser(engine='rd')
+    report('parse %d lines (engine=%r)' % (
+        source.count('\n'), 'rd'), time_call(
+            partial(parser.parse, source), repeat=3))
+    for name, idx in (('start', 0), ('end', repeat - 1)):
+        # an edit within the last statement of a function.
+        offset = len(PARSE_SOURCE) * idx + PARSE_SOURCE.index('i * 2 >> 1')
+        edited = source[:offset] + 'i * 22' + source[offset + 5:]
+        results = []
+        for _ in range(3):
+            tree = parser.parse(source)
+            start = default_timer()
+            parser.reparse(tree, source, edited)
+            results.append(default_timer() - start)
+        report('reparse %d lines (edit at the %s)' % (
+            source.count('\n'), name), min(results))
+
+
+def bench_positions(repeat=50):
+    """
+    The throughput of the es5 parser and the memory held by the trees
+    produced, for each of the levels of positions tracked.
+    """
+
+    from calmjs.parse.parsers.es5 import ENGINES
+    from calmjs.parse.parsers.es5 import POSITIONS
+    from calmjs.parse.parsers.es5 import Parser
+    source = PARSE_SOURCE * repeat
+    for engine in ENGINES:
+        for positions in POSITIONS:
+            parser = Parser(engine=engine, positions=positions)
+            seconds = time_call(partial(parser.parse, source), repeat=3)
+            size = traced_call(partial(parser.parse, source))
+            report('parse %d lines (engine=%r, positions=%r)' % (
+                source.count('\n'), engine, positions), seconds,
+                '(%d KiB)' % (size // 1024))
+
+
+def traced_call(f):
+    """
+    Return the memory allocated by calling f that is still held by its
+    result, in bytes.
+    """
+
+    import gc
+    import tracemalloc
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        result = f()  # noqa: F841
+        return tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+
+
+def bench_iter_parse(repeat=50):
+    """
+    The cost and the peak memory of minifying the source statement by
+    statement through iter_parse, against parsing it in full.
+    """
+
+    import gc
+    import tracemalloc
+    from calmjs.parse.parsers.es5 import iter_parse
+    from calmjs.parse.parsers.es5 import parse
+    from calmjs.parse.unparsers.es5 import minify_print
+    source = PARSE_SOURCE * repeat
+    for name, f in (
+            ('parse', lambda: minify_print(parse(source, engine='rd'))),
+            ('iter_parse', lambda: ''.join(
+                minify_print(node) for node in iter_parse(source)))):
+        seconds = time_call(f, repeat=3)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            f()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        report('minify %d lines (%s)' % (source.count('\n'), name), seconds,
+               '(peak %d KiB)' % (peak // 1024))
+
+
+def bench_slots(repeat=50):
+    """
+    The memory held by the trees produced by the es5 parser with the
+    slotted asttypes, against the default asttypes.
+    """
+
+    from calmjs.parse.parsers.es5 import Parser
+    from calmjs.parse.parsers.es5 import asttypes
+    from calmjs.parse.parsers.es5 import slotted_asttypes
+    source = PARSE_SOURCE * repeat
+    for positions in ('full', 'node'):
+        for name, types in (
+                ('asttypes', asttypes),
+                ('slotted_asttypes', slotted_asttypes)):
+            parser = Parser(asttypes=types, positions=positions)
+            seconds = time_call(partial(parser.parse, source), repeat=3)
+            size = traced_call(partial(parser.parse, source))
+            report('parse %d lines (%s, positions=%r)' % (
+                source.count('\n'), name, positions), seconds,
+                '(%d KiB)' % (size // 1024))
+
+
+def bench_cache(repeat=50):
+    """
+    The cost of retrieving a tree from the cache, against parsing.
+    """
+
+    import shutil
+    import tempfile
+    from calmjs.parse.cache import Cache
+    from calmjs.parse.cache import CachedParser
+    from calmjs.parse.parsers.es5 import parse
+    source = PARSE_SOURCE * repeat
+    root = tempfile.mkdtemp()
+    try:
+        cached_parse = CachedParser(Cache(root))
+        cached_parse(source)
+        report('parse %d lines' % source.count('\n'), time_call(
+            partial(parse, source), repeat=3))
+        report('parse %d lines (cached)' % source.count('\n'), time_call(
+            partial(cached_parse, source), repeat=3))
+    finally:
+        shutil.rmtree(root)
+
+
+def bench_binary(repeat=50):
+    """
+    The size and the cost of the binary serialization, against pickle.
+    """
+
+    import pickle
+    from calmjs.parse import binary
+    from calmjs.parse.parsers.es5 import parse
+    tree = parse(PARSE_SOURCE * repeat, with_comments=True)
+    data = binary.dumps(tree)
+    pickled = pickle.dumps(tree, pickle.HIGHEST_PROTOCOL)
+    report('binary.dumps', time_call(
+        partial(binary.dumps, tree), repeat=3), '(%d bytes)' % len(data))
+    report('binary.loads', time_call(
+        partial(binary.loads, data), repeat=3))
+    report('binary.loads (positions=False)', time_call(
+        partial(binary.loads, data, positions=False), repeat=3))
+    report('pickle.dumps', time_call(
+        partial(pickle.dumps, tree, pickle.HIGHEST_PROTOCOL), repeat=3),
+        '(%d bytes)' % len(pickled))
+    report('pickle.loads', time_call(
+        partial(pickle.loads, pickled), repeat=3))
+
+
+def bench_walk(repeat=50):
+    """
+    The cost of walking through the trees, directly and through the
+    walkers and unparsers built on top of the iteration of the nodes.
+    """
+
+    from calmjs.parse.parsers.es5 import parse
+    from calmjs.parse.unparsers.es5 import minify_print
+    from calmjs.parse.unparsers.es5 import pretty_print
+    from calmjs.parse.walkers import ReprWalker
+    from calmjs.parse.walkers import walk
+    tree = parse(PARSE_SOURCE * repeat)
+
+    def walk_children():
+        nodes = [tree]
+        while nodes:
+            nodes.extend(nodes.pop().children())
+            while nodes and nodes[-1] is None:
+                nodes.pop()
+
+    report('walk', time_call(lambda: list(walk(tree)), repeat=3))
+    report('walk (children)', time_call(walk_children, repeat=3))
+    report('ReprWalker', time_call(
+        partial(ReprWalker().walk, tree, depth=-1), repeat=3))
+    report('pretty_print', time_call(partial(pretty_print, tree), repeat=3))
+    report('minify_print', time_call(partial(minify_print, tree), repeat=3))
+
+
+benchmarks = {
+    'asi': bench_asi,
+    'binary': bench_binary,
+    'cache': bench_cache,
+    'comments': bench_comments,
+    'dependencies': bench_dependencies,
+    'identifiers': bench_identifiers,
+    'import': bench_import,
+    'iter_parse': bench_iter_parse,
+    'lexer': bench_lexer,
+    'parse': bench_parse,
+    'positions': bench_positions,
+    'reparse': bench_reparse,
+    'slots': bench_slots,
+    'tokenize': bench_tokenize,
+    'walk': bench_walk,
+}
+
+
+def main(argv=None):
+    names = (sys.argv[1:] if argv is None else argv) or sorted(benchmarks)
+    for name in names:
+        print('# %s' % name)
+        benchmarks[name]()
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -2921,7 +2921,10 @@ def build_comments_test_cases(clsname, parse, program_type):
         <Program @1:1 ?children=[
           <If @1:1 alternative=None, consequent=<Block @1:7 >,
             predicate=<Number @1:5 value='0'>>,
-          <ExprStatement @1:17 expr=<Regex @1:17 value='/a/'>>
+          <ExprStatement @1:17 expr=<Regex @1:17 comments=<
+              Comments @1:9 ?children=[
+                <BlockComment @1:9 value='/*asdf*/'>
+              ]>, value='/a/'>>
         ]>
         """,
     )]))
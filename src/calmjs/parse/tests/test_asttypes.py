@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import unittest
 
+from calmjs.parse import asttypes
 from calmjs.parse.asttypes import Comments
 from calmjs.parse.asttypes import BlockComment
 from calmjs.parse.asttypes import LineComment
@@ -30,3 +31,112 @@ class CommentNodesTestCase(unittest.TestCase):
             LineComment(u'// test2'),
         ])
         self.assertEqual("// test1\n// test2", str(node))
+
+
+class ChildrenTestCase(unittest.TestCase):
+
+    def test_children_fields(self):
+        identifier = asttypes.Identifier(u'x')
+        node = asttypes.If(identifier, asttypes.Block([]))
+        self.assertEqual(
+            [identifier, node.consequent, None], node.children())
+        self.assertEqual([identifier, node.consequent], list(node))
+
+    def test_children_lists(self):
+        name = asttypes.Identifier(u'f')
+        param = asttypes.Identifier(u'x')
+        stmt = asttypes.EmptyStatement(u';')
+        node = asttypes.FuncDecl(name, [param], [stmt])
+        self.assertEqual([name, param, stmt], node.children())
+        self.assertEqual([name, param, stmt], list(node))
+
+        node = asttypes.FuncExpr(None, [], [stmt])
+        self.assertEqual([None, stmt], node.children())
+        self.assertEqual([stmt], list(node))
+
+    def test_children_list_identity(self):
+        items = [asttypes.Number(u'1'), None]
+        node = asttypes.Array(items)
+        self.assertIs(items, node.children())
+        self.assertEqual([items[0]], list(node))
+
+        statements = [asttypes.EmptyStatement(u';')]
+        node = asttypes.Program(statements)
+        self.assertIs(statements, node.children())
+        self.assertEqual(statements, list(node))
+        # the list of children may be absent for the subclasses that
+        # do not invoke the constructor of Node.
+        node = asttypes.Block.__new__(asttypes.Block)
+        self.assertEqual([], node.children())
+        self.assertEqual([], list(node))
+
+    def test_children_leaf(self):
+        node = asttypes.Number(u'1')
+        self.assertEqual([], node.children())
+        self.assertEqual([], list(node))
+
+    def test_children_undeclared(self):
+        # subclasses of Node without the declaration of the children
+        # make use of the generic children method.
+        class Custom(asttypes.Node):
+            def children(self):
+                return [None, self.value]
+
+        node = Custom()
+        node.value = asttypes.Number(u'1')
+        self.assertEqual([node.value], list(node))
+        self.assertEqual([], list(asttypes.Node()))
+        self.assertEqual([node.value], list(asttypes.Node([node.value])))
+
+    def test_children_declared_order(self):
+        # the singles and the lists are provided as they were declared.
+        class Mixed(asttypes.Node):
+            _fields = ('first', 'items', 'last')
+            _children = ('first', '*items', 'last')
+
+            def __init__(self, first, items, last):
+                self.first = first
+                self.items = items
+                self.last = last
+
+        asttypes._compile_children(Mixed)
+        first = asttypes.Number(u'1')
+        items = [asttypes.Number(u'2'), None]
+        last = asttypes.Number(u'3')
+        node = Mixed(first, items, last)
+        self.assertEqual([first, items[0], None, last], node.children())
+        self.assertEqual([first, items[0], last], list(node))
+        self.assertEqual((
+            ('first', False), ('items', True), ('last', False),
+        ), asttypes.children_fields(node))
+
+    def test_children_fields_schema(self):
+        self.assertEqual(
+            (('_children_list', True),),
+            asttypes.children_fields(asttypes.Program([])))
+        self.assertEqual(
+            (), asttypes.children_fields(asttypes.Number(u'1')))
+        self.assertIsNone(asttypes.children_fields(asttypes.Node()))
+
+        class Custom(asttypes.VarStatement):
+            def children(self):
+                return []
+
+        self.assertIsNone(asttypes.children_fields(Custom([])))
+
+    def test_children_overridden(self):
+        # subclasses of the declared types that override the children
+        # method are iterated through that.
+        class Custom(asttypes.VarStatement):
+            def children(self):
+                return [None, self.value]
+
+        node = Custom([asttypes.Number(u'2')])
+        node.value = asttypes.Number(u'1')
+        self.assertEqual([node.value], list(node))
+
+        class Plain(asttypes.VarStatement):
+            pass
+
+        node = Plain([asttypes.Number(u'2')])
+        self.assertEqual(node.children(), list(node))
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import unittest
+from collections import defaultdict
+from io import BytesIO
+
+from calmjs.parse import asttypes
+from calmjs.parse import binary
+from calmjs.parse.asttypes import Elision
+from calmjs.parse.asttypes import attributes
+from calmjs.parse.factory import AstTypesFactory
+from calmjs.parse.parsers import es5
+from calmjs.parse.walkers import ReprWalker
+from calmjs.parse.walkers import walk
+
+source = """
+/* leading */
+var a = [, 1, , 2];  // trailing
+function f(x) {
+  return x ? {'k': /re/g} : new F(a[0], 'str\\u2028');
+}
+"""
+
+
+class BinaryTestCase(unittest.TestCase):
+
+    def test_round_trip(self):
+        walker = ReprWalker()
+        for with_comments in (False, True):
+            tree = es5.parse(source, with_comments=with_comments)
+            result = binary.loads(binary.dumps(tree))
+            self.assertEqual(
+                walker(tree, pos=True, depth=-1),
+                walker(result, pos=True, depth=-1),
+            )
+            self.assertEqual(str(tree), str(result))
+            for original, node in zip(walk(tree), walk(result)):
+                self.assertIs(type(original), type(node))
+                self.assertEqual(
+                    sorted(attributes(original)), sorted(attributes(node)))
+                self.assertEqual(original._token_map, node._token_map)
+                self.assertIs(
+                    type(original._token_map), type(node._token_map))
+
+        elisions = [node for node in walk(result) if isinstance(
+            node, Elision)]
+        self.assertEqual(2, len(elisions))
+        self.assertIs(dict, type(elisions[0]._token_map))
+        self.assertIs(defaultdict, type(result._token_map))
+
+    def test_round_trip_slotted(self):
+        walker = ReprWalker()
+        tree = es5.Parser(
+            asttypes=es5.slotted_asttypes, with_comments=True).parse(source)
+        result = binary.loads(binary.dumps(tree))
+        self.assertEqual(
+            walker(tree, pos=True, depth=-1),
+            walker(result, pos=True, depth=-1),
+        )
+        for original, node in zip(walk(tree), walk(result)):
+            self.assertIs(type(original), type(node))
+            self.assertEqual(
+                sorted(attributes(original)), sorted(attributes(node)))
+            self.assertEqual({}, vars(node))
+
+    def test_dump_load(self):
+        tree = es5.parse(source)
+        fp = BytesIO()
+        binary.dump(tree, fp)
+        fp.seek(0)
+        self.assertEqual(str(tree), str(binary.load(fp)))
+
+    def test_sourcepath(self):
+        tree = es5.parse('var a;')
+        tree.sourcepath = 'a.js'
+        result = binary.loads(binary.dumps(tree))
+        self.assertEqual('a.js', result.sourcepath)
+
+    def test_strings(self):
+        tree = es5.parse('var a = "\0", b = "\ud800";')
+        result = binary.loads(binary.dumps(tree))
+        self.assertEqual(['"\0"', '"\ud800"'], [
+            node.value for node in walk(result)
+            if isinstance(node, asttypes.String)
+        ])
+        tree = asttypes.String('"\U0001f600\0\ud800"')
+        self.assertEqual(tree.value, binary.loads(binary.dumps(tree)).value)
+
+    def test_plain_asttypes(self):
+        tree = asttypes.ES5Program([asttypes.ExprStatement(
+            asttypes.Number('1'))])
+        result = binary.loads(binary.dumps(tree))
+        self.assertIs(asttypes.ES5Program, type(result))
+        self.assertIs(asttypes.Number, type(result.children()[0].expr))
+        self.assertIsNone(result.lexpos)
+
+    def test_no_positions(self):
+        tree = es5.parse(source)
+        result = binary.loads(binary.dumps(tree), positions=False)
+        self.assertEqual(str(tree), str(result))
+        for node in walk(result):
+            self.assertIsNone(node.lexpos)
+            self.assertEqual({}, node._token_map)
+
+    def test_asttypes(self):
+        unnamed = AstTypesFactory(lambda s: 'str', lambda s: 'repr')
+        tree = es5.parse('var a;')
+        result = binary.loads(binary.dumps(tree), asttypes=unnamed)
+        self.assertIs(unnamed.ES5Program, type(result))
+        self.assertEqual('str', str(result))
+
+    def test_unresolvable(self):
+        unnamed = AstTypesFactory(lambda s: 'str', lambda s: 'repr')
+        with self.assertRaises(ValueError) as e:
+            binary.dumps(unnamed.ES5Program([]))
+        self.assertIn('cannot resolve node type', str(e.exception))
+
+    def test_unserializable(self):
+        with self.assertRaises(TypeError):
+            binary.dumps([])
+        with self.assertRaises(ValueError):
+            binary.dumps(asttypes.Number(1.5))
+
+    def test_too_deep(self):
+        tree = es5.parse('a' + ' + a' * 2000 + ';')
+        with self.assertRaises(ValueError):
+            binary.dumps(tree)
+
+    def test_corrupted(self):
+        data = binary.dumps(es5.parse(source))
+        with self.assertRaises(ValueError) as e:
+            binary.loads(b'XXXX' + data[4:])
+        self.assertEqual('not a serialized tree', str(e.exception))
+        with self.assertRaises(ValueError) as e:
+            binary.loads(data[:4] + b'\xff' + data[5:])
+        self.assertEqual('unsupported version 255', str(e.exception))
+        for size in (0, 5, 20, len(data) // 2, len(data) - 1):
+            with self.assertRaises(ValueError):
+                binary.loads(data[:size])
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from io import StringIO
+
+from calmjs.parse import cache
+from calmjs.parse import io
+from calmjs.parse.exceptions import ECMASyntaxError
+from calmjs.parse.parsers import es5
+from calmjs.parse.walkers import ReprWalker
+
+source = """
+/* leading */
+var a = [, 1, , 2];  // trailing
+function f(x) {
+  return x ? {'k': /re/g} : new F(a[0], 'str\\u2028');
+}
+"""
+
+
+class CountingModule(object):
+    """
+    Wraps the es5 parser module, counting the calls to parse.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def __getattr__(self, name):
+        return getattr(es5, name)
+
+    def parse(self, *a, **kw):
+        self.calls += 1
+        return es5.parse(*a, **kw)
+
+
+class CacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_get_set(self):
+        store = cache.Cache(self.root)
+        self.assertIsNone(store.get('abcdef'))
+        store.set('abcdef', b'value')
+        self.assertEqual(b'value', store.get('abcdef'))
+        self.assertTrue(os.path.exists(os.path.join(self.root, 'ab', 'cdef')))
+        store.set('abcdef', b'replaced')
+        self.assertEqual(b'replaced', store.get('abcdef'))
+        self.assertEqual(['cdef'], os.listdir(os.path.join(self.root, 'ab')))
+
+    def test_evict_least_recently_used(self):
+        store = cache.Cache(self.root, max_size=25)
+        for idx, key in enumerate(('aa1', 'bb2', 'cc3')):
+            store.set(key, b'0123456789')
+            os.utime(store._entry_path(key), (idx, idx))
+        # the oldest was evicted when the third one was written.
+        self.assertIsNone(store.get('aa1'))
+        self.assertEqual(20, store.size)
+
+        # reading an entry marks it as recently used.
+        os.utime(store._entry_path('bb2'), (10, 10))
+        os.utime(store._entry_path('cc3'), (20, 20))
+        self.assertEqual(b'0123456789', store.get('bb2'))
+        store.set('dd4', b'0123456789')
+        self.assertIsNone(store.get('cc3'))
+        self.assertEqual(b'0123456789', store.get('bb2'))
+        self.assertEqual(b'0123456789', store.get('dd4'))
+
+    def test_size_calculated_from_existing(self):
+        cache.Cache(self.root).set('aa1', b'0123456789')
+        store = cache.Cache(self.root, max_size=15)
+        store.set('bb2', b'0123456789')
+        self.assertIsNone(store.get('aa1'))
+        self.assertEqual(10, store.size)
+
+    def test_pickle(self):
+        store = cache.Cache(self.root, max_size=15)
+        store.set('bb2', b'0123456789')
+        result = pickle.loads(pickle.dumps(store))
+        self.assertEqual(self.root, result.path)
+        self.assertEqual(15, result.max_size)
+        self.assertIsNone(result.size)
+
+
+class CachedParserTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.module = CountingModule()
+        self.parse = cache.CachedParser(
+            cache.Cache(self.root), module=self.module)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_default_module(self):
+        self.assertIs(es5, cache.CachedParser(cache.Cache(self.root)).module)
+
+    def test_cached(self):
+        walker = ReprWalker()
+        for with_comments in (False, True):
+            expected = walker(es5.parse(
+                source, with_comments=with_comments), pos=True, depth=-1)
+            for _ in range(2):
+                self.assertEqual(expected, walker(self.parse(
+                    source, with_comments=with_comments), pos=True, depth=-1))
+        # only parsed once for each of the with_comments flag.
+        self.assertEqual(2, self.module.calls)
+        self.assertNotEqual(
+            self.parse.key(source, with_comments=True),
+            self.parse.key(source, with_comments=False),
+        )
+
+    def test_source_version(self):
+        version = cache.source_version(es5)
+        self.assertEqual(64, len(version))
+        self.assertEqual(version, cache.source_version(es5))
+
+        self.parse(source)
+        self.parse(source)
+        self.assertEqual(1, self.module.calls)
+        # a different version of the code constructing the trees will
+        # not be served the trees from the previous version.
+        original = cache.source_version
+        self.addCleanup(setattr, cache, 'source_version', original)
+        cache.source_version = lambda module: original(module) + 'new'
+        parse = cache.CachedParser(self.parse.cache, module=self.module)
+        self.assertNotEqual(parse.key(source), self.parse.key(source))
+        parse(source)
+        self.assertEqual(2, self.module.calls)
+        parse(source)
+        self.assertEqual(2, self.module.calls)
+
+    def test_corrupted(self):
+        self.parse(source)
+        self.parse.cache.set(self.parse.key(
+            source, with_comments=False), b'corrupted')
+        self.assertEqual(str(es5.parse(source)), str(self.parse(source)))
+        self.assertEqual(2, self.module.calls)
+        self.assertEqual(str(es5.parse(source)), str(self.parse(source)))
+        self.assertEqual(2, self.module.calls)
+
+    def test_errors(self):
+        with self.assertRaises(ECMASyntaxError):
+            self.parse('var a = ;')
+        with self.assertRaises(TypeError):
+            self.parse(b'var a;')
+
+    def test_read(self):
+        stream = StringIO(source)
+        stream.name = 'source.js'
+        self.assertEqual('source.js', io.read(self.parse, stream).sourcepath)
+        stream.seek(0)
+        self.assertEqual('source.js', io.read(self.parse, stream).sourcepath)
+        self.assertEqual(1, self.module.calls)
+
+    def test_pickle(self):
+        parse = pickle.loads(pickle.dumps(cache.CachedParser(
+            cache.Cache(self.root))))
+        self.assertIs(es5, parse.module)
+        self.assertEqual(self.root, parse.cache.path)
+        self.assertEqual(str(es5.parse(source)), str(parse(source)))
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import textwrap
+import unittest
+
+from calmjs.parse.comments import extract
+from calmjs.parse.comments import interleave
+from calmjs.parse.comments import is_important
+from calmjs.parse.comments import node_positions
+from calmjs.parse.handlers.core import token_handler_str_default
+from calmjs.parse.lexers.es5 import Lexer
+from calmjs.parse.parsers.es5 import parse
+from calmjs.parse.ruletypes import StreamFragment
+from calmjs.parse.ruletypes import Token
+from calmjs.parse.unparsers.es5 import minify_print
+
+source = textwrap.dedent('''
+/*!
+ * banner @license MIT
+ */
+/* plain */
+var a = 1 / 2; // plain
+function f(x) {
+  //! keep
+  return x /*! inline */ + /re\\/*!/g.source;
+}
+a = a
+// @preserve
+(f)
+''').lstrip()
+
+
+class IsImportantTestCase(unittest.TestCase):
+
+    def test_is_important(self):
+        self.assertTrue(is_important('/*! banner */'))
+        self.assertTrue(is_important('//! banner'))
+        self.assertTrue(is_important('/* @license MIT */'))
+        self.assertTrue(is_important('// @Preserve'))
+        self.assertTrue(is_important('/*@cc_on @*/'))
+        self.assertFalse(is_important('/* plain ! */'))
+        self.assertFalse(is_important('// plain'))
+
+
+class ExtractTestCase(unittest.TestCase):
+
+    def test_extract(self):
+        self.assertEqual([
+            ('BLOCK_COMMENT', '/*!\n * banner @license MIT\n */', 1, 1),
+            ('LINE_COMMENT', '//! keep', 7, 3),
+            ('BLOCK_COMMENT', '/*! inline */', 8, 12),
+            ('LINE_COMMENT', '// @preserve', 11, 1),
+        ], [
+            (token.type, token.value, token.lineno, token.colno)
+            for token in extract(source)
+        ])
+
+    def test_extract_predicate(self):
+        self.assertEqual(['/* plain */', '// plain'], [
+            token.value for token in extract(
+                source, predicate=lambda value: 'plain' in value)
+        ])
+
+    def test_extract_lexer(self):
+        lexer = Lexer(yield_comments=True)
+        self.assertEqual(4, len(extract(source, lexer=lexer)))
+        self.assertEqual(0, len(extract('var a = 1;', lexer=lexer)))
+
+
+class InterleaveTestCase(unittest.TestCase):
+
+    def test_interleave_remaining(self):
+        chunks = [
+            StreamFragment('a', 1, 1, None, None),
+            StreamFragment(';', None, None, None, None),
+        ]
+        comments = extract('a; //! end\n/*! last */')
+        self.assertEqual('a;//! end\n/*! last */', ''.join(
+            chunk.text for chunk in interleave(chunks, comments)))
+
+    def test_node_positions(self):
+        node = parse('a;', positions='node').children()[0].expr
+        chunks = list(node_positions(token_handler_str_default)(
+            Token(pos=0), None, node, 'a'))
+        self.assertEqual([StreamFragment('a', 1, 1, None, None)], chunks)
+        self.assertEqual(
+            [StreamFragment('a', None, None, None, None)],
+            list(token_handler_str_default(Token(pos=0), None, node, 'a')))
+
+    def test_interleave_leading(self):
+        chunks = [StreamFragment('a', 2, 1, None, None)]
+        comments = extract('/*! first */\na')
+        self.assertEqual([
+            StreamFragment('/*! first */', 1, 1, None, None),
+            StreamFragment('\n', None, None, None, None),
+            StreamFragment('a', 2, 1, None, None),
+        ], list(interleave(chunks, comments)))
+
+
+class MinifyPrintTestCase(unittest.TestCase):
+
+    def test_minify_print(self):
+        self.assertEqual(
+            '/*!\n * banner @license MIT\n */\n'
+            'var a=1/2;function f(x){//! keep\n'
+            'return x/*! inline */+/re\\/*!/g.source;}a=a// @preserve\n'
+            '(f);',
+            minify_print(parse(source), comments=extract(source)),
+        )
+
+    def test_minify_print_obfuscate(self):
+        result = minify_print(
+            parse(source), obfuscate=True, drop_semi=True,
+            comments=extract(source))
+        self.assertEqual(
+            '/*!\n * banner @license MIT\n */\n'
+            'var a=1/2;function f(a){//! keep\n'
+            'return a/*! inline */+/re\\/*!/g.source}a=a// @preserve\n'
+            '(f)', result)
+        # the result is valid, with the comments in place.
+        self.assertEqual(
+            minify_print(parse(source), obfuscate=True, drop_semi=True),
+            minify_print(parse(result), obfuscate=True, drop_semi=True))
+        self.assertEqual(
+            ['/*!\n * banner @license MIT\n */', '//! keep',
+             '/*! inline */', '// @preserve'],
+            [token.value for token in extract(result)])
+
+    def test_minify_print_node_positions(self):
+        # without the token maps, the positions of the nodes are used.
+        for obfuscate in (False, True):
+            self.assertEqual(
+                minify_print(
+                    parse(source), obfuscate=obfuscate,
+                    comments=extract(source)),
+                minify_print(
+                    parse(source, positions='node'), obfuscate=obfuscate,
+                    comments=extract(source)),
+            )
+        text = '/*! banner */\nvar a = 1;\nfunction f() {\n  //! keep\n}\n'
+        self.assertEqual(
+            '/*! banner */\nvar a=1;function f(){}//! keep\n',
+            minify_print(parse(text, positions='node'),
+                         comments=extract(text)))
+
+    def test_minify_print_without_comments(self):
+        self.assertEqual(
+            'var a=1/2;function f(x){return x+/re\\/*!/g.source;}a=a(f);',
+            minify_print(parse(source), comments=[]))
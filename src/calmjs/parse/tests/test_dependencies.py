@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import textwrap
+import unittest
+
+from calmjs.parse.dependencies import Dependency
+from calmjs.parse.dependencies import extract
+from calmjs.parse.dependencies import string_value
+from calmjs.parse.exceptions import ECMASyntaxError
+from calmjs.parse.lexers.es5 import Lexer
+
+
+class StringValueTestCase(unittest.TestCase):
+
+    def test_plain(self):
+        self.assertEqual('a/b', string_value('"a/b"'))
+        self.assertEqual('', string_value("''"))
+
+    def test_escapes(self):
+        self.assertEqual('a/b', string_value(r"'a\x2fb'"))
+        self.assertEqual('a b', string_value(r"'a b'"))
+        self.assertEqual('a\nb\0', string_value(r"'a\nb\0'"))
+        self.assertEqual('a\x07b', string_value(r"'a\7b'"))
+        self.assertEqual('a\'b"c', string_value(r"""'a\'b\"c'"""))
+        self.assertEqual('ab', string_value("'a\\\r\nb'"))
+
+
+class ExtractTestCase(unittest.TestCase):
+
+    def test_require(self):
+        self.assertEqual([
+            Dependency('require', 'a', 1, 17),
+            Dependency('require', 'b/c', 1, 35),
+        ], extract(
+            'var a = require("a"), b = require(\'b\\x2fc\');'))
+
+    def test_require_not_recognized(self):
+        self.assertEqual([], extract(textwrap.dedent('''
+        x.require('a');
+        require('b' + c);
+        require(d);
+        require;
+        var require = 'e';
+        ''')))
+
+    def test_define(self):
+        self.assertEqual([
+            Dependency('define', 'a', 2, 16),
+            Dependency('define', 'b', 2, 21),
+            Dependency('require', 'c', 3, 11),
+            Dependency('define', 'd', 5, 9),
+            Dependency('define', 'e', 6, 3),
+        ], extract(textwrap.dedent('''
+        define('mod', ['a', 'b', f, 'g'], function(require) {
+          require('c');
+        });
+        define(['d',
+          'e',], function() {});
+        define('mod', function() {});
+        define(['h' + i]);
+        ''')))
+
+    def test_nested(self):
+        self.assertEqual([
+            Dependency('require', 'a', 1, 17),
+            Dependency('require', 'b', 1, 33),
+        ], extract("require(require('a'), [require(['b'])])"))
+
+    def test_regex_division(self):
+        self.assertEqual([
+            Dependency('require', 'a', 2, 17),
+            Dependency('require', 'c', 4, 17),
+        ], extract(textwrap.dedent('''
+        var a = require('a') / 2;
+        var b = /require('b')/.test(a);
+        var c = require('c') / b / 2;
+        // require('d')
+        /* require('e') */
+        ''')))
+
+    def test_callees(self):
+        self.assertEqual([
+            Dependency('load', 'a', 1, 6),
+        ], extract("load('a'); require('b');", callees=('load',)))
+
+    def test_lexer(self):
+        lexer = Lexer(with_comments=True)
+        self.assertEqual([
+            Dependency('require', 'a', 1, 17),
+        ], extract("/* c */ require('a'); // c", lexer=lexer))
+        self.assertEqual([], lexer.hidden_tokens)
+
+    def test_syntax_error(self):
+        with self.assertRaises(ECMASyntaxError):
+            extract("require('a'); var b = @;")
@@ -29,9 +29,13 @@ import unittest
 import textwrap
 from functools import partial
 
+import ply.lex
+
 from calmjs.parse.lexers.es5 import Lexer
+from calmjs.parse.lexers.es5 import line_index
 from calmjs.parse.exceptions import ECMASyntaxError
 
+from calmjs.parse.testing.benchmark import PARSE_SOURCE
 from calmjs.parse.testing.util import build_equality_testcase
 from calmjs.parse.testing.util import build_exception_testcase
 from calmjs.parse.tests.lexer import (
@@ -86,6 +90,131 @@ class LexerGeneralTestCase(unittest.TestCase):
         token = lexer.backtracked_token()
         self.assertEqual(('REGEX', '/a/'), (token.type, token.value))
 
+    def test_reuse(self):
+        lexer = Lexer()
+        lexer.input('a\n(b)\n')
+        self.assertEqual(
+            ['ID', 'LPAREN', 'ID', 'RPAREN'], [t.type for t in lexer])
+        self.assertEqual(3, lexer.lineno)
+        # the previous state must not affect the new input
+        lexer.input('/d/\nc')
+        token = lexer.next()
+        self.assertEqual(('REGEX', 1, 1), (
+            token.type, token.lineno, token.colno))
+        token = lexer.next()
+        self.assertEqual(('ID', 2, 1), (
+            token.type, token.lineno, token.colno))
+
+    def test_regex_after_block(self):
+        lexer = Lexer()
+
+        def types(text):
+            lexer.input(text)
+            return [t.type for t in lexer][-3:]
+
+        self.assertEqual(['LBRACE', 'RBRACE', 'REGEX'], types('if (a) {} /b/'))
+        self.assertEqual(['LBRACE', 'RBRACE', 'REGEX'], types('try {}\n/b/'))
+        self.assertEqual(
+            ['RBRACE', 'RBRACE', 'REGEX'],
+            types('while (f(a[0])) { if (a) { b } }\n/b/'))
+        self.assertEqual(['EQ', 'PLUSPLUS', 'REGEX'], types('a = ++/b/'))
+        # the ones that imply a division.
+        self.assertEqual(['DIV', 'ID', 'DIV'], types('a = {} / b /'))
+        self.assertEqual(['DIV', 'ID', 'DIV'], types('a++ / b /'))
+        self.assertEqual(['DIV', 'ID', 'DIV'], types('if (a) ({}) / b /'))
+        # the ones that are left for the parsers to backtrack from.
+        self.assertEqual(['DIV', 'ID', 'DIV'], types('function a() {} / b /'))
+        self.assertEqual(['DIV', 'ID', 'DIV'], types('}} {} / b /'))
+
+    def test_symbols(self):
+        lexer = Lexer()
+        lexer.input('a.length + b.length;')
+        tokens = list(lexer)
+        self.assertIs(tokens[2].value, tokens[6].value)
+        self.assertIn(u'length', lexer.symbols)
+        # a new table for every input.
+        lexer.input('length')
+        self.assertEqual({}, lexer.symbols)
+        self.assertIsNot(tokens[2].value, lexer.next().value)
+
+    def test_symbols_shared(self):
+        symbols = {}
+        lexer = Lexer(symbols=symbols)
+        lexer.input("'value'")
+        value = lexer.next().value
+        clone = lexer.clone()
+        clone.input("x = 'value'")
+        self.assertIs(value, list(clone)[-1].value)
+        self.assertIs(symbols, lexer.symbols)
+        self.assertEqual({u"'value'", u'x', u'='}, set(symbols))
+        lexer.input("'value' // 'value'")
+        self.assertIs(value, lexer.next().value)
+        self.assertNotIn(u"// 'value'", symbols)
+
+    def test_line_index(self):
+        self.assertEqual([0], list(line_index('')))
+        self.assertEqual(
+            [0, 2, 5, 7, 9, 11], list(line_index('a\nb\r\nc\rd\u2028e\u2029')))
+
+    def test_lookup_position(self):
+        lexer = Lexer()
+        lexer.input('a = "b\\\nc";\n/* d\n */ e')
+        self.assertEqual((1, 1), lexer.lookup_position(0))
+        # positions within the tokens are available.
+        self.assertEqual((2, 1), lexer.lookup_position(8))
+        self.assertEqual((3, 4), lexer.lookup_position(15))
+        self.assertEqual((4, 5), lexer.lookup_position(21))
+        self.assertEqual([
+            'a 1:1', '= 1:3', '"b\\\nc" 1:5', '; 2:3', 'e 4:5',
+        ], [
+            '%s %d:%d' % (token.value, token.lineno, token.colno)
+            for token in lexer
+        ])
+
+    def test_lineno_skipped_tokens(self):
+        lexer = Lexer()
+        lexer.input('a\nb\nc\nd')
+        lexer.lexer.lexpos = 4
+        token = lexer.token()
+        self.assertEqual(('c', 3, 1), (token.value, token.lineno, token.colno))
+        self.assertEqual(3, lexer.lineno)
+        lexer.lexer.lexpos = 0
+        token = lexer.token()
+        self.assertEqual(('a', 1, 1), (token.value, token.lineno, token.colno))
+
+    def test_lineno_line_separators(self):
+        # the separators that are ignored like whitespaces still start
+        # new lines.
+        lexer = Lexer()
+        lexer.input('a\u2028b\u2029 c')
+        self.assertEqual(['a 1:1', 'b 2:1', 'c 3:2'], [
+            '%s %d:%d' % (token.value, token.lineno, token.colno)
+            for token in lexer
+        ])
+
+    def test_tokenize_compact(self):
+        text = 'a = /b/ // c\n/* d */\nreturn\n{e: "f"}'
+        lexer = Lexer(yield_comments=True)
+        tokens = lexer.tokenize_compact(text)
+        self.assertEqual(11, len(tokens))
+        self.assertEqual(['a', 'REGEX', '/b/', 1, 4], [
+            tokens.get_value(0), tokens.get_type(2), tokens.get_value(2),
+            tokens.linenos[2], tokens.starts[2],
+        ])
+        # the automatic semicolon after the return is excluded.
+        lexer.input(text)
+        self.assertEqual([
+            (token.type, token.value, token.lineno, token.lexpos)
+            for token in lexer if token.type != 'AUTOSEMI'
+        ], list(tokens))
+        self.assertEqual(
+            ['LINE_COMMENT', 'BLOCK_COMMENT', 'RETURN'],
+            [tokens.get_type(i) for i in range(3, 6)])
+        # likewise the comments, unless yielded.
+        tokens = Lexer(with_comments=True).tokenize_compact(text)
+        self.assertEqual(9, len(tokens))
+        self.assertEqual('RETURN', tokens.get_type(3))
+
     def test_backtracking_multiple(self):
         # Although dealing with additional tokens like comments and
         # newlines are not done (i.e. they don't get backtracked), it
@@ -100,6 +229,72 @@ class LexerGeneralTestCase(unittest.TestCase):
         self.assertEqual(('REGEX', '/a/'), (token.type, token.value))
 
 
+class ScannerTestCase(unittest.TestCase):
+
+    def lex(self, text, ply_lexer=False):
+        lexer = Lexer(yield_comments=True)
+        if ply_lexer:
+            lexer.lexer = ply.lex.lex(object=lexer)
+        lexer.input(text)
+        return [(
+            token.type, token.value, token.lineno, token.lexpos, token.colno,
+        ) for token in lexer]
+
+    def test_tokens_identical_to_ply(self):
+        for text in [data[0] for label, data in es5_all_cases] + [
+                PARSE_SOURCE, u'a\r\nb\rc\u2028d', '/* a\n */ "b\\\n" /c\n/']:
+            self.assertEqual(
+                self.lex(text, ply_lexer=True), self.lex(text))
+
+    def test_errors_identical_to_ply(self):
+        for text in [
+                u"var foo = 'test", u'a = @', u'a = /[/', u'a\u20ac = 1',
+                u'var \u03c0 = \u20ac']:
+            with self.assertRaises(ECMASyntaxError) as e:
+                self.lex(text, ply_lexer=True)
+            with self.assertRaises(ECMASyntaxError) as f:
+                self.lex(text)
+            self.assertEqual(str(e.exception), str(f.exception))
+
+    def test_unicode_identifiers_identical_to_ply(self):
+        for text in [
+                u'var \u03c0 = 1, \u03c0\u03b9 = \u03c0;',
+                u'1\u03c0 + var\u03c0 + get\u03c0 + ab\u0301c',
+                u'x = {get \u03c0() {}, set \u03c0(v) {}, get a() {}};',
+                u'x = {get\u3000a() {}, set\xa0b(v) {}};',
+                u'\u0436\u3042 = "\u5024"; /\u5024/.test(\u0436\u3042)']:
+            self.assertEqual(
+                self.lex(text, ply_lexer=True), self.lex(text))
+
+    def test_full_patterns_on_demand(self):
+        lexer = Lexer()
+        scanner = lexer.lexer
+        scanner.full_matches.clear()
+        lexer.input(u'var a = {get b() {}}; a.b;')
+        self.assertEqual(16, len(list(lexer)))
+        self.assertEqual({}, scanner.full_matches)
+        lexer.input(u'var \u03c0 = 1;')
+        self.assertEqual(
+            ['VAR', 'ID', 'EQ', 'NUMBER', 'SEMI'],
+            [token.type for token in lexer])
+        self.assertEqual(['INITIAL'], list(scanner.full_matches))
+
+    def test_overridden_rule(self):
+        class CustomLexer(Lexer):
+            @ply.lex.TOKEN(Lexer.identifier)
+            def t_ID(self, token):
+                token.type = 'ID'
+                return token
+
+        lexer = CustomLexer()
+        lexer.input('var a')
+        self.assertEqual(['ID', 'ID'], [token.type for token in lexer])
+        # the rules for the original class remain inlined.
+        lexer = Lexer()
+        lexer.input('var a')
+        self.assertEqual(['VAR', 'ID'], [token.type for token in lexer])
+
+
 class LexerWithCommentsTestCase(unittest.TestCase):
 
     def test_with_line_comments_before(self):
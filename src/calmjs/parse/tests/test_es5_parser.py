@@ -1,16 +1,31 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import pickle
 import textwrap
+import threading
 import unittest
+from functools import partial
 from io import StringIO
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
 
 from calmjs.parse import asttypes
+from calmjs.parse.asttypes import attributes
+from calmjs.parse.exceptions import ECMASyntaxError
 from calmjs.parse.parsers.es5 import Parser
+from calmjs.parse.parsers.es5 import iter_parse
+from calmjs.parse.parsers.es5 import iter_read
 from calmjs.parse.parsers.es5 import parse
+from calmjs.parse.parsers.es5 import parse_many
 from calmjs.parse.parsers.es5 import read
+from calmjs.parse.parsers.es5 import reparse
+from calmjs.parse.parsers.es5 import slotted_asttypes
+from calmjs.parse.parsers.es5_rd import RDParser
 from calmjs.parse.unparsers.es5 import pretty_print
 from calmjs.parse.walkers import walk
+from calmjs.parse.walkers import ReprWalker
 
 from calmjs.parse.tests.parser import (
     ParserCaseMixin,
@@ -46,6 +61,493 @@ class ParserTestCase(unittest.TestCase, ParserCaseMixin):
             """).lstrip()
         )
 
+    def test_parser_reuse(self):
+        first = textwrap.dedent("""
+        var a = function(x) {
+          return x + 1;
+        };
+        """).strip()
+        second = textwrap.dedent("""
+
+        if (b) {
+          c = /c/;
+        }
+        """)
+        repr_walker = ReprWalker()
+        parser = Parser()
+        self.assertEqual(
+            repr_walker(parser.parse(first), depth=-1),
+            repr_walker(Parser().parse(first), depth=-1),
+        )
+        self.assertEqual(
+            repr_walker(parser.parse(second), depth=-1),
+            repr_walker(Parser().parse(second), depth=-1),
+        )
+
+    def test_parser_built_tables_reused(self):
+        parser1 = Parser()
+        parser2 = Parser()
+        self.assertIsNot(parser1.parser, parser2.parser)
+        self.assertIs(parser1.parser.action, parser2.parser.action)
+        self.assertIs(parser1.parser.goto, parser2.parser.goto)
+        # production rules are bound to their respective instances
+        self.assertIs(
+            parser1.parser.productions[1].callable.__self__, parser1)
+        self.assertIs(
+            parser2.parser.productions[1].callable.__self__, parser2)
+        # likewise for the compiled lexer rules
+        self.assertIsNot(parser1.lexer.lexer, parser2.lexer.lexer)
+        match1, _, _, _, errorf1 = parser1.lexer.lexer.lexspec
+        match2, _, _, _, errorf2 = parser2.lexer.lexer.lexspec
+        self.assertIs(match1, match2)
+        self.assertIs(errorf1.__self__, parser1.lexer)
+        self.assertIs(errorf2.__self__, parser2.lexer)
+
+    def test_parser_context(self):
+        parser = Parser()
+        context = parser.context()
+        self.assertIsNot(context.lexer, parser.lexer)
+        self.assertIsNot(context.parser, parser.parser)
+        self.assertIs(context.parser.action, parser.parser.action)
+        self.assertIs(context.parser.productions, parser.parser.productions)
+        self.assertEqual(context.parser.errorfunc, context.p_error)
+        self.assertIs(context.asttypes, parser.asttypes)
+
+        # a failed parse will not affect the parser for subsequent use
+        with self.assertRaises(ECMASyntaxError):
+            parser.parse('var a = ;')
+        self.assertIsNone(parser.lexer.cur_token)
+        self.assertEqual('var b = 1;\n', str(parser.parse('var b = 1;')))
+
+    def test_parser_concurrent(self):
+        parser = Parser()
+        repr_walker = ReprWalker()
+        sources = [textwrap.dedent("""
+        var x%d = function(a) {
+          return a / %d + /%d/g.exec(a)[0];
+        }
+        }
+        """ if i % 5 == 4 else """
+        var x%d = function(a) {
+          return a / %d + /%d/g.exec(a)[0];
+        };
+        """) % (i, i, i) for i in range(40)]
+        expected = []
+        for source in sources:
+            try:
+                expected.append(repr_walker(Parser().parse(source), depth=-1))
+            except ECMASyntaxError as e:
+                expected.append(str(e))
+
+        results = [None] * len(sources)
+        barrier = threading.Event()
+
+        def work(idx):
+            barrier.wait()
+            for _ in range(5):
+                try:
+                    results[idx] = repr_walker(
+                        parser.parse(sources[idx]), depth=-1)
+                except ECMASyntaxError as e:
+                    results[idx] = str(e)
+
+        threads = [
+            threading.Thread(target=work, args=(i,))
+            for i in range(len(sources))
+        ]
+        for thread in threads:
+            thread.start()
+        barrier.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(expected, results)
+
+    def test_parser_engine(self):
+        with self.assertRaises(ValueError):
+            Parser(engine='unknown')
+
+        text = textwrap.dedent('''
+        /* header */
+        label: for (var i = 0, j; i < 10; i++) {
+          if (i in {a: [, 1,], 'b': 2}) continue label;
+          x = a ? b : c, y = /y/g.exec(new F(i)[0]);
+        }
+        ''')
+        walker = ReprWalker()
+        for with_comments in (False, True):
+            self.assertEqual(
+                walker(Parser(with_comments=with_comments).parse(
+                    text), pos=True, depth=-1),
+                walker(Parser(with_comments=with_comments, engine='rd').parse(
+                    text), pos=True, depth=-1),
+            )
+
+    def test_parser_engine_rd_fallback(self):
+        parser = Parser(engine='rd')
+        with self.assertRaises(ECMASyntaxError) as e:
+            parser.parse('var a = ;')
+        # the error is reported by the LALR parser.
+        self.assertEqual(
+            "Unexpected ';' at 1:9 after '=' at 1:7",
+            str(e.exception))
+        # which is also the case if the recursion limit is reached.
+        self.assertEqual('(1);\n', str(parser.parse(
+            '(' * 2000 + '1' + ')' * 2000 + ';')))
+
+    def test_iter_parse(self):
+        text = textwrap.dedent('''
+        // comment
+        var a = 1;
+        function f(x) {
+          return x / 2;
+        }
+        if (a) {}
+        /b/.test(f(a))
+        ''')
+        walker = ReprWalker()
+        tree = parse(text, with_comments=True)
+        for engine in ('lalr', 'rd'):
+            nodes = Parser(engine=engine, with_comments=True).iter_parse(text)
+            self.assertEqual(
+                [walker(node, pos=True, depth=-1) for node in tree],
+                [walker(node, pos=True, depth=-1) for node in nodes],
+            )
+        self.assertEqual(
+            [str(node) for node in parse(text)],
+            [str(node) for node in iter_parse(text)],
+        )
+        self.assertEqual([], list(iter_parse('')))
+        with self.assertRaises(TypeError):
+            next(iter_parse(b'var a;'))
+
+    def test_iter_parse_fallback(self):
+        nodes = iter_parse(
+            'var a = 1;\n' + '(' * 2000 + '1' + ')' * 2000 + ';\nb;')
+        self.assertEqual('var a = 1;', str(next(nodes)))
+        # the remaining ones from the LALR parser.
+        self.assertEqual(['(1);', 'b;'], [str(node) for node in nodes])
+
+        nodes = iter_parse('var a = 1;\nvar b = ;')
+        self.assertEqual('var a = 1;', str(next(nodes)))
+        with self.assertRaises(ECMASyntaxError) as e:
+            next(nodes)
+        self.assertEqual(
+            "Unexpected ';' at 2:9 after '=' at 2:7", str(e.exception))
+
+    def test_parser_lazy_functions(self):
+        with self.assertRaises(ValueError):
+            Parser(lazy_functions=True)
+
+        text = textwrap.dedent('''
+        var f = function(a, b) {
+          // inner
+          return function g() { return {k: [a, b / 2]}; };
+        };
+        function h() {
+          if (x) { y = /}/g; }
+        }
+        ''')
+        walker = ReprWalker()
+        for with_comments in (False, True):
+            parser = Parser(
+                with_comments=with_comments, engine='rd', lazy_functions=True)
+            tree = parser.parse(text)
+            funcs = [node for node in tree.children() if isinstance(
+                node, asttypes.FuncBase)]
+            self.assertEqual(1, len(funcs))
+            self.assertIn('_body', attributes(funcs[0]))
+            self.assertEqual(
+                walker(Parser(with_comments=with_comments).parse(
+                    text), pos=True, depth=-1),
+                walker(tree, pos=True, depth=-1),
+            )
+            self.assertNotIn('_body', attributes(funcs[0]))
+
+        # the lazy bodies are parsed for pickling.
+        tree = parse(text, engine='rd', lazy_functions=True)
+        self.assertEqual(str(parse(text)), str(pickle.loads(pickle.dumps(
+            tree, pickle.HIGHEST_PROTOCOL))))
+
+    def test_parser_lazy_functions_fallback(self):
+        parser = Parser(engine='rd', lazy_functions=True)
+        # unbalanced brackets are reported by the LALR parser.
+        with self.assertRaises(ECMASyntaxError) as e:
+            parser.parse('function f() { a(; }')
+        self.assertEqual(
+            "Unexpected ';' at 1:18 between '(' at 1:17 and '}' at 1:20",
+            str(e.exception))
+        with self.assertRaises(ECMASyntaxError):
+            parser.parse('function f() { a[) }')
+        with self.assertRaises(ECMASyntaxError):
+            parser.parse('function f() {')
+        # errors within a balanced body are only reported on access,
+        # formatted in the same way as the LALR parser.
+        tree = parser.parse('var z;\nfunction f() { return a b; }')
+        with self.assertRaises(ECMASyntaxError) as e:
+            tree.children()[1].elements
+        self.assertEqual(
+            "Unexpected 'b' at 2:25 between 'a' at 2:23 and ';' at 2:26",
+            str(e.exception))
+        tree = parser.parse('function f() {\n  var a = ; }')
+        with self.assertRaises(ECMASyntaxError) as e:
+            tree.children()[0].elements
+        self.assertEqual(
+            "Unexpected ';' at 2:11 between '=' at 2:9 and '}' at 2:13",
+            str(e.exception))
+
+    def test_reparse(self):
+        text = textwrap.dedent('''
+        var a = 1;
+        function f(x) {
+          // comment
+          var y = x + 1;
+          if (y) {
+            y++;
+          }
+          return y;
+        }
+        /* trailing */
+        f(a);
+        ''').lstrip()
+        edits = [
+            # within the block, within the function.
+            ('y++;', 'y += 2;\n'),
+            # within the function, changing the lines.
+            ('x + 1', 'x +\n\n  1'),
+            # removal of a statement.
+            ('var y = x + 1;', ''),
+            # the semicolon that separates the statements.
+            ('var a = 1;', 'var a = b\n'),
+            # within the comments.
+            ('// comment', '// the comment'),
+            ('/* trailing */', '/* the\n trailing */'),
+            # the start and the end of the text.
+            ('var a', 'var b'),
+            ('f(a);\n', 'f(a, b);\n'),
+        ]
+        walker = ReprWalker()
+        for with_comments in (False, True):
+            for old, new in edits:
+                tree = parse(text, with_comments=with_comments)
+                tree.sourcepath = 'a.js'
+                new_text = text.replace(old, new)
+                result = reparse(
+                    tree, text, new_text, with_comments=with_comments)
+                expected = parse(new_text, with_comments=with_comments)
+                expected.sourcepath = 'a.js'
+                self.assertEqual(
+                    walker(expected, pos=True, depth=-1),
+                    walker(result, pos=True, depth=-1),
+                )
+
+        # the tree is updated in place where possible.
+        tree = parse(text)
+        new_text = text.replace('y++', 'y--')
+        self.assertIs(tree, reparse(tree, text, new_text))
+        self.assertIs(tree, reparse(tree, new_text, new_text))
+
+        # as it is parsed in full otherwise, errors are reported as such.
+        with self.assertRaises(ECMASyntaxError) as e:
+            reparse(tree, new_text, new_text.replace('y--;', 'y-- +;'))
+        self.assertEqual(
+            "Unexpected ';' at 6:10 between '+' at 6:9 and '}' at 7:3",
+            str(e.exception))
+
+    def test_reparse_lazy_functions(self):
+        text = textwrap.dedent('''
+        function f() { return 1; }
+        function g() { return function() { return 2; }; }
+        ''')
+        new_text = text.replace('2', '3 + 4')
+        parser = Parser(engine='rd', lazy_functions=True)
+        tree = parser.parse(text)
+        f, g = tree.children()
+        self.assertIs(tree, parser.reparse(tree, text, new_text))
+        self.assertIn('_body', attributes(f))
+        self.assertNotIn('_body', attributes(g))
+        self.assertEqual(str(parse(new_text)), str(tree))
+
+        # the lazy bodies that follow the edit are shifted.
+        text = textwrap.dedent('''
+        var a = 1;
+        var b = 2;
+        function h(x) {
+          return x + a;
+        }
+        h(b);
+        ''').lstrip()
+        new_text = text.replace('var b = 2;', 'var b = [\n  2, 3];')
+        tree = parser.parse(text)
+        self.assertIs(tree, parser.reparse(tree, text, new_text))
+        h = tree.children()[2]
+        self.assertIn('_body', attributes(h))
+        walker = ReprWalker()
+        self.assertEqual(
+            walker(parse(new_text), pos=True, depth=-1),
+            walker(tree, pos=True, depth=-1),
+        )
+        self.assertNotIn('_body', attributes(h))
+
+    def test_parser_positions(self):
+        with self.assertRaises(ValueError):
+            Parser(positions='some')
+
+        text = textwrap.dedent('''
+        // comment
+        var a = [1, , 2], b = {c: 1, 'd': 2};
+        for (;;) { a.b(/x/g); }
+        ''')
+        walker = ReprWalker()
+        full = parse(text, with_comments=True)
+        for engine in ('lalr', 'rd'):
+            tree = parse(
+                text, with_comments=True, engine=engine, positions='node')
+            self.assertEqual(str(full), str(tree))
+            self.assertEqual(
+                walker(full, pos=True, depth=-1),
+                walker(tree, pos=True, depth=-1),
+            )
+            self.assertFalse(any(
+                '_token_map' in attributes(node) for node in walk(tree)))
+            self.assertEqual(
+                (None, None, None), tree.children()[0].getpos('var', 0))
+
+            tree = parse(
+                text, with_comments=True, engine=engine, positions='none')
+            self.assertEqual(str(full), str(tree))
+            self.assertEqual(
+                walker(parse(text, with_comments=True, positions='none'),
+                       pos=True, depth=-1),
+                walker(tree, pos=True, depth=-1),
+            )
+            comment, = tree.children()[0].comments.children()
+            self.assertEqual('// comment', comment.value)
+            self.assertIsNone(comment.lexpos)
+            self.assertTrue(all(node.lexpos is None for node in walk(tree)))
+            self.assertFalse(any(
+                '_token_map' in attributes(node) for node in walk(tree)))
+
+        # the attributes are assigned in the same order by the engines,
+        # with the token map after the positions.
+        for positions in ('full', 'node'):
+            for with_comments in (False, True):
+                self.assertEqual(*[[
+                    list(attributes(node)) for node in walk(parse(
+                        text, with_comments=with_comments, engine=engine,
+                        positions=positions))
+                ] for engine in ('lalr', 'rd')])
+        number = [
+            node for node in walk(full) if isinstance(node, asttypes.Number)]
+        self.assertEqual(
+            ['value', 'lexpos', 'lineno', 'colno', '_token_map'],
+            list(attributes(number[0])))
+
+        # reparse falls back to a full parse without the full positions.
+        tree = parse(text, engine='rd', positions='node')
+        new_text = text.replace('/x/g', '/y/g')
+        result = reparse(tree, text, new_text, engine='rd', positions='node')
+        self.assertIsNot(tree, result)
+        self.assertEqual(str(parse(new_text)), str(result))
+
+    def test_parser_token_auto_semi(self):
+        text = textwrap.dedent('''
+        var a = 1
+        a = a + 1
+        return
+        ''').strip()
+        errors = []
+        context = Parser().context()
+
+        def p_error(token):
+            errors.append(token)
+            return context.p_error(token)
+
+        context.parser.errorfunc = p_error
+        tree = context.parser.parse(
+            text, lexer=context.lexer, tracking=True, tokenfunc=context.token)
+        self.assertEqual([], errors)
+        self.assertEqual(str(parse(text)), str(tree))
+        self.assertEqual(
+            'var a = 1;\na = a + 1;\nreturn;\n', str(tree))
+
+        # the ones found after reductions remain with p_error.
+        text = 'if (a) { b = 1 }'
+        tree = context.parser.parse(
+            text, lexer=context.lexer, tracking=True, tokenfunc=context.token)
+        self.assertEqual(['RBRACE'], [token.type for token in errors])
+        self.assertEqual(str(parse(text)), str(tree))
+
+    def test_parser_symbols(self):
+        text = 'var length = a.length + b.length; f(length, "a", "a");'
+        for engine in ('lalr', 'rd'):
+            tree = parse(text, engine=engine)
+            values = {}
+            for node in walk(tree):
+                value = getattr(node, 'value', None)
+                if value is not None:
+                    self.assertIs(values.setdefault(value, value), value)
+            self.assertEqual(
+                {u'length', u'a', u'b', u'f', u'"a"'}, set(values))
+
+            symbols = {}
+            parser = Parser(engine=engine, symbols=symbols)
+            first = parser.parse(text)
+            second = parser.parse(text)
+            self.assertIs(
+                first.children()[0].children()[0].identifier.value,
+                second.children()[0].children()[0].identifier.value,
+            )
+            self.assertIn(u'length', symbols)
+
+    def test_parser_slotted_asttypes(self):
+        text = textwrap.dedent('''
+        // comment
+        var a = [1, , 2], b = {c: 1, get d() { return 2; }};
+        for (;;) { a.b(/x/g); }
+        ''')
+        walker = ReprWalker()
+        for engine in ('lalr', 'rd'):
+            tree = Parser(
+                asttypes=slotted_asttypes, engine=engine, with_comments=True,
+            ).parse(text)
+            expected = walker(
+                parse(text, with_comments=True), pos=True, depth=-1)
+            self.assertEqual(expected, walker(tree, pos=True, depth=-1))
+            # all the attributes are held by the slots.
+            self.assertFalse(any(vars(node) for node in walk(tree)))
+            self.assertEqual(expected, walker(pickle.loads(pickle.dumps(
+                tree)), pos=True, depth=-1))
+
+    def test_pickle(self):
+        tree = parse(textwrap.dedent("""
+        // comment
+        var a = [, 1, 2, ,];
+        """), with_comments=True)
+        walker = ReprWalker()
+        result = pickle.loads(pickle.dumps(tree, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(
+            walker(tree, pos=True, depth=-1),
+            walker(result, pos=True, depth=-1),
+        )
+        self.assertEqual(str(tree), str(result))
+
+    def test_parse_many(self):
+        root = mkdtemp()
+        self.addCleanup(rmtree, root)
+        paths = [join(root, '%d.js' % idx) for idx in range(4)]
+        for idx, path in enumerate(paths):
+            with open(path, 'w') as fd:
+                fd.write('var a = ;' if idx == 2 else 'var a = %d;' % idx)
+
+        results = list(parse_many(paths, jobs=2))
+        self.assertEqual(paths, [path for path, result in results])
+        self.assertEqual('var a = 0;\n', str(results[0][1]))
+        self.assertEqual(paths[0], results[0][1].sourcepath)
+        self.assertEqual('var a = 3;\n', str(results[3][1]))
+        self.assertTrue(isinstance(results[2][1], ECMASyntaxError))
+        self.assertIn(paths[2], str(results[2][1]))
+
     def test_read(self):
         stream = StringIO('var foo = "bar";')
         node = read(stream)
@@ -56,6 +558,24 @@ class ParserTestCase(unittest.TestCase, ParserCaseMixin):
         node = read(stream)
         self.assertEqual(node.sourcepath, 'somefile.js')
 
+    def test_iter_read(self):
+        stream = StringIO('var foo = "bar";\nfoo;')
+        stream.name = 'somefile.js'
+        nodes = list(iter_read(stream))
+        self.assertEqual(['var foo = "bar";', 'foo;'], [
+            str(node) for node in nodes])
+        self.assertEqual(
+            ['somefile.js', 'somefile.js'],
+            [node.sourcepath for node in nodes])
+
+        stream = StringIO('var foo = "bar";\nfoo = ;')
+        stream.name = 'somefile.js'
+        with self.assertRaises(ECMASyntaxError) as e:
+            list(iter_read(stream))
+        self.assertEqual(
+            "Unexpected ';' at 2:7 after '=' at 2:5 in 'somefile.js'",
+            str(e.exception))
+
 
 ParsedNodeTypeTestCase = build_node_repr_test_cases(
     'ParsedNodeTypeTestCase', parse, 'ES5Program')
@@ -72,3 +592,38 @@ ECMARegexSyntaxErrorsTestCase = build_regex_syntax_error_test_cases(
 
 ParsedNodeTypesWithCommentsTestCase = build_comments_test_cases(
     'ParsedNodeTypeWithCommentsTestCase', parse, 'ES5Program')
+
+
+def rd_parse(source, with_comments=False):
+    # use the recursive descent parser directly, such that the inputs
+    # are never handled by the LALR parser through the fallback.
+    parser = Parser(with_comments=with_comments, engine='rd')
+    return RDParser(parser.asttypes, parser.lexer.clone()).parse(source)
+
+
+def lazy_rd_parse(source, with_comments=False):
+    parser = Parser(with_comments=with_comments, engine='rd')
+    return RDParser(
+        parser.asttypes, parser.lexer.clone(), lazy=True).parse(source)
+
+
+RDParsedNodeTypeTestCase = build_node_repr_test_cases(
+    'RDParsedNodeTypeTestCase', rd_parse, 'ES5Program')
+
+RDParserToECMAASITestCase = build_asi_test_cases(
+    'RDParserToECMAASITestCase', rd_parse, pretty_print)
+
+RDECMASyntaxErrorsTestCase = build_syntax_error_test_cases(
+    'RDECMASyntaxErrorsTestCase', partial(parse, engine='rd'))
+
+RDECMARegexSyntaxErrorsTestCase = build_regex_syntax_error_test_cases(
+    'RDECMARegexSyntaxErrorsTestCase', partial(parse, engine='rd'))
+
+RDParsedNodeTypesWithCommentsTestCase = build_comments_test_cases(
+    'RDParsedNodeTypeWithCommentsTestCase', rd_parse, 'ES5Program')
+
+LazyRDParsedNodeTypeTestCase = build_node_repr_test_cases(
+    'LazyRDParsedNodeTypeTestCase', lazy_rd_parse, 'ES5Program')
+
+LazyRDParsedNodeTypesWithCommentsTestCase = build_comments_test_cases(
+    'LazyRDParsedNodeTypeWithCommentsTestCase', lazy_rd_parse, 'ES5Program')
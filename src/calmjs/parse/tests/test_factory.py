@@ -1,10 +1,19 @@
 # -*- coding: utf-8 -*-
+import pickle
+import threading
 import unittest
 
 from calmjs.parse import asttypes
+from calmjs.parse.asttypes import attributes
 from calmjs.parse.factory import SRFactory
 from calmjs.parse.factory import AstTypesFactory
 
+named_asttypes = AstTypesFactory(
+    lambda s: 'str', lambda s: 'repr', name=__name__ + '.named_asttypes')
+slotted_asttypes = AstTypesFactory(
+    lambda s: 'str', lambda s: 'repr', name=__name__ + '.slotted_asttypes',
+    slots=True)
+
 
 class SRFactoryTestCase(unittest.TestCase):
 
@@ -40,6 +49,65 @@ class SRFactoryTestCase(unittest.TestCase):
         with self.assertRaises(AttributeError):
             factory.C()
 
+    def test_lazy(self):
+        class A(object):
+            pass
+
+        class Obj(object):
+            pass
+
+        o = Obj()
+        o.A = A
+        o.a = A()
+
+        factory = SRFactory(o, str, repr)
+        self.assertEqual({}, factory.classes)
+        cls = factory.A
+        self.assertTrue(issubclass(cls, A))
+        self.assertIs(cls, factory.A)
+        self.assertEqual({'A': cls}, factory.classes)
+
+        # only types are provided.
+        with self.assertRaises(AttributeError):
+            factory.a
+
+    def test_lazy_race(self):
+        class A(object):
+            pass
+
+        class Obj(object):
+            pass
+
+        o = Obj()
+        o.A = A
+        factory = SRFactory(o, str, repr)
+        # simulate another thread that stored its class first.
+        first = type('A', (A,), {})
+        factory.classes['A'] = first
+        self.assertIs(first, factory.A)
+        self.assertIs(first, factory.A)
+        self.assertEqual({'A': first}, factory.classes)
+
+    def test_lazy_threads(self):
+        factory = AstTypesFactory(str, repr)
+        barrier = threading.Barrier(8) if hasattr(
+            threading, 'Barrier') else None
+        results = []
+
+        def access():
+            if barrier:
+                barrier.wait()
+            results.append(factory.Node)
+
+        threads = [threading.Thread(target=access) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(8, len(results))
+        self.assertEqual(1, len(set(results)))
+        self.assertIs(factory.classes['Node'], results[0])
+
     def test_asttypes(self):
 
         def dummy_str(s):
@@ -58,6 +126,55 @@ class SRFactoryTestCase(unittest.TestCase):
         self.assertEqual(str(custom_node), 'This is a Node')
         self.assertTrue(repr(custom_node).startswith('Node has id'))
 
+    def test_asttypes_named(self):
+        cls = named_asttypes.Identifier
+        self.assertEqual(__name__, cls.__module__)
+        self.assertEqual(
+            'named_asttypes.Identifier', getattr(cls, '__qualname__'))
+
+        node = cls('value')
+        node.lineno = 1
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            result = pickle.loads(pickle.dumps(node, protocol))
+            self.assertIs(cls, type(result))
+            self.assertEqual('value', result.value)
+            self.assertEqual(1, result.lineno)
+            self.assertEqual('str', str(result))
+
+    def test_asttypes_slots(self):
+        cls = slotted_asttypes.Identifier
+        self.assertEqual(
+            asttypes.Node._attributes + ('value',), cls.__slots__)
+        node = cls('value')
+        node.lineno = 1
+        self.assertEqual({}, vars(node))
+        self.assertEqual({'value': 'value', 'lineno': 1}, attributes(node))
+        # the defaults from the class remain available.
+        self.assertIsNone(node.colno)
+        self.assertIsNone(node.comments)
+        with self.assertRaises(AttributeError):
+            node._token_map
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            result = pickle.loads(pickle.dumps(node, protocol))
+            self.assertIs(cls, type(result))
+            self.assertEqual(attributes(node), attributes(result))
+
+        # the lazily parsed body of functions works as before.
+        node = slotted_asttypes.FuncDecl(None, None, None)
+        del node.elements
+        node._body = lambda: [cls('x')]
+        self.assertEqual('x', node.elements[0].value)
+        self.assertNotIn('_body', attributes(node))
+        with self.assertRaises(AttributeError):
+            node.missing
+
+    def test_asttypes_unnamed(self):
+        custom_asttypes = AstTypesFactory(str, repr)
+        self.assertEqual(
+            'calmjs.parse.factory', custom_asttypes.Node.__module__)
+        with self.assertRaises(pickle.PicklingError):
+            pickle.dumps(custom_asttypes.Node())
+
 
 class ParserUnparserFactoryTestCase(unittest.TestCase):
 
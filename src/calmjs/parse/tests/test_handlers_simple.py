@@ -26,6 +26,12 @@ class SimpleHandlersTestCase(unittest.TestCase):
         # initialise a barebone dispatcher.
         node = Node()
         dispatcher = Dispatcher({}, None, {}, {})
+        # without the token map, the positions are not tracked.
+        self.assertEqual([('{', None, None, None, None,)], list(
+            layout_handler_openbrace(dispatcher, node, None, None, None)))
+
+        # with an empty token map, the positions are implied.
+        node._token_map = {}
         self.assertEqual([('{', 0, 0, None, None,)], list(
             layout_handler_openbrace(dispatcher, node, None, None, None)))
         self.assertEqual([('}', 0, 0, None, None,)], list(
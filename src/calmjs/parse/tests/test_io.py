@@ -3,7 +3,11 @@ from __future__ import unicode_literals
 
 import unittest
 import base64
+import codecs
 import json
+import os
+import shutil
+from io import BytesIO
 from io import StringIO
 from os.path import join
 from tempfile import mktemp
@@ -16,6 +20,15 @@ from calmjs.parse.unparsers.base import BaseUnparser
 from calmjs.parse import io
 
 
+def dummy_parser(text):
+    # a picklable parser for the worker processes.
+    if text.startswith('bad'):
+        raise ECMASyntaxError('Illegal input')
+    result = Node()
+    result.raw = text
+    return result
+
+
 class IOTestCase(unittest.TestCase):
 
     def test_read(self):
@@ -75,6 +88,101 @@ class IOTestCase(unittest.TestCase):
         self.assertNotEqual(
             "Illegal input in 'somefile.js'", e.exception.args[0])
 
+    def test_parse_many(self):
+        root = mktemp()
+        os.mkdir(root)
+        self.addCleanup(shutil.rmtree, root)
+        paths = []
+        for idx in range(10):
+            paths.append(join(root, '%d.js' % idx))
+            with open(paths[-1], 'w') as fd:
+                fd.write('bad' if idx == 3 else 'var a = %d;' % idx)
+        paths.append(join(root, 'missing.js'))
+        stream = StringIO('var stream;')
+        stream.name = 'stream.js'
+        sources = paths + [stream, lambda: StringIO('var f;')]
+
+        for jobs in (1, 2):
+            stream.seek(0)
+            results = list(io.parse_many(dummy_parser, sources, jobs=jobs))
+            self.assertEqual(sources, [source for source, _ in results])
+            nodes = [result for _, result in results]
+            self.assertEqual('var a = 0;', nodes[0].raw)
+            self.assertEqual(paths[0], nodes[0].sourcepath)
+            self.assertTrue(isinstance(nodes[3], ECMASyntaxError))
+            self.assertEqual(
+                "Illegal input in '%s'" % paths[3], nodes[3].args[0])
+            self.assertEqual('var a = 9;', nodes[9].raw)
+            self.assertTrue(isinstance(nodes[10], EnvironmentError))
+            self.assertEqual('var stream;', nodes[11].raw)
+            self.assertEqual('stream.js', nodes[11].sourcepath)
+            self.assertEqual('var f;', nodes[12].raw)
+            self.assertIsNone(nodes[12].sourcepath)
+
+    def test_parse_many_source_error(self):
+        def failing():
+            raise IOError('cannot open')
+
+        stream = StringIO('var stream;')
+        sources = [failing, stream, lambda: StringIO('var f;')]
+        for jobs in (1, 2):
+            stream.seek(0)
+            results = list(io.parse_many(dummy_parser, sources, jobs=jobs))
+            self.assertEqual(sources, [source for source, _ in results])
+            nodes = [result for _, result in results]
+            self.assertTrue(isinstance(nodes[0], IOError))
+            self.assertEqual('cannot open', nodes[0].args[0])
+            self.assertEqual('var stream;', nodes[1].raw)
+            self.assertEqual('var f;', nodes[2].raw)
+
+    def test_parse_many_decode_error(self):
+        root = mktemp()
+        os.mkdir(root)
+        self.addCleanup(shutil.rmtree, root)
+        paths = [join(root, name) for name in ('a.js', 'b.js', 'c.js')]
+        for path, data in zip(paths, (b'var a;', b'var \xff;', b'var c;')):
+            with open(path, 'wb') as fd:
+                fd.write(data)
+
+        def undecodable():
+            return codecs.getreader('utf-8')(BytesIO(b'\xfe'))
+
+        sources = paths + [undecodable]
+        for jobs in (1, 2):
+            results = list(io.parse_many(dummy_parser, sources, jobs=jobs))
+            self.assertEqual(sources, [source for source, _ in results])
+            nodes = [result for _, result in results]
+            self.assertEqual('var a;', nodes[0].raw)
+            self.assertTrue(isinstance(nodes[1], UnicodeDecodeError))
+            self.assertEqual('var c;', nodes[2].raw)
+            self.assertTrue(isinstance(nodes[3], UnicodeDecodeError))
+
+    def test_parse_many_worker_transport(self):
+        io._init_worker(dummy_parser)
+        self.addCleanup(io._init_worker, None)
+        serialized, data = io._worker_read(('var a;', 'a.js'))
+        self.assertTrue(serialized)
+        node = io._worker_result((serialized, data))
+        self.assertEqual('var a;', node.raw)
+        self.assertEqual('a.js', node.sourcepath)
+
+        # values that cannot be serialized are sent as is.
+        def parser(text):
+            result = Node()
+            result.value = 1.5
+            return result
+
+        io._init_worker(parser)
+        serialized, node = io._worker_read(('var a;', 'a.js'))
+        self.assertFalse(serialized)
+        self.assertEqual(1.5, node.value)
+        self.assertIs(node, io._worker_result((serialized, node)))
+
+        io._init_worker(dummy_parser)
+        serialized, error = io._worker_read(('bad', 'a.js'))
+        self.assertFalse(serialized)
+        self.assertTrue(isinstance(error, ECMASyntaxError))
+
     def test_write_no_sourcemap(self):
         root = mktemp()
         definitions = {'Node': (
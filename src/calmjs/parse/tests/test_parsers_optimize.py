@@ -9,8 +9,11 @@ from shutil import rmtree
 from tempfile import mkdtemp
 from types import ModuleType
 from ply import lex
+from ply import yacc
 from calmjs.parse.parsers import optimize
 from calmjs.parse.parsers import es5
+from calmjs.parse.utils import read_lextab
+from calmjs.parse.utils import read_yacctab
 
 
 class OptimizeTestCase(unittest.TestCase):
@@ -73,6 +76,101 @@ class OptimizeTestCase(unittest.TestCase):
         # since none are imported, no purges.
         self.assertEqual(len(self.purged), 0)
 
+    def test_check_tabs(self):
+        self.assertEqual([], optimize.check_tabs(es5))
+
+    def test_check_tabs_missing(self):
+        def fail_import(module):
+            raise ImportError()
+        optimize.import_module = fail_import
+        self.assertEqual(
+            [es5.lextab, es5.yacctab], optimize.check_tabs(es5))
+
+    def test_check_tabs_stale(self):
+        def stale_import(name):
+            module = ModuleType(name)
+            vars(module).update(vars(importlib.import_module(name)))
+            if name == es5.lextab:
+                module._lexstatere = dict(module._lexstatere)
+                module._lexstatere['regex'] = []
+            else:
+                module._lr_signature = 'program -> nothing'
+            return module
+
+        es5.Parser()
+        optimize.import_module = stale_import
+        self.assertEqual(
+            [es5.lextab, es5.yacctab], optimize.check_tabs(es5))
+
+    def test_build_stale_tabs(self):
+        # ensure the tabs are generated
+        es5.Parser()
+        lexer_templates = dict(optimize._lexer_templates)
+        lrparser_templates = dict(optimize._lrparser_templates)
+        self.addCleanup(optimize._lexer_templates.update, lexer_templates)
+        self.addCleanup(
+            optimize._lrparser_templates.update, lrparser_templates)
+        self.addCleanup(optimize._lexer_templates.clear)
+        self.addCleanup(optimize._lrparser_templates.clear)
+        root = mkdtemp()
+        self.addCleanup(rmtree, root)
+        sys.path.insert(0, root)
+        self.addCleanup(sys.path.remove, root)
+        package = os.path.join(root, 'stale_tabs')
+        os.mkdir(package)
+        with open(os.path.join(package, '__init__.py'), 'w'):
+            pass
+
+        names = {}
+        for entry in ('lextab', 'yacctab'):
+            name = names[entry] = 'stale_tabs.' + entry
+            self.addCleanup(sys.modules.pop, name, None)
+            with open(sys.modules[getattr(es5, entry)].__file__) as fd:
+                text = fd.read()
+            if entry == 'lextab':
+                # the rule for the regex literals no longer matches.
+                text = text.replace(
+                    '(?P<t_regex_REGEX>', '(?P<t_regex_REGEX>x')
+            else:
+                text = text.replace(
+                    '_lr_signature = ', "_lr_signature = 'stale' + ")
+            with open(os.path.join(package, entry + '.py'), 'w') as fd:
+                fd.write(text)
+
+        parser = es5.Parser(lextab=names['lextab'], yacctab=names['yacctab'])
+        self.assertEqual(
+            u'var x = /x/ / 2;\n', str(parser.parse(u'var x = /x/ / 2;')))
+
+        # the tab modules are written again from the rules.
+        for name in names.values():
+            sys.modules.pop(name, None)
+        read_lextab(names['lextab'], parser.lexer)
+        read_yacctab(names['yacctab'], parser, 'program')
+
+    def test_read_tabs_without_reflection(self):
+        # ensure the tabs are generated
+        es5.Parser()
+
+        def fail(*a, **kw):
+            raise AssertionError('ply reflection should not be triggered')
+
+        lexer_templates = dict(optimize._lexer_templates)
+        lrparser_templates = dict(optimize._lrparser_templates)
+        self.addCleanup(optimize._lexer_templates.update, lexer_templates)
+        self.addCleanup(
+            optimize._lrparser_templates.update, lrparser_templates)
+        optimize._lexer_templates.clear()
+        optimize._lrparser_templates.clear()
+
+        original_lex, original_yacc = lex.lex, yacc.yacc
+        self.addCleanup(setattr, lex, 'lex', original_lex)
+        self.addCleanup(setattr, yacc, 'yacc', original_yacc)
+        lex.lex = yacc.yacc = fail
+
+        parser = es5.Parser()
+        self.assertEqual(
+            u'var x = /x/ / 2;\n', str(parser.parse(u'var x = /x/ / 2;')))
+
     def test_reoptimize(self):
         # this ensures everything is created
         optimize.reoptimize_all()
@@ -3,6 +3,7 @@ import unittest
 
 from logging import getLogger
 
+from calmjs.parse.testing import benchmark
 from calmjs.parse.testing.util import build_equality_testcase
 from calmjs.parse.testing.util import build_exception_testcase
 from calmjs.parse.testing.util import setup_logger
@@ -90,3 +91,22 @@ class SetupLoggerTestCase(unittest.TestCase):
         testcase.doCleanups()
         self.assertEqual(original_level, logger.level)
         self.assertEqual(original_handlers, len(logger.handlers))
+
+
+class BenchmarkTestCase(unittest.TestCase):
+
+    def test_time_call(self):
+        calls = []
+        result = benchmark.time_call(lambda: calls.append(1), 3, 2)
+        self.assertEqual(6, len(calls))
+        self.assertTrue(result >= 0)
+
+    def test_time_fresh(self):
+        self.assertTrue(benchmark.time_fresh('import sys', repeat=1) >= 0)
+
+    def test_parse_source(self):
+        from calmjs.parse.parsers.es5 import parse
+        self.assertEqual(
+            str(parse(benchmark.PARSE_SOURCE)),
+            str(parse(benchmark.PARSE_SOURCE, engine='rd')),
+        )
@@ -1,34 +1,36 @@
 # -*- coding: utf-8 -*-
 import unittest
+import subprocess
+import sys
 import tempfile
+import textwrap
 from os.path import join
 from os.path import pardir
 from os.path import sep
 
-from collections import namedtuple
 from calmjs.parse import utils
 
 
 class UtilsTestCase(unittest.TestCase):
 
     def setUp(self):
-        self.old_dist = utils.ply_dist
+        self.ply_version = utils.ply_version
         self.py_major = utils.py_major
 
     def tearDown(self):
-        utils.ply_dist = self.old_dist
+        utils.ply_version = self.ply_version
         utils.py_major = self.py_major
 
     def test_name_something(self):
         # a quick and dirty
-        utils.ply_dist = namedtuple('Distribution', ['version'])('3.00')
+        utils.ply_version = '3.00'
         utils.py_major = 2
         lextab, yacctab = utils.generate_tab_names('some.package')
         self.assertEqual(lextab, 'some.lextab_package_py2_ply3_00')
         self.assertEqual(yacctab, 'some.yacctab_package_py2_ply3_00')
 
     def test_name_unknown(self):
-        utils.ply_dist = None
+        utils.ply_version = None
         utils.py_major = 3
         lextab, yacctab = utils.generate_tab_names('some.package')
         self.assertEqual(lextab, 'some.lextab_package_py3_plyunknown')
@@ -47,6 +49,108 @@ class UtilsTestCase(unittest.TestCase):
         utils.unicode = None
         self.assertEqual("u'fake'", utils.repr_compat(fake_unicode()))
 
+    def test_read_lextab(self):
+        import ply.lex
+        from types import ModuleType
+        from calmjs.parse.lexers.es5 import Lexer
+        tables = utils.lexer_tables(ply.lex.lex(object=Lexer()))
+        lextab = ModuleType('lextab')
+        lextab._tabversion = ply.lex.__tabversion__
+        (lextab._lexstatere, lextab._lexstateignore, lextab._lexstateerrorf,
+            lextab._lexreflags) = tables
+        self.assertEqual(tables, utils.read_lextab(lextab))
+        self.assertEqual({'INITIAL': 't_error', 'regex': 't_regex_error'},
+                         tables[2])
+
+        # checked against the rules of the lexer, where provided.
+        lexer = ply.lex.lex(object=Lexer())
+        lextab._lextokens = lexer.lextokens
+        self.assertEqual(tables, utils.read_lextab(lextab, Lexer()))
+
+        class ChangedLexer(Lexer):
+            t_COMMA = r';'
+
+        with self.assertRaises(ImportError):
+            utils.read_lextab(lextab, ChangedLexer())
+        lextab._lextokens = set(['ID'])
+        with self.assertRaises(ImportError):
+            utils.read_lextab(lextab, Lexer())
+
+        lextab._tabversion = '0.0'
+        with self.assertRaises(ImportError):
+            utils.read_lextab(lextab)
+        with self.assertRaises(ImportError):
+            utils.read_lextab('calmjs.parse.no_such_lextab')
+
+    def test_read_yacctab(self):
+        from importlib import import_module
+        from types import ModuleType
+        from calmjs.parse.parsers import es5
+        parser = es5.Parser()
+        yacctab = ModuleType('yacctab')
+        vars(yacctab).update(vars(import_module(es5.yacctab)))
+        lrparser = utils.read_yacctab(yacctab, parser, 'program')
+        self.assertEqual(parser.p_error, lrparser.errorfunc)
+
+        with self.assertRaises(ImportError):
+            utils.read_yacctab(yacctab, parser, 'statement')
+        yacctab._lr_signature = 'program -> nothing'
+        with self.assertRaises(ImportError):
+            utils.read_yacctab(yacctab, parser, 'program')
+
+
+class ImportTestCase(unittest.TestCase):
+
+    def test_import_without_pkg_resources(self):
+        # pkg_resources is expensive to import, ensure it is not used.
+        code = textwrap.dedent("""
+        import sys
+        # the namespace package may make use of pkg_resources, which is
+        # outside of the scope of this check.
+        import calmjs
+        for name in list(sys.modules):
+            if name.split('.')[0] == 'pkg_resources':
+                del sys.modules[name]
+
+        attempted = []
+
+        class Finder(object):
+            def find_module(self, name, path=None):
+                if name.split('.')[0] == 'pkg_resources':
+                    attempted.append(name)
+                    raise ImportError(name)
+
+            def find_spec(self, name, path=None, target=None):
+                return self.find_module(name, path)
+
+        sys.meta_path.insert(0, Finder())
+        from calmjs.parse import es5
+        es5(u'var a = 1;')
+        print(repr(attempted))
+        """)
+        output = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual('[]', output.decode('ascii').strip())
+
+    @unittest.skipIf(
+        sys.version_info < (3, 7), 'module __getattr__ is unsupported')
+    def test_import_lazy(self):
+        # only the modules actually used should be imported.
+        code = textwrap.dedent("""
+        import sys
+        from calmjs.parse import vlq
+        print(sorted(name for name in sys.modules if name.startswith(
+            'calmjs.parse.')))
+        from calmjs.parse import es5
+        print('calmjs.parse.unparsers.es5' in sys.modules)
+        print(es5.minify_print(u'var a = 1;'))
+        """)
+        output = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual([
+            "['calmjs.parse.vlq']",
+            'True',
+            'var a=1;',
+        ], output.decode('ascii').splitlines())
+
 
 class FileNormTestCase(unittest.TestCase):
 
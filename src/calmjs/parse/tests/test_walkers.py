@@ -218,3 +218,23 @@ class ReprTestCase(unittest.TestCase):
 
             "]>"
         )
+
+    def test_children_overridden(self):
+        # the nodes of the types that override the declared children
+        # are listed through the children method.
+        class Custom(asttypes.Node):
+            def children(self):
+                return [self.value]
+
+        node = Custom()
+        node.value = asttypes.Number(value='1')
+        self.assertEqual(
+            "<Custom value=<Number value='1'>>", repr_walker.walk(node))
+
+        class Statement(asttypes.VarStatement):
+            def children(self):
+                return [asttypes.Number(value='2')]
+
+        self.assertEqual(
+            "<Statement ?children=[<Number value='2'>]>",
+            repr_walker.walk(Statement([])))
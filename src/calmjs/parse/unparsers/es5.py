@@ -5,6 +5,8 @@ Description for ES5 unparser.
 
 from __future__ import unicode_literals
 from calmjs.parse.lexers.es5 import Lexer
+from calmjs.parse.comments import interleave
+from calmjs.parse.comments import node_positions
 
 from calmjs.parse.ruletypes import (
     OpenBlock,
@@ -450,7 +452,8 @@ def minify_print(
         obfuscate=False,
         obfuscate_globals=False,
         shadow_funcname=False,
-        drop_semi=False):
+        drop_semi=False,
+        comments=()):
     """
     Simple minify print function; returns a string rendering of an input
     AST of an ES5 program
@@ -475,7 +478,21 @@ def minify_print(
     drop_semi
         Drop semicolons whenever possible (e.g. the final semicolons of
         a given block).
+    comments
+        The comment tokens to be emitted at their positions, such as
+        the license banners as extracted from the source text by
+        calmjs.parse.comments.extract, without the comments being
+        tracked by the tree.  The tree must have the positions tracked
+        (i.e. not parsed with positions='none'); without the token maps
+        (with positions='node'), the comments are emitted before the
+        first token of the node that they precede.
     """
 
-    return ''.join(chunk.text for chunk in minify_printer(
-        obfuscate, obfuscate_globals, shadow_funcname, drop_semi)(ast))
+    printer = minify_printer(
+        obfuscate, obfuscate_globals, shadow_funcname, drop_semi)
+    if comments:
+        printer.token_handler = node_positions(printer.setup()[0])
+    chunks = printer(ast)
+    if comments:
+        chunks = interleave(chunks, comments)
+    return ''.join(chunk.text for chunk in chunks)
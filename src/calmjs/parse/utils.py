@@ -4,21 +4,24 @@ Various utilities and helpers
 """
 
 import sys
+import ply
+import ply.lex
+import ply.yacc
+from importlib import import_module
 from os.path import dirname
 from os.path import isabs
 from os.path import normpath
 from os.path import relpath
+from types import ModuleType
 
-try:
-    from pkg_resources import working_set
-    from pkg_resources import Requirement
-    ply_dist = working_set.find(Requirement.parse('ply'))
-except ImportError:  # pragma: no cover
-    ply_dist = None
-
+# ply provides its version directly, which is much cheaper than finding
+# that through the distribution metadata (i.e. via pkg_resources, which
+# requires scanning every distribution in the environment on import).
+ply_version = getattr(ply, '__version__', None)
 py_major = sys.version_info.major
 unicode = unicode if py_major < 3 else None  # noqa: F821
 str = str if sys.version_info.major > 2 else unicode  # noqa: F821
+unichr = chr if sys.version_info.major > 2 else unichr  # noqa: F821
 
 
 def repr_compat(s):
@@ -44,19 +47,164 @@ def generate_tab_names(name):
 
     package_name, module_name = name.rsplit('.', 1)
 
-    version = ply_dist.version.replace(
-        '.', '_') if ply_dist is not None else 'unknown'
+    version = ply_version.replace(
+        '.', '_') if ply_version is not None else 'unknown'
     data = (package_name, module_name, py_major, version)
     lextab = '%s.lextab_%s_py%d_ply%s' % data
     yacctab = '%s.yacctab_%s_py%d_ply%s' % data
     return lextab, yacctab
 
 
+def bind_productions(productions, module):
+    """
+    Return a copy of the list of productions produced by ply.yacc, with
+    the rule function of each bound to the provided module, which is
+    the object that define those functions.  If None is provided, the
+    rule functions will be unbound.
+    """
+
+    results = []
+    for production in productions:
+        bound = object.__new__(type(production))
+        bound.__dict__.update(vars(production))
+        bound.callable = (
+            getattr(module, production.func)
+            if module is not None and production.func else None
+        )
+        results.append(bound)
+    return results
+
+
+def lexer_tables(lexer):
+    """
+    Return the tables of the ply lexer in the form as they are written
+    to the lextab module, being the master regular expressions with the
+    names of the rules, the ignored characters and the names of the
+    error functions for every state, followed by the flags for the
+    regular expressions.
+    """
+
+    return (
+        dict((state, [(regex.pattern, [
+            entry and (entry[0] and entry[0].__name__, entry[1])
+            for entry in lexindexfunc
+        ]) for regex, lexindexfunc in lexre])
+            for state, lexre in lexer.lexstatere.items()),
+        lexer.lexstateignore,
+        dict((state, errorf and errorf.__name__)
+             for state, errorf in lexer.lexstateerrorf.items()),
+        lexer.lexreflags,
+    )
+
+
+def lexer_patterns(linfo):
+    """
+    Return the patterns of the rules for every state as reflected by the
+    ply LexerReflect, in the order they are joined into the master
+    regular expressions by ply.lex.lex.
+    """
+
+    patterns = {}
+    for state in linfo.stateinfo:
+        patterns[state] = [
+            '(?P<%s>%s)' % (name, getattr(f, 'regex', f.__doc__))
+            for name, f in linfo.funcsym[state]
+        ] + [
+            '(?P<%s>%s)' % (name, regex)
+            for name, regex in linfo.strsym[state]
+        ]
+    for state, stype in linfo.stateinfo.items():
+        if state != 'INITIAL' and stype == 'inclusive':
+            patterns[state] = patterns[state] + patterns['INITIAL']
+    return patterns
+
+
+def read_lextab(lextab, module=None):
+    """
+    Return the tables of the lexer from the lextab module (or the name
+    of it), in the same form as returned by lexer_tables.
+
+    Unlike ply.lex.lex, the regular expressions are not compiled.  If
+    the module (the object that defines the rules) is provided, its
+    rules are reflected on (but not validated) for checking that the
+    lextab was generated from the same tokens and rules.  An ImportError
+    will be raised if the module cannot be imported, or that it was
+    generated by an incompatible version of ply or from other rules.
+    """
+
+    if not isinstance(lextab, ModuleType):
+        lextab = import_module(lextab)
+    if getattr(lextab, '_tabversion', '0.0') != ply.lex.__tabversion__:
+        raise ImportError('Inconsistent PLY version')
+    if module is not None:
+        linfo = ply.lex.LexerReflect(dict(
+            (key, getattr(module, key)) for key in dir(module)
+        ), log=ply.lex.NullLogger())
+        linfo.get_all()
+        patterns = lexer_patterns(linfo)
+        if lextab._lextokens != set(linfo.tokens) or (
+                lextab._lexstateignore != linfo.ignore) or (
+                sorted(lextab._lexstatere) != sorted(patterns)) or any(
+                '|'.join(pattern for pattern, names in lextab._lexstatere[
+                    state]) != '|'.join(patterns[state])
+                for state in patterns):
+            raise ImportError('Inconsistent lextab for the rules')
+    return (
+        lextab._lexstatere, lextab._lexstateignore, lextab._lexstateerrorf,
+        lextab._lexreflags,
+    )
+
+
+def read_yacctab(tabmodule, module, start=None):
+    """
+    Return a ply LRParser constructed directly from the tabmodule, with
+    the rule functions bound to the provided module.
+
+    Unlike ply.yacc.yacc, the production rules defined by the module are
+    not parsed into a grammar nor validated; they are only reflected on
+    for the signature, which must match the one of the tabmodule, such
+    that it was generated from the same production rules (and the start
+    symbol, if provided).  An ImportError will be raised if the
+    tabmodule cannot be imported or that the signatures differ, or a
+    ply.yacc.VersionError if it was generated by an incompatible version
+    of ply.
+    """
+
+    table = ply.yacc.LRTable()
+    signature = table.read_table(tabmodule)
+    pdict = dict((key, getattr(module, key)) for key in dir(module))
+    if start is not None:
+        pdict['start'] = start
+    pinfo = ply.yacc.ParserReflect(pdict, log=ply.yacc.NullLogger())
+    pinfo.get_all()
+    if signature != pinfo.signature():
+        raise ImportError('Inconsistent yacctab for the production rules')
+    table.lr_productions = bind_productions(table.lr_productions, module)
+    return ply.yacc.LRParser(table, getattr(module, 'p_error', None))
+
+
 def format_lex_token(token):
     return '%s at %s:%s' % (
         repr_compat(token.value), token.lineno, getattr(token, 'colno', '?'))
 
 
+def format_syntax_error(prev_token, token, next_token):
+    """
+    Return the message for the syntax error of the unexpected token,
+    along with the tokens before and after it; any of these may be None.
+    """
+
+    tokens = [format_lex_token(t) for t in [
+        prev_token, token, next_token] if t is not None]
+    msg = (
+        'Unexpected end of input',
+        'Unexpected end of input after {0}',
+        'Unexpected {1} after {0}',
+        'Unexpected {1} between {0} and {2}',
+    )
+    return msg[len(tokens)].format(*tokens)
+
+
 def normrelpath(base, target):
     """
     This function takes the base and target arguments as paths, and
@@ -6,6 +6,8 @@ Generic walkers.
 from __future__ import unicode_literals
 
 from calmjs.parse.asttypes import Node
+from calmjs.parse.asttypes import attributes
+from calmjs.parse.asttypes import children_fields
 from calmjs.parse.utils import repr_compat
 
 
@@ -150,7 +152,26 @@ class ReprWalker(object):
             return '<%s ...>' % node.__class__.__name__
 
         attrs = []
-        children = node.children()
+        state = attributes(node)
+        if '_body' in state:
+            # a lazily parsed function body, so parse it.
+            node.elements
+            state = attributes(node)
+        fields = children_fields(node)
+        if fields is None:
+            children = node.children()
+        else:
+            # only the children held by the private attributes declared
+            # by the schema are unnamed, so skip collecting the rest.
+            children = []
+            for name, is_list in fields:
+                if not name.startswith('_'):
+                    continue
+                child = getattr(node, name, None)
+                if is_list:
+                    children.extend(child or [])
+                elif child is not None:
+                    children.append(child)
         ids = {id(child) for child in children}
 
         indentation = ' ' * (indent * (_level + 1))
@@ -158,7 +179,7 @@ class ReprWalker(object):
         joiner = ',\n' + indentation if indent else ', '
         tailer = '\n' + ' ' * (indent * _level) if indent else ''
 
-        for k, v in vars(node).items():
+        for k, v in state.items():
             if k.startswith('_'):
                 continue
             if id(v) in ids: